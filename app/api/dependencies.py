@@ -1,10 +1,15 @@
 """Shared dependencies for API routes."""
-from typing import Generator
+import os
+from typing import Generator, Tuple
 from sqlalchemy.orm import Session
 
-from app.models.database import get_db_manager
+from app.config import settings
+from app.core.cache import TTLCache
+from app.core.ingestion.indexer import get_index_manager
+from app.models.database import get_db_manager, count_records
 from app.services.document_service import get_document_service
 from app.services.qa_service import get_qa_service
+from app.utils.logger import app_logger as logger
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -32,3 +37,70 @@ def get_doc_service():
 def get_qa_svc():
     """Get QA service instance."""
     return get_qa_service()
+
+
+# Short-lived caches so that dashboards and liveness probes hitting the
+# stats/health endpoints collapse to one scan per window
+stats_cache = TTLCache(ttl=2.0)
+health_cache = TTLCache(ttl=1.0)
+file_size_cache = TTLCache(ttl=5.0)
+
+# Resolved once instead of string-replacing the URL on every request
+DATABASE_PATH = settings.database_url.removeprefix("sqlite:///")
+
+
+def get_database_size() -> int:
+    """
+    Get the on-disk size of the SQLite database, re-stat'ed at most every 5s.
+    
+    Returns:
+        Size in bytes, or 0 if the file does not exist
+    """
+    def stat_size():
+        try:
+            return os.stat(DATABASE_PATH).st_size
+        except OSError:
+            return 0
+    
+    return file_size_cache.get_or_set(DATABASE_PATH, stat_size)
+
+
+def get_cached_stats(db: Session) -> Tuple[int, int, int, int, int]:
+    """
+    Get system counters, recomputed at most once per stats_cache window.
+    
+    Args:
+        db: Database session
+        
+    Returns:
+        Tuple of (documents, chunks, queries, index_size, database_size)
+    """
+    def compute():
+        total_documents, total_chunks, total_queries = count_records(db)
+        index_size = get_index_manager().get_stats().get("total_vectors", 0)
+        database_size = get_database_size()
+        return total_documents, total_chunks, total_queries, index_size, database_size
+    
+    return stats_cache.get_or_set("stats", compute)
+
+
+def check_database(db: Session) -> bool:
+    """
+    Check database connectivity, memoized for health_cache window.
+    
+    Args:
+        db: Database session
+        
+    Returns:
+        True if the database answered a trivial query
+    """
+    def ping():
+        try:
+            # Raw driver SQL: no ORM statement compilation on the probe path
+            db.connection().exec_driver_sql("SELECT 1")
+            return True
+        except Exception as e:
+            logger.error(f"Database health check failed: {e}")
+            return False
+    
+    return health_cache.get_or_set("database", ping)
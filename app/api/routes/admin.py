@@ -1,5 +1,6 @@
 """Admin endpoints for system management."""
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.models.schemas import (
@@ -8,9 +9,9 @@ from app.models.schemas import (
     DeleteResponse,
     SystemStats
 )
-from app.models.database import Document, Chunk, Query
+from app.models.database import bump_doc_version, count_chunks, count_records
 from app.services.document_service import DocumentService
-from app.api.dependencies import get_db, get_doc_service
+from app.api.dependencies import get_db, get_doc_service, get_cached_stats, stats_cache
 from app.core.ingestion.indexer import get_index_manager
 from app.config import settings
 from app.utils.logger import app_logger as logger
@@ -37,12 +38,7 @@ async def reindex_documents(
         reindexed_count = doc_service.reindex_documents(request.doc_ids, db)
         
         # Get total chunks
-        if request.doc_ids:
-            total_chunks = db.query(Chunk).filter(
-                Chunk.doc_id.in_(request.doc_ids)
-            ).count()
-        else:
-            total_chunks = db.query(Chunk).count()
+        total_chunks = count_chunks(db, request.doc_ids)
         
         return ReindexResponse(
             success=True,
@@ -82,28 +78,29 @@ async def clear_all_data(
     
     try:
         # Get counts before deletion
-        doc_count = db.query(Document).count()
-        chunk_count = db.query(Chunk).count()
-        query_count = db.query(Query).count()
+        doc_count, chunk_count, query_count = count_records(db)
         
-        # Delete from database
-        db.query(Query).delete()
-        db.query(Chunk).delete()
-        db.query(Document).delete()
+        # Delete from database in one transaction, bypassing ORM synchronization
+        db.execute(text("DELETE FROM queries"))
+        db.execute(text("DELETE FROM chunks"))
+        db.execute(text("DELETE FROM documents"))
+        bump_doc_version(db)
         db.commit()
         
         # Clear FAISS index
         index_manager = get_index_manager()
         index_manager.clear()
         index_manager.save_index()
+        stats_cache.clear()
         
         # Delete uploaded files
         upload_dir = settings.upload_dir
         if os.path.exists(upload_dir):
-            for filename in os.listdir(upload_dir):
-                file_path = os.path.join(upload_dir, filename)
-                if os.path.isfile(file_path) and filename != ".gitkeep":
-                    os.remove(file_path)
+            # scandir reuses the directory entry type, no stat per file
+            with os.scandir(upload_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name != ".gitkeep":
+                        os.unlink(entry.path)
         
         total_deleted = doc_count + chunk_count + query_count
         
@@ -129,24 +126,20 @@ async def get_system_stats(db: Session = Depends(get_db)):
     """
     Get comprehensive system statistics.
     """
-    # Get database counts
-    total_documents = db.query(Document).count()
-    total_chunks = db.query(Chunk).count()
-    total_queries = db.query(Query).count()
-    
-    # Get index stats
-    index_manager = get_index_manager()
-    index_stats = index_manager.get_stats()
-    
-    # Get database size
-    db_path = settings.database_url.replace("sqlite:///", "")
-    database_size = os.path.getsize(db_path) if os.path.exists(db_path) else 0
+    # Counts and sizes are cached for a couple of seconds
+    (
+        total_documents,
+        total_chunks,
+        total_queries,
+        index_size,
+        database_size
+    ) = get_cached_stats(db)
     
     return SystemStats(
         total_documents=total_documents,
         total_chunks=total_chunks,
         total_queries=total_queries,
-        index_size=index_stats.get("total_vectors", 0),
+        index_size=index_size,
         database_size=database_size,
         embedding_model=settings.embedding_model,
         index_type=settings.faiss_index_type
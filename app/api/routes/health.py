@@ -1,20 +1,19 @@
 """Health check and status endpoints."""
 from fastapi import APIRouter, Depends
-from datetime import datetime
+from datetime import datetime, timezone
+import time
 from sqlalchemy.orm import Session
-import os
 
 from app.models.schemas import HealthCheck, StatusResponse, SystemStats
-from app.models.database import Document, Chunk, Query
-from app.api.dependencies import get_db
+from app.api.dependencies import get_db, get_cached_stats, check_database
 from app.config import settings
 from app.core.ingestion.indexer import get_index_manager
 from app.utils.logger import app_logger as logger
 
 router = APIRouter()
 
-# Store start time
-START_TIME = datetime.utcnow()
+# Store start time (monotonic clock for uptime, immune to wall-clock jumps)
+START_MONOTONIC = time.monotonic()
 
 
 @router.get("/health", response_model=HealthCheck)
@@ -24,13 +23,8 @@ async def health_check(db: Session = Depends(get_db)):
     
     Returns basic system health status.
     """
-    try:
-        # Check database
-        db.execute("SELECT 1")
-        database_connected = True
-    except Exception as e:
-        logger.error(f"Database health check failed: {e}")
-        database_connected = False
+    # Check database (memoized briefly so probe storms don't hit the DB)
+    database_connected = check_database(db)
     
     # Check index
     try:
@@ -43,7 +37,7 @@ async def health_check(db: Session = Depends(get_db)):
     return HealthCheck(
         status="healthy" if database_connected and index_loaded else "unhealthy",
         version=settings.app_version,
-        timestamp=datetime.utcnow(),
+        timestamp=datetime.now(timezone.utc),
         database_connected=database_connected,
         index_loaded=index_loaded
     )
@@ -57,43 +51,36 @@ async def get_status(db: Session = Depends(get_db)):
     Returns comprehensive statistics and health information.
     """
     # Calculate uptime
-    uptime = (datetime.utcnow() - START_TIME).total_seconds()
-    
-    # Get statistics
-    total_documents = db.query(Document).count()
-    total_chunks = db.query(Chunk).count()
-    total_queries = db.query(Query).count()
+    uptime = time.monotonic() - START_MONOTONIC
     
-    # Get index stats
+    # Get statistics (cached for a couple of seconds)
+    (
+        total_documents,
+        total_chunks,
+        total_queries,
+        index_size,
+        database_size
+    ) = get_cached_stats(db)
     index_manager = get_index_manager()
-    index_stats = index_manager.get_stats()
-    
-    # Get database size
-    db_path = settings.database_url.replace("sqlite:///", "")
-    database_size = os.path.getsize(db_path) if os.path.exists(db_path) else 0
     
     # Build stats
     stats = SystemStats(
         total_documents=total_documents,
         total_chunks=total_chunks,
         total_queries=total_queries,
-        index_size=index_stats.get("total_vectors", 0),
+        index_size=index_size,
         database_size=database_size,
         embedding_model=settings.embedding_model,
         index_type=settings.faiss_index_type
     )
     
     # Get health
-    try:
-        db.execute("SELECT 1")
-        database_connected = True
-    except:
-        database_connected = False
+    database_connected = check_database(db)
     
     health = HealthCheck(
         status="healthy" if database_connected else "unhealthy",
         version=settings.app_version,
-        timestamp=datetime.utcnow(),
+        timestamp=datetime.now(timezone.utc),
         database_connected=database_connected,
         index_loaded=index_manager.index is not None
     )
@@ -1,4 +1,6 @@
 """Document upload endpoints."""
+from pathlib import PurePosixPath
+
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Path as PathParam
 from sqlalchemy.orm import Session
 from typing import List
@@ -10,6 +12,11 @@ from app.utils.logger import app_logger as logger
 
 router = APIRouter(prefix="/api/v1", tags=["documents"])
 
+# Supported upload types (built once, not per request)
+_SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.doc', '.txt', '.md')
+ALLOWED_EXTENSIONS = frozenset(_SUPPORTED_EXTENSIONS)
+ALLOWED_EXTENSIONS_TEXT = ', '.join(_SUPPORTED_EXTENSIONS)
+
 
 @router.post("/upload", response_model=DocumentUploadResponse)
 async def upload_document(
@@ -25,13 +32,12 @@ async def upload_document(
     logger.info(f"Received upload request: {file.filename}")
     
     # Validate file type
-    allowed_extensions = ['.pdf', '.docx', '.doc', '.txt', '.md']
-    file_extension = '.' + file.filename.split('.')[-1].lower()
+    file_extension = PurePosixPath(file.filename).suffix.lower()
     
-    if file_extension not in allowed_extensions:
+    if file_extension not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=400,
-            detail=f"Unsupported file type: {file_extension}. Allowed: {', '.join(allowed_extensions)}"
+            detail=f"Unsupported file type: {file_extension}. Allowed: {ALLOWED_EXTENSIONS_TEXT}"
         )
     
     try:
@@ -1,4 +1,5 @@
 """Application configuration using Pydantic settings."""
+from functools import cached_property, lru_cache
 from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
@@ -32,6 +33,11 @@ class Settings(BaseSettings):
         alias="LLM_PROVIDER"
     )
     
+    llm_cache_size: int = Field(default=512, alias="LLM_CACHE_SIZE")  # Cached temperature-0 generations
+    llm_cache_path: str = Field(default="", alias="LLM_CACHE_PATH")  # e.g. ./data/llm_cache.json to persist them
+    llm_semantic_cache: bool = Field(default=False, alias="LLM_SEMANTIC_CACHE")  # Reuse answers for paraphrased prompts
+    llm_semantic_cache_threshold: float = Field(default=0.92, alias="LLM_SEMANTIC_CACHE_THRESHOLD")  # Min cosine similarity
+    
     # OpenAI Configuration
     openai_api_key: str = Field(default="", alias="OPENAI_API_KEY")
     openai_model: str = Field(default="gpt-3.5-turbo", alias="OPENAI_MODEL")
@@ -49,6 +55,10 @@ class Settings(BaseSettings):
     # Hugging Face Configuration (FREE!)
     huggingface_api_key: str = Field(default="", alias="HUGGINGFACE_API_KEY")
     huggingface_model: str = Field(default="google/flan-t5-xxl", alias="HUGGINGFACE_MODEL")
+    hf_inference_endpoint: str = Field(
+        default="https://router.huggingface.co/hf-inference/models/",
+        alias="HF_INFERENCE_ENDPOINT"
+    )
     
     # Google Gemma Configuration (via HuggingFace - FREE!)
     gemma_model: str = Field(default="google/gemma-2-2b-it:nebius", alias="GEMMA_MODEL")
@@ -56,6 +66,8 @@ class Settings(BaseSettings):
     # Local LLM Configuration
     local_model_name: str = Field(default="google/flan-t5-small", alias="LOCAL_MODEL_NAME")
     local_model_max_length: int = Field(default=512, alias="LOCAL_MODEL_MAX_LENGTH")
+    local_model_int8: bool = Field(default=True, alias="LOCAL_MODEL_INT8")  # Dynamic INT8 quantization on CPU
+    local_model_compile: bool = Field(default=False, alias="LOCAL_MODEL_COMPILE")  # torch.compile; slow first call
     
     # Embedding Model
     embedding_model: str = Field(
@@ -71,6 +83,7 @@ class Settings(BaseSettings):
     # Retrieval Configuration (OPTIMIZED)
     top_k_results: int = Field(default=5, alias="TOP_K_RESULTS")
     similarity_threshold: float = Field(default=0.15, alias="SIMILARITY_THRESHOLD")  # Lowered from 0.3
+    reranker_compile: bool = Field(default=False, alias="RERANKER_COMPILE")  # torch.compile the cross-encoder on CUDA
     
     # File Storage
     data_dir: str = Field(default="data", alias="DATA_DIR")
@@ -82,10 +95,22 @@ class Settings(BaseSettings):
     index_dir: str = Field(default="data/faiss_index", alias="INDEX_DIR")
     faiss_index_dir: str = Field(default="data/faiss_index", alias="FAISS_INDEX_DIR")
     faiss_index_type: str = Field(default="IndexFlatIP", alias="FAISS_INDEX_TYPE")
+    faiss_hnsw_m: int = Field(default=32, alias="FAISS_HNSW_M")
+    faiss_hnsw_ef_construction: int = Field(default=200, alias="FAISS_HNSW_EF_CONSTRUCTION")
+    faiss_hnsw_ef_search: int = Field(default=64, alias="FAISS_HNSW_EF_SEARCH")
+    faiss_ivf_nprobe: int = Field(default=16, alias="FAISS_IVF_NPROBE")
+    faiss_refine_k_factor: int = Field(default=4, alias="FAISS_REFINE_K_FACTOR")  # Candidates per hit re-scored exactly
+    faiss_ivf_train_size: int = Field(default=10000, alias="FAISS_IVF_TRAIN_SIZE")  # Vectors buffered before IVF-PQ / SQ8 training
+    faiss_use_gpu: bool = Field(default=False, alias="FAISS_USE_GPU")  # Requires a faiss-gpu build
+    faiss_gpu_device: int = Field(default=0, alias="FAISS_GPU_DEVICE")
+    faiss_threads: int = Field(default=8, alias="FAISS_THREADS")  # OpenMP threads for batched search
     index_dir: str = Field(default="data/faiss_index", alias="INDEX_DIR")  # Alias for faiss_index_dir
     
     # Database
     database_url: str = Field(default="sqlite:///data/database.db", alias="DATABASE_URL")
+    db_pool_size: int = Field(default=20, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(default=20, alias="DB_MAX_OVERFLOW")
+    db_pool_recycle: int = Field(default=3600, alias="DB_POOL_RECYCLE")  # Seconds
     
     # CORS Settings
     cors_origins: list = Field(
@@ -93,20 +118,20 @@ class Settings(BaseSettings):
         alias="CORS_ORIGINS"
     )
     
-    @property
+    @cached_property
     def max_upload_size_bytes(self) -> int:
         """Convert MB to bytes."""
         return self.max_upload_size_mb * 1024 * 1024
     
-    @property
+    @cached_property
     def faiss_index_path(self) -> str:
         """Full path to FAISS index file."""
         return os.path.join(self.faiss_index_dir, "index.faiss")
     
-    @property
+    @cached_property
     def faiss_metadata_path(self) -> str:
         """Full path to FAISS metadata file."""
-        return os.path.join(self.faiss_index_dir, "metadata.pkl")
+        return os.path.join(self.faiss_index_dir, "metadata.json")
     
     def ensure_directories(self):
         """Create necessary directories if they don't exist."""
@@ -118,8 +143,18 @@ class Settings(BaseSettings):
         os.makedirs("data", exist_ok=True)
 
 
-# Global settings instance
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    """
+    Get the process-wide settings instance.
+    
+    The environment and .env file are parsed, and the data directories
+    created, once; later calls return the cached instance.
+    """
+    settings = Settings()
+    settings.ensure_directories()
+    return settings
 
-# Ensure all directories exist
-settings.ensure_directories()
+
+# Global settings instance
+settings = get_settings()
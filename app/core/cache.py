@@ -1,14 +1,80 @@
 """Advanced caching system for RAG bot responses."""
-import hashlib
+import atexit
 import json
+import queue
+import re
+import sqlite3
+import threading
 import time
-from typing import Optional, Dict, Any, List
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Set, Tuple, Callable
 from functools import lru_cache
-import pickle
 from pathlib import Path
 
+import orjson
+import xxhash
+
 from app.utils.logger import app_logger as logger
 
+# Precompiled so query normalization doesn't re-parse the pattern per call
+_WS_RE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=4096)
+def _hash_query(query: str, provider: str) -> str:
+    """Normalize and hash a query; memoized since get() and set() both need it."""
+    # More aggressive normalization to avoid near-duplicates
+    # Remove extra spaces, punctuation variations
+    normalized = _WS_RE.sub(' ', query.lower().strip())
+    # Remove trailing punctuation
+    normalized = normalized.rstrip('?.!,;:')
+    key = f"{normalized}:{provider}"
+    # Non-cryptographic: this is only a cache key
+    return xxhash.xxh3_64_hexdigest(key.encode())
+
+
+class TTLCache:
+    """
+    Tiny in-process cache whose entries expire after a fixed number of seconds.
+    
+    Used to collapse bursts of identical, expensive lookups (stats, health
+    probes) into a single computation per window.
+    """
+    
+    def __init__(self, ttl: float):
+        """
+        Initialize cache.
+        
+        Args:
+            ttl: Time to live in seconds
+        """
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+    
+    def get_or_set(self, key: str, factory: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for key, computing it with factory if expired.
+        
+        Args:
+            key: Cache key
+            factory: Zero-argument callable producing a fresh value
+            
+        Returns:
+            Cached or freshly computed value
+        """
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[0] < self.ttl:
+            return entry[1]
+        
+        value = factory()
+        self._entries[key] = (now, value)
+        return value
+    
+    def clear(self):
+        """Drop all entries."""
+        self._entries.clear()
+
 
 class RAGCache:
     """
@@ -35,13 +101,27 @@ class RAGCache:
         self.max_size = max_size
         self.ttl = ttl
         
-        # Track document versions to invalidate cache when docs change
+        # Track document versions to invalidate cache when docs change:
+        # the write counter is cheap and checked per lookup, the fingerprint
+        # only validates the persisted cache across restarts
+        self.doc_counter = self._read_doc_counter()
         self.doc_version = self._get_doc_version()
         
         # In-memory cache for fast access
-        self.query_cache: Dict[str, Dict[str, Any]] = {}
+        # OrderedDict kept in LRU order: hits move to the end, eviction pops the front.
+        # Entries restored from disk start as None and are read on first use.
+        self.query_cache: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
         self.embedding_cache: Dict[str, Any] = {}
         
+        # Persistent store: SQLite in WAL mode, written by a background thread
+        self.store_path = self.cache_dir / "query_cache.db"
+        self._write_queue: "queue.Queue[Tuple[str, Any]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._reader: Optional[sqlite3.Connection] = None
+        self._reader_lock = threading.Lock()
+        atexit.register(self.flush)
+        
         # Load persistent cache
         self._load_cache()
         
@@ -49,67 +129,162 @@ class RAGCache:
     
     def _get_query_hash(self, query: str, provider: str = "default") -> str:
         """Generate hash for query with better normalization."""
-        # More aggressive normalization to avoid near-duplicates
-        # Remove extra spaces, punctuation variations
-        import re
-        normalized = re.sub(r'\s+', ' ', query.lower().strip())
-        # Remove trailing punctuation
-        normalized = normalized.rstrip('?.!,;:')
-        key = f"{normalized}:{provider}"
-        return hashlib.md5(key.encode()).hexdigest()
+        return _hash_query(query, provider)
+    
+    def _read_doc_counter(self) -> int:
+        """Read the document write counter (a single-row lookup)."""
+        try:
+            from app.models.database import get_db_manager, read_doc_version
+            with get_db_manager().engine.connect() as conn:
+                return read_doc_version(conn)
+        except Exception:
+            return -1
     
     def _get_doc_version(self) -> str:
-        """Get hash of current document collection for cache validation."""
+        """Get hash of current document collection for persisted cache validation."""
         try:
+            from sqlalchemy import select
             from app.models.database import get_db_manager, Document
             db_manager = get_db_manager()
             db = db_manager.get_session()
             try:
-                docs = db.query(Document).all()
-                # Create version hash from document IDs and upload dates
-                version_str = '|'.join(sorted([f"{d.id}:{d.upload_date}" for d in docs]))
-                return hashlib.md5(version_str.encode()).hexdigest()
+                # Stream (id, upload_date) pairs into the hasher in ID order,
+                # without building ORM objects or one big joined string
+                hasher = xxhash.xxh3_64()
+                rows = db.execute(
+                    select(Document.id, Document.upload_date).order_by(Document.id)
+                )
+                for doc_id, upload_date in rows:
+                    hasher.update(f"{doc_id}:{upload_date}\n".encode())
+                return hasher.hexdigest()
             finally:
                 db.close()
         except Exception:
             return "unknown"
     
+    def _open_store(self) -> sqlite3.Connection:
+        """Open a connection to the on-disk cache store."""
+        conn = sqlite3.connect(self.store_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (hash TEXT PRIMARY KEY, ts REAL, payload BLOB)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        return conn
+    
     def _load_cache(self):
         """Load cache from disk."""
         try:
-            cache_file = self.cache_dir / "query_cache.pkl"
-            if cache_file.exists():
-                with open(cache_file, 'rb') as f:
-                    loaded_data = pickle.load(f)
-                    # Check if cache has document version
-                    if isinstance(loaded_data, dict) and 'doc_version' in loaded_data:
-                        # Validate document version
-                        if loaded_data['doc_version'] == self.doc_version:
-                            self.query_cache = loaded_data.get('cache', {})
-                            logger.info(f"Loaded {len(self.query_cache)} cached queries (version match)")
-                        else:
-                            logger.info("Document version mismatch - cache invalidated")
-                            self.query_cache = {}
-                    else:
-                        # Old format - just load it but mark as potentially stale
-                        self.query_cache = loaded_data if isinstance(loaded_data, dict) else {}
-                        logger.warning(f"Loaded cache without version check: {len(self.query_cache)} entries")
+            conn = self._open_store()
+            try:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'doc_version'").fetchone()
+                # Validate document version
+                if row and row[0] == self.doc_version:
+                    # Only the keys are read at startup; payloads load lazily
+                    rows = conn.execute(
+                        "SELECT hash FROM cache ORDER BY ts DESC LIMIT ?",
+                        (self.max_size,)
+                    ).fetchall()
+                    # Oldest first so entries evict in LRU order
+                    for (query_hash,) in reversed(rows):
+                        self.query_cache[query_hash] = None
+                    logger.info(f"Indexed {len(self.query_cache)} cached queries (version match)")
+                else:
+                    if row:
+                        logger.info("Document version mismatch - cache invalidated")
+                    with conn:
+                        conn.execute("DELETE FROM cache")
+                        conn.execute(
+                            "INSERT OR REPLACE INTO meta (key, value) VALUES ('doc_version', ?)",
+                            (self.doc_version,)
+                        )
+            finally:
+                conn.close()
         except Exception as e:
             logger.warning(f"Could not load cache: {e}")
     
-    def _save_cache(self):
-        """Save cache to disk with document version."""
-        try:
-            cache_file = self.cache_dir / "query_cache.pkl"
-            # Save with document version for validation on load
-            cache_data = {
-                'doc_version': self.doc_version,
-                'cache': self.query_cache
-            }
-            with open(cache_file, 'wb') as f:
-                pickle.dump(cache_data, f)
-        except Exception as e:
-            logger.warning(f"Could not save cache: {e}")
+    def _fetch_payloads(self, query_hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Read persisted entries for the given keys.
+        
+        Args:
+            query_hashes: Cache keys to read
+            
+        Returns:
+            Mapping of key to entry; unreadable or missing rows are omitted
+        """
+        entries = {}
+        with self._reader_lock:
+            if self._reader is None:
+                self._reader = self._open_store()
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(query_hashes), 500):
+                batch = query_hashes[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._reader.execute(
+                    f"SELECT hash, payload FROM cache WHERE hash IN ({placeholders})",
+                    batch
+                )
+                for query_hash, payload in rows:
+                    try:
+                        entries[query_hash] = orjson.loads(payload)
+                    except orjson.JSONDecodeError:
+                        # Entry written in an older format
+                        continue
+        return entries
+    
+    def _persist(self, op: str, arg: Any = None):
+        """
+        Queue a write for the background writer thread.
+        
+        Args:
+            op: One of 'put', 'delete', 'clear' or 'version'
+            arg: Operation argument
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._writer_loop,
+                    name="rag-cache-writer",
+                    daemon=True
+                )
+                self._writer.start()
+        self._write_queue.put((op, arg))
+    
+    def _writer_loop(self):
+        """Apply queued writes, batching everything pending into one transaction."""
+        conn = self._open_store()
+        while True:
+            ops = [self._write_queue.get()]
+            while True:
+                try:
+                    ops.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                with conn:
+                    for op, arg in ops:
+                        if op == 'put':
+                            conn.execute("INSERT OR REPLACE INTO cache (hash, ts, payload) VALUES (?, ?, ?)", arg)
+                        elif op == 'delete':
+                            conn.executemany("DELETE FROM cache WHERE hash = ?", [(h,) for h in arg])
+                        elif op == 'clear':
+                            conn.execute("DELETE FROM cache")
+                        elif op == 'version':
+                            conn.execute(
+                                "INSERT OR REPLACE INTO meta (key, value) VALUES ('doc_version', ?)",
+                                (arg,)
+                            )
+            except Exception as e:
+                logger.warning(f"Could not save cache: {e}")
+            finally:
+                for _ in ops:
+                    self._write_queue.task_done()
+    
+    def flush(self):
+        """Block until all queued writes have reached disk."""
+        if self._writer is not None:
+            self._write_queue.join()
     
     def get(self, query: str, provider: str = "default") -> Optional[Dict[str, Any]]:
         """
@@ -123,24 +298,36 @@ class RAGCache:
             Cached response or None
         """
         # Check if documents changed - invalidate cache if so
-        current_version = self._get_doc_version()
-        if current_version != self.doc_version:
+        current_counter = self._read_doc_counter()
+        if current_counter != self.doc_counter:
             logger.info("Document collection changed - clearing cache")
             self.clear()
-            self.doc_version = current_version
+            self.doc_counter = current_counter
+            self.doc_version = self._get_doc_version()
+            self._persist('version', self.doc_version)
             return None
         
         query_hash = self._get_query_hash(query, provider)
         
         if query_hash in self.query_cache:
             cached = self.query_cache[query_hash]
+            if cached is None:
+                # Restored from disk at startup, read the payload now
+                cached = self._fetch_payloads([query_hash]).get(query_hash)
+                if cached is None:
+                    del self.query_cache[query_hash]
+                    self._persist('delete', [query_hash])
+                    return None
+                self.query_cache[query_hash] = cached
             
             # Check if expired (TTL reduced to 10 minutes for freshness)
             if time.time() - cached['timestamp'] > self.ttl:
                 logger.debug(f"Cache expired for query: {query[:50]}")
                 del self.query_cache[query_hash]
+                self._persist('delete', [query_hash])
                 return None
             
+            self.query_cache.move_to_end(query_hash)
             logger.info(f"Cache HIT for query: {query[:50]} (age: {int(time.time() - cached['timestamp'])}s)")
             cached['cache_hit'] = True
             return cached
@@ -166,16 +353,18 @@ class RAGCache:
             provider: LLM provider name
             metadata: Additional metadata
         """
-        # Check size limit
-        if len(self.query_cache) >= self.max_size:
-            # Remove oldest entry (simple LRU)
-            oldest = min(self.query_cache.items(), key=lambda x: x[1]['timestamp'])
-            del self.query_cache[oldest[0]]
-            logger.debug("Cache full, removed oldest entry")
-        
         query_hash = self._get_query_hash(query, provider)
         
-        self.query_cache[query_hash] = {
+        # Check size limit
+        if query_hash in self.query_cache:
+            self.query_cache.move_to_end(query_hash)
+        elif len(self.query_cache) >= self.max_size:
+            # Remove least recently used entry
+            evicted_hash, _ = self.query_cache.popitem(last=False)
+            self._persist('delete', [evicted_hash])
+            logger.debug("Cache full, removed least recently used entry")
+        
+        entry = {
             'query': query,
             'answer': answer,
             'sources': sources,
@@ -183,17 +372,18 @@ class RAGCache:
             'timestamp': time.time(),
             'metadata': metadata or {}
         }
+        self.query_cache[query_hash] = entry
         
         logger.info(f"Cached response for query: {query[:50]}")
         
-        # Periodically save to disk (every 10 entries)
-        if len(self.query_cache) % 10 == 0:
-            self._save_cache()
+        # Write-through off the request path (one row, no full rewrite)
+        self._persist('put', (query_hash, entry['timestamp'], orjson.dumps(entry, default=str)))
     
     def clear(self):
         """Clear all cache."""
         self.query_cache.clear()
         self.embedding_cache.clear()
+        self._persist('clear')
         logger.info("Cache cleared")
     
     def get_stats(self) -> Dict[str, Any]:
@@ -208,18 +398,34 @@ class RAGCache:
     
     def invalidate_by_doc(self, doc_id: str):
         """Invalidate cache entries related to a document."""
-        # Remove entries that used this document in sources
+        self.invalidate_by_docs({doc_id})
+    
+    def invalidate_by_docs(self, doc_ids: Set[str]):
+        """
+        Invalidate cache entries related to any of the given documents.
+        
+        Args:
+            doc_ids: Document IDs whose cached answers should be dropped
+        """
+        # Sources are needed for every entry, so read restored ones in one go
+        pending = [h for h, cached in self.query_cache.items() if cached is None]
+        loaded = self._fetch_payloads(pending) if pending else {}
+        
+        # Rebuild in one pass (keeps LRU order), collecting dropped keys
+        kept: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
         to_remove = []
         for query_hash, cached in self.query_cache.items():
-            if any(s.get('doc_id') == doc_id for s in cached.get('sources', [])):
+            if cached is None:
+                cached = loaded.get(query_hash)
+            if cached is None or any(s.get('doc_id') in doc_ids for s in cached.get('sources', [])):
                 to_remove.append(query_hash)
+            else:
+                kept[query_hash] = cached
         
-        for query_hash in to_remove:
-            del self.query_cache[query_hash]
-        
+        self.query_cache = kept
         if to_remove:
-            logger.info(f"Invalidated {len(to_remove)} cache entries for doc {doc_id}")
-            self._save_cache()
+            logger.info(f"Invalidated {len(to_remove)} cache entries for {len(doc_ids)} doc(s)")
+            self._persist('delete', to_remove)
 
 
 # Global cache instance
@@ -1,14 +1,29 @@
 """Text chunking strategies for document processing."""
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from dataclasses import dataclass
 
+import numpy as np
+
 from app.config import settings
+from app.utils.helpers import pool_chunksize, process_pool, resolve_worker_count
 from app.utils.logger import app_logger as logger
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    
+    def njit(*args, **kwargs):
+        """Run the decorated function as plain Python when numba is missing."""
+        def decorator(func):
+            return func
+        return decorator
+
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Chunk:
-    """Represents a text chunk with metadata."""
+    """Represents a text chunk with metadata (immutable, no per-instance __dict__)."""
     chunk_text: str
     doc_id: str
     chunk_index: int
@@ -28,6 +43,46 @@ class Chunk:
         }
 
 
+@njit(cache=True)
+def _build_chunks_from_spans(spans, chunk_size, chunk_overlap, current_start, current_end):
+    """
+    Pack split spans into overlapping chunk bounds.
+    
+    Compiled with numba when available; spans is then an int64 array,
+    otherwise any sequence of (start, end) pairs.
+    
+    Args:
+        spans: (start, end) offsets of split pieces, in order
+        chunk_size: Maximum chunk size in characters
+        chunk_overlap: Characters carried over into the next chunk
+        current_start: Start of the pending chunk
+        current_end: End of the pending chunk
+        
+    Returns:
+        Tuple of (int64 array of completed (start, end) chunk bounds,
+        pending chunk start, pending chunk end)
+    """
+    bounds = np.empty((len(spans), 2), dtype=np.int64)
+    count = 0
+    
+    for i in range(len(spans)):
+        split_start = spans[i][0]
+        split_end = spans[i][1]
+        
+        # Check if adding this split would exceed chunk size
+        if current_end - current_start + (split_end - split_start) > chunk_size and current_end > current_start:
+            bounds[count, 0] = current_start
+            bounds[count, 1] = current_end
+            count += 1
+            
+            # Next chunk starts with the overlap from this one
+            current_start = max(current_start, current_end - chunk_overlap)
+        
+        current_end = split_end
+    
+    return bounds[:count], current_start, current_end
+
+
 class RecursiveChunker:
     """
     Recursive character-level text chunking with overlap.
@@ -80,136 +135,309 @@ class RecursiveChunker:
             logger.warning(f"Empty text provided for doc_id: {doc_id}")
             return []
         
-        metadata = metadata or {}
-        chunks = []
+        chunks = list(self.chunk_stream([text], doc_id, metadata))
         
-        # Split text recursively
-        splits = self._split_text_recursive(text, self.separators)
+        logger.info(f"Created {len(chunks)} chunks for doc_id: {doc_id}")
+        return chunks
+    
+    def chunk_stream(
+        self,
+        pages: Iterable[str],
+        doc_id: str,
+        metadata: Dict[str, Any] = None,
+        page_separator: str = "\n"
+    ) -> Iterator[Chunk]:
+        """
+        Chunk a document supplied page by page, yielding chunks as they complete.
+        
+        Pages are joined with page_separator (matching the extractors), so
+        offsets refer to the same full text chunk() would see. Only the
+        unfinished tail of the document is buffered: whenever a new page
+        arrives, the buffer is chunked up to its last occurrence of the
+        highest-priority separator it contains and that prefix is dropped.
+        Output matches chunk() on the joined text whenever those cuts land on
+        the first separator; cuts on a lower one may shift a boundary.
+        
+        Args:
+            pages: Iterable of page texts
+            doc_id: Document identifier
+            metadata: Metadata shared (not copied) by every chunk of the
+                document; the chunk's position is chunk.chunk_index
+            page_separator: Text inserted between consecutive pages
+            
+        Yields:
+            Chunk objects in document order
+        """
+        metadata = metadata or {}
         
-        # Create chunks with overlap
-        current_chunk = []
-        current_length = 0
-        current_start_char = 0
+        buffer = ""
+        base = 0  # Document offset of buffer[0]
+        processed = 0  # Document offset up to which text has been split
+        current_start = 0
+        current_end = 0
         chunk_index = 0
         
-        for i, split in enumerate(splits):
-            split_length = len(split)
+        def assemble(split_until: int) -> Iterator[Chunk]:
+            """Split buffered text up to a document offset and emit full chunks."""
+            nonlocal current_start, current_end, chunk_index
+            
+            segment_start = processed - base
+            spans = self._split_spans(
+                buffer[segment_start:split_until - base],
+                self.separators,
+                keep_if_fits=processed > 0
+            )
+            
+            if NUMBA_AVAILABLE:
+                spans = np.array(spans, dtype=np.int64).reshape(-1, 2)
+            
+            # Pack in segment-relative offsets, then shift back
+            bounds, current_start, current_end = _build_chunks_from_spans(
+                spans,
+                self.chunk_size,
+                self.chunk_overlap,
+                current_start - processed,
+                current_end - processed
+            )
+            current_start += processed
+            current_end += processed
             
-            # Check if adding this split would exceed chunk size
-            if current_length + split_length > self.chunk_size and current_chunk:
-                # Create chunk from accumulated splits
-                chunk_text = "".join(current_chunk)
-                chunk_end_char = current_start_char + len(chunk_text)
-                
-                chunks.append(Chunk(
-                    chunk_text=chunk_text,
+            for start, end in (bounds + processed).tolist():
+                yield Chunk(
+                    chunk_text=buffer[start - base:end - base],
                     doc_id=doc_id,
                     chunk_index=chunk_index,
-                    start_char=current_start_char,
-                    end_char=chunk_end_char,
-                    metadata={**metadata, "chunk_index": chunk_index}
-                ))
-                
+                    start_char=start,
+                    end_char=end,
+                    metadata=metadata
+                )
                 chunk_index += 1
-                
-                # Calculate overlap for next chunk
-                overlap_text = chunk_text[-self.chunk_overlap:] if len(chunk_text) > self.chunk_overlap else chunk_text
-                current_chunk = [overlap_text, split]
-                current_length = len(overlap_text) + split_length
-                current_start_char = chunk_end_char - len(overlap_text)
-            else:
-                # Add split to current chunk
-                current_chunk.append(split)
-                current_length += split_length
         
-        # Add final chunk
-        if current_chunk:
-            chunk_text = "".join(current_chunk)
-            chunk_end_char = current_start_char + len(chunk_text)
+        for page_number, page in enumerate(pages):
+            if buffer:
+                # Text before the last top-level separator splits the same
+                # way regardless of what follows, so it can be finalized
+                cut = self._stable_prefix_end(buffer, processed - base)
+                if cut is not None:
+                    yield from assemble(base + cut)
+                    processed = base + cut
+                    
+                    # Keep only the pending chunk and unsplit text
+                    buffer = buffer[current_start - base:]
+                    base = current_start
             
-            chunks.append(Chunk(
-                chunk_text=chunk_text,
+            if page_number > 0:
+                buffer += page_separator
+            buffer += page
+        
+        if base + len(buffer) > processed:
+            yield from assemble(base + len(buffer))
+        
+        # Add final chunk
+        if current_end > current_start:
+            yield Chunk(
+                chunk_text=buffer[current_start - base:current_end - base],
                 doc_id=doc_id,
                 chunk_index=chunk_index,
-                start_char=current_start_char,
-                end_char=chunk_end_char,
-                metadata={**metadata, "chunk_index": chunk_index}
-            ))
-        
-        logger.info(f"Created {len(chunks)} chunks for doc_id: {doc_id}")
-        return chunks
+                start_char=current_start,
+                end_char=current_end,
+                metadata=metadata
+            )
     
-    def _split_text_recursive(
+    def _stable_prefix_end(self, buffer: str, start: int) -> Optional[int]:
+        """Offset just past the last occurrence of the first separator found in buffer[start:]."""
+        for separator in self.separators:
+            if not separator:
+                break
+            idx = buffer.rfind(separator, start)
+            if idx != -1:
+                return idx + len(separator)
+        return None
+    
+    def _split_spans(
         self,
         text: str,
-        separators: List[str]
-    ) -> List[str]:
+        separators: List[str],
+        keep_if_fits: bool = False
+    ) -> List[Tuple[int, int]]:
         """
-        Recursively split text using separators.
+        Split text into (start, end) offsets using separators in priority order.
+        
+        Equivalent to splitting on each separator (keeping it attached to the
+        preceding piece) and recursing into pieces longer than chunk_size,
+        but works on offsets instead of allocating substrings. The text is
+        viewed once as an array of character codes and each separator's
+        offsets are found with one vectorized pass the first time that
+        level is reached, so deeper levels never rescan it. The ""
+        separator yields slices rather than single characters, sized so a
+        slice plus the overlap carried into its chunk fits in chunk_size.
         
         Args:
             text: Text to split
             separators: List of separators to try
+            keep_if_fits: Text is the tail of an earlier split on the first
+                separator, so keep it whole if it fits in a chunk and does
+                not contain that separator
             
         Returns:
-            List of text splits
+            List of (start, end) offsets into text, in order
         """
-        if not separators:
-            return [text]
+        spans = []
+        codes = self._char_codes(text)
+        offsets: Dict[str, np.ndarray] = {}
         
-        separator = separators[0]
-        remaining_separators = separators[1:]
+        def find_all(separator: str) -> np.ndarray:
+            """Offsets of separator, computed on first use."""
+            if separator not in offsets:
+                offsets[separator] = self._separator_offsets(codes, separator)
+            return offsets[separator]
         
-        if separator == "":
-            # Base case: split into characters
-            return list(text)
+        def split(start: int, end: int, level: int):
+            """Append spans for text[start:end]; depth is bounded by len(separators)."""
+            # Skip separators that don't occur in this span
+            while (
+                level < len(separators)
+                and separators[level]
+                and not self._occurs(find_all(separators[level]), separators[level], start, end)
+            ):
+                level += 1
+            
+            if level == len(separators):
+                # Separators exhausted: keep the span whole
+                spans.append((start, end))
+                return
+            
+            separator = separators[level]
+            if not separator:
+                # Base case: fixed-size slices, leaving room for the overlap
+                slice_size = max(1, self.chunk_size - self.chunk_overlap)
+                for slice_start in range(start, end, slice_size):
+                    spans.append((slice_start, min(slice_start + slice_size, end)))
+                return
+            
+            # Split by current separator, keeping it on the preceding piece
+            found = find_all(separator)
+            lo = np.searchsorted(found, start)
+            hi = np.searchsorted(found, end - len(separator), side='right')
+            ends = np.asarray(self._non_overlapping(found[lo:hi], separator)) + len(separator)
+            if ends[-1] < end:
+                ends = np.append(ends, end)
+            starts = np.empty_like(ends)
+            starts[0] = start
+            starts[1:] = ends[:-1]
+            oversized = np.flatnonzero(ends - starts > self.chunk_size).tolist()
+            piece_starts = starts.tolist()
+            piece_ends = ends.tolist()
+            
+            # Pieces that fit are final; larger ones are split with the next separators
+            done = 0
+            for i in oversized:
+                spans.extend(zip(piece_starts[done:i], piece_ends[done:i]))
+                split(piece_starts[i], piece_ends[i], level + 1)
+                done = i + 1
+            spans.extend(zip(piece_starts[done:], piece_ends[done:]))
         
-        # Split by current separator
-        splits = text.split(separator)
+        if keep_if_fits and len(text) <= self.chunk_size and separators[0] not in text:
+            spans.append((0, len(text)))
+        else:
+            split(0, len(text), 0)
         
-        # If no split occurred, try next separator
-        if len(splits) == 1:
-            return self._split_text_recursive(text, remaining_separators)
+        return spans
+    
+    @staticmethod
+    def _char_codes(text: str) -> np.ndarray:
+        """
+        View text as an array of character codes, one element per character.
+        
+        ASCII text maps to bytes; anything else to UTF-32 code points, so
+        array indices are always character offsets.
+        """
+        if text.isascii():
+            return np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+        return np.frombuffer(text.encode('utf-32-le', errors='surrogatepass'), dtype=np.uint32)
+    
+    @staticmethod
+    def _separator_offsets(codes: np.ndarray, separator: str) -> np.ndarray:
+        """
+        Find every (possibly overlapping) occurrence of a separator.
         
-        # Recursively split each piece if still too large
-        final_splits = []
-        for i, split in enumerate(splits):
-            # Re-add separator except for last split
-            if i < len(splits) - 1:
-                split = split + separator
+        Args:
+            codes: Character codes of the text (from _char_codes)
+            separator: Non-empty separator to locate
             
-            # If split is still too large, split it further
-            if len(split) > self.chunk_size:
-                final_splits.extend(
-                    self._split_text_recursive(split, remaining_separators)
-                )
-            else:
-                final_splits.append(split)
+        Returns:
+            Sorted int64 array of start offsets
+        """
+        n = len(codes) - len(separator) + 1
+        if n <= 0:
+            return np.empty(0, dtype=np.int64)
+        
+        mask = codes[:n] == ord(separator[0])
+        for k in range(1, len(separator)):
+            mask &= codes[k:n + k] == ord(separator[k])
+        return np.flatnonzero(mask)
+    
+    @staticmethod
+    def _occurs(found: np.ndarray, separator: str, start: int, end: int) -> bool:
+        """Check whether a separator with the given offsets lies entirely within [start, end)."""
+        idx = np.searchsorted(found, start)
+        return idx < len(found) and found[idx] + len(separator) <= end
+    
+    @staticmethod
+    def _non_overlapping(candidates: np.ndarray, separator: str) -> np.ndarray:
+        """Keep the matches a left-to-right str.find scan would produce."""
+        if all(separator[k:] != separator[:-k] for k in range(1, len(separator))):
+            # Separator can't overlap itself, so every match is kept
+            return candidates
+        
+        if len(set(separator)) == 1 and len(candidates):
+            # Runs of one repeated character: matches in a run are consecutive
+            # and the scan keeps every len(separator)-th one from its start
+            positions = np.arange(len(candidates))
+            run_starts = np.diff(candidates, prepend=candidates[0] - 2) != 1
+            run_start_positions = np.maximum.accumulate(np.where(run_starts, positions, 0))
+            return candidates[(positions - run_start_positions) % len(separator) == 0]
         
-        return final_splits
+        kept = []
+        next_allowed = -1
+        for idx in candidates.tolist():
+            if idx >= next_allowed:
+                kept.append(idx)
+                next_allowed = idx + len(separator)
+        return np.array(kept, dtype=np.int64)
     
     def chunk_batch(
         self,
-        documents: List[Dict[str, Any]]
+        documents: List[Dict[str, Any]],
+        workers: Optional[int] = None
     ) -> Dict[str, List[Chunk]]:
         """
         Chunk multiple documents in batch.
         
+        Documents are independent, so they are spread across a process pool.
+        
         Args:
             documents: List of dicts with 'text', 'doc_id', and 'metadata'
+            workers: Number of worker processes (default: CPU count - 1, 1 = serial)
             
         Returns:
             Dictionary mapping doc_id to list of chunks
         """
-        result = {}
+        tasks = [(doc.get("text", ""), doc.get("doc_id"), doc.get("metadata", {})) for doc in documents]
         
-        for doc in documents:
-            doc_id = doc.get("doc_id")
-            text = doc.get("text", "")
-            metadata = doc.get("metadata", {})
-            
-            chunks = self.chunk(text, doc_id, metadata)
-            result[doc_id] = chunks
+        workers = resolve_worker_count(workers, len(tasks))
+        if workers > 1:
+            # Each worker builds its chunker once and reuses it for every task
+            with process_pool(
+                workers,
+                initializer=_init_chunk_worker,
+                initargs=(self.chunk_size, self.chunk_overlap, self.separators)
+            ) as pool:
+                chunk_lists = pool.starmap(_chunk_one, tasks, chunksize=pool_chunksize(len(tasks), workers))
+        else:
+            chunk_lists = [self.chunk(text, doc_id, metadata) for text, doc_id, metadata in tasks]
+        
+        result = {task[1]: chunks for task, chunks in zip(tasks, chunk_lists)}
         
         total_chunks = sum(len(chunks) for chunks in result.values())
         logger.info(f"Chunked {len(documents)} documents into {total_chunks} total chunks")
@@ -217,6 +445,21 @@ class RecursiveChunker:
         return result
 
 
+# Per-process chunker for chunk_batch pool workers
+_worker_chunker: Optional[RecursiveChunker] = None
+
+
+def _init_chunk_worker(chunk_size: int, chunk_overlap: int, separators: List[str]):
+    """Build the chunker once when a pool worker starts."""
+    global _worker_chunker
+    _worker_chunker = RecursiveChunker(chunk_size, chunk_overlap, separators)
+
+
+def _chunk_one(text: str, doc_id: str, metadata: Dict[str, Any]) -> List[Chunk]:
+    """Chunk a single document in a worker process."""
+    return _worker_chunker.chunk(text, doc_id, metadata)
+
+
 class FixedSizeChunker:
     """Simple fixed-size chunking with overlap (alternative strategy)."""
     
@@ -259,7 +502,7 @@ class FixedSizeChunker:
                 chunk_index=chunk_index,
                 start_char=start,
                 end_char=end,
-                metadata={**metadata, "chunk_index": chunk_index}
+                metadata=metadata
             ))
             
             chunk_index += 1
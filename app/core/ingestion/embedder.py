@@ -1,14 +1,227 @@
 """Embedding generation using sentence-transformers."""
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 import numpy as np
 from sentence_transformers import SentenceTransformer
-import hashlib
-import pickle
+import os
+import sqlite3
+import threading
 from pathlib import Path
+import xxhash
+from filelock import FileLock
 
 from app.config import settings
+from app.core.ingestion.chunker import Chunk
 from app.utils.logger import app_logger as logger
 
+# Output dimensions of common sentence-transformers models
+KNOWN_EMBEDDING_DIMENSIONS = {
+    "all-MiniLM-L6-v2": 384,
+    "all-MiniLM-L12-v2": 384,
+    "paraphrase-MiniLM-L6-v2": 384,
+    "multi-qa-MiniLM-L6-cos-v1": 384,
+    "all-mpnet-base-v2": 768,
+    "multi-qa-mpnet-base-dot-v1": 768,
+    "BAAI/bge-small-en-v1.5": 384,
+    "BAAI/bge-base-en-v1.5": 768,
+}
+
+# Keys per IN (...) lookup, kept well under SQLite's bound-parameter limit
+LOOKUP_BATCH_SIZE = 500
+
+# Serializes model loads; _load_model patches torch.nn.Module.to process-wide
+_model_load_lock = threading.Lock()
+
+
+def quantize(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric int8 quantization with one scale per vector.
+    
+    Args:
+        embeddings: 2D float array
+        
+    Returns:
+        Tuple of (int8 codes, float16 scales)
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    scale = np.abs(embeddings).max(axis=-1) / 127.0
+    safe_scale = np.where(scale > 0, scale, 1.0)
+    q = np.round(embeddings / safe_scale[..., None]).astype(np.int8)
+    return q, scale.astype(np.float16)
+
+
+def dequantize(q: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    """
+    Reconstruct float32 embeddings from int8 codes.
+    
+    Args:
+        q: int8 codes
+        scale: Per-vector scales
+        
+    Returns:
+        float32 embeddings
+    """
+    return q.astype(np.float32) * scale.astype(np.float32)[..., None]
+
+
+class EmbeddingCache:
+    """
+    Append-only on-disk embedding cache.
+    
+    Vectors are quantized to int8 with a float16 scale per vector and packed
+    as fixed-size records in a single memory-mapped file (emb.q8), located
+    through a SQLite index of cache key -> row, so a batch lookup is one
+    query plus one fancy-index into the map. Several processes (server
+    workers, the UI) may share the directory: appends and resets hold a
+    file lock, and rows are numbered from the real end of the shard.
+    """
+    
+    # Bump when the key scheme or record layout changes to discard old entries
+    FORMAT_VERSION = "2"
+    
+    def __init__(self, cache_dir: Path, dimension: int, model_name: str = ""):
+        """
+        Initialize cache.
+        
+        Args:
+            cache_dir: Directory holding the shard and its index
+            dimension: Embedding dimension
+            model_name: Model the vectors come from; a different model
+                resets the cache
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.dimension = dimension
+        self.model_name = model_name
+        self.vectors_path = self.cache_dir / "emb.q8"
+        self._file_lock = FileLock(str(self.cache_dir / "emb.q8.lock"))
+        self._row_dtype = np.dtype([('scale', '<f2'), ('q', 'i1', (dimension,))])
+        self.index_path = self.cache_dir / "keys.sqlite"
+        
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.memmap] = None
+        self._open()
+    
+    def _open(self):
+        """Open the key index and size the shard, resetting on model or dimension change."""
+        self._index = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._index.execute("PRAGMA journal_mode=WAL")
+        self._index.execute("CREATE TABLE IF NOT EXISTS keys (hash TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._index.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        
+        expected = {
+            "dimension": str(self.dimension),
+            "format": self.FORMAT_VERSION,
+            "model": self.model_name
+        }
+        with self._file_lock:
+            meta = dict(self._index.execute("SELECT key, value FROM meta").fetchall())
+            if any(meta.get(key) != value for key, value in expected.items()):
+                with self._index:
+                    self._index.execute("DELETE FROM keys")
+                    self._index.executemany(
+                        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                        expected.items()
+                    )
+                open(self.vectors_path, 'wb').close()
+            
+            self._sync_rows()
+    
+    def _sync_rows(self):
+        """Size the shard from the file, which other processes may have appended to."""
+        size = os.path.getsize(self.vectors_path) if self.vectors_path.exists() else 0
+        self._rows = size // self._row_dtype.itemsize
+    
+    def _mapped(self) -> Optional[np.memmap]:
+        """Get a read-only map covering all rows written so far."""
+        if self._rows == 0:
+            return None
+        if self._vectors is None or self._vectors.shape[0] != self._rows:
+            self._vectors = np.memmap(
+                self.vectors_path,
+                dtype=self._row_dtype,
+                mode='r',
+                shape=(self._rows,)
+            )
+        return self._vectors
+    
+    def get_many(self, keys: List[str]) -> Tuple[List[int], np.ndarray]:
+        """
+        Look up cached vectors.
+        
+        Args:
+            keys: Cache keys
+            
+        Returns:
+            Tuple of (positions in keys that were found, float32 vectors for them)
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        
+        with self._lock:
+            rows = {}
+            for start in range(0, len(unique_keys), LOOKUP_BATCH_SIZE):
+                batch = unique_keys[start:start + LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows.update(self._index.execute(
+                    f"SELECT hash, row FROM keys WHERE hash IN ({placeholders})",
+                    batch
+                ).fetchall())
+            
+            positions = [i for i, key in enumerate(keys) if key in rows]
+            if not positions:
+                return [], np.empty((0, self.dimension), dtype=np.float32)
+            
+            row_ids = np.fromiter((rows[keys[i]] for i in positions), dtype=np.int64, count=len(positions))
+            if row_ids.max() >= self._rows:
+                # Appended by another process since this one last looked
+                self._sync_rows()
+            vectors = self._mapped()
+            
+            # Read the shard in file order, then scatter back to request order
+            order = np.argsort(row_ids, kind='stable')
+            records = vectors[row_ids[order]]
+            result = np.empty((len(positions), self.dimension), dtype=np.float32)
+            result[order] = dequantize(records['q'], records['scale'])
+            return positions, result
+    
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        """
+        Append vectors to the shard and index them.
+        
+        Args:
+            keys: Cache keys
+            vectors: 2D array (len(keys) x dimension)
+        """
+        with self._lock:
+            records = np.empty(len(keys), dtype=self._row_dtype)
+            records['q'], records['scale'] = quantize(vectors)
+            
+            # Other processes append to the same shard, so rows are numbered
+            # from its real end and indexed before the lock is released
+            with self._file_lock:
+                with open(self.vectors_path, 'ab') as f:
+                    f.seek(0, os.SEEK_END)
+                    first_row = f.tell() // self._row_dtype.itemsize
+                    f.write(records.tobytes())
+                self._rows = first_row + len(keys)
+                
+                with self._index:
+                    self._index.executemany(
+                        "INSERT OR IGNORE INTO keys (hash, row) VALUES (?, ?)",
+                        [(key, first_row + i) for i, key in enumerate(keys)]
+                    )
+    
+    def clear(self):
+        """Drop all cached vectors."""
+        with self._lock:
+            self._vectors = None
+            self._index.close()
+            with self._file_lock:
+                for path in self.cache_dir.glob("keys.sqlite*"):
+                    path.unlink()
+                if self.vectors_path.exists():
+                    self.vectors_path.unlink()
+            self._open()
+
 
 class Embedder:
     """
@@ -35,12 +248,54 @@ class Embedder:
         self.batch_size = batch_size or settings.embedding_batch_size
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._embedding_cache: Optional[EmbeddingCache] = None
+        self._model: Optional[SentenceTransformer] = None
+        
+        # Known models report their dimension without loading any weights
+        self._embedding_dimension: Optional[int] = KNOWN_EMBEDDING_DIMENSIONS.get(
+            self.model_name.removeprefix("sentence-transformers/")
+        )
+        
+        logger.info(
+            f"Embedder initialized for {self.model_name} "
+            f"(model loads on first use), batch_size={self.batch_size}"
+        )
+    
+    @property
+    def model(self) -> SentenceTransformer:
+        """
+        Sentence-transformers model, loaded on first use.
+        
+        Concurrent first callers wait for a single load instead of each
+        loading (and patching torch) at the same time.
+        """
+        if self._model is None:
+            with _model_load_lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+    
+    @property
+    def embedding_dimension(self) -> int:
+        """Embedding dimension, from the known-models table or the loaded model."""
+        if self._embedding_dimension is None:
+            self._embedding_dimension = self.model.get_sentence_embedding_dimension()
+        return self._embedding_dimension
+    
+    def _load_model(self) -> SentenceTransformer:
+        """
+        Load the sentence-transformers model.
         
+        Returns:
+            Loaded model
+            
+        Raises:
+            RuntimeError: If the model cannot be loaded
+        """
         logger.info(f"Loading embedding model: {self.model_name}")
         
         # Fix for PyTorch 2.5+ meta tensor issue with Python 3.13
         import torch
-        import os
         import warnings
         
         # Set environment variables to prevent meta device usage
@@ -77,7 +332,7 @@ class Embedder:
         
         try:
             logger.info("Loading model with PyTorch 2.5+ meta tensor fix...")
-            self.model = SentenceTransformer(
+            model = SentenceTransformer(
                 self.model_name, 
                 device='cpu'
             )
@@ -89,12 +344,16 @@ class Embedder:
             # Restore original to() method to avoid side effects
             torch.nn.Module.to = original_to
         
-        self.embedding_dimension = self.model.get_sentence_embedding_dimension()
+        dimension = model.get_sentence_embedding_dimension()
+        if self._embedding_dimension not in (None, dimension):
+            logger.warning(
+                f"{self.model_name} has dimension {dimension}, "
+                f"expected {self._embedding_dimension}"
+            )
+        self._embedding_dimension = dimension
+        logger.info(f"Embedding model ready with dimension={dimension}")
         
-        logger.info(
-            f"Embedder initialized with dimension={self.embedding_dimension}, "
-            f"batch_size={self.batch_size}"
-        )
+        return model
     
     def embed_text(self, text: str, normalize: bool = True) -> np.ndarray:
         """
@@ -137,18 +396,56 @@ class Embedder:
         
         logger.info(f"Generating embeddings for {len(chunks)} chunks")
         
-        # Generate embeddings in batches
-        embeddings = self.model.encode(
-            chunks,
+        # Encode longest first so each batch holds similar lengths and
+        # little of the forward pass is spent on padding
+        order = np.argsort([-len(chunk) for chunk in chunks], kind='stable')
+        sorted_embeddings = self.model.encode(
+            [chunks[i] for i in order],
             batch_size=self.batch_size,
             convert_to_numpy=True,
             normalize_embeddings=normalize,
             show_progress_bar=show_progress
         )
         
+        # Restore input order
+        embeddings = np.empty_like(sorted_embeddings)
+        embeddings[order] = sorted_embeddings
+        
         logger.info(f"Generated embeddings with shape: {embeddings.shape}")
         return embeddings
     
+    def embed_documents(
+        self,
+        documents_chunks: Dict[str, List[Chunk]],
+        normalize: bool = True,
+        show_progress: bool = False
+    ) -> Dict[str, np.ndarray]:
+        """
+        Generate embeddings for the chunks of several documents at once.
+        
+        Chunks from all documents are encoded in a single call so small
+        documents share full batches instead of each padding out its own.
+        
+        Args:
+            documents_chunks: Mapping of doc_id to chunks (as from chunk_batch)
+            normalize: Whether to normalize embeddings
+            show_progress: Show progress bar
+            
+        Returns:
+            Mapping of doc_id to 2D array of that document's embeddings
+        """
+        flat_texts = [chunk.chunk_text for chunks in documents_chunks.values() for chunk in chunks]
+        if not flat_texts:
+            return {
+                doc_id: np.empty((0, self.embedding_dimension), dtype=np.float32)
+                for doc_id in documents_chunks
+            }
+        
+        embeddings = self.embed_chunks(flat_texts, normalize=normalize, show_progress=show_progress)
+        
+        boundaries = np.cumsum([len(chunks) for chunks in documents_chunks.values()])
+        return dict(zip(documents_chunks, np.split(embeddings, boundaries[:-1])))
+    
     def embed_query(self, query: str, normalize: bool = True) -> np.ndarray:
         """
         Generate embedding for a search query.
@@ -162,9 +459,41 @@ class Embedder:
         """
         return self.embed_text(query, normalize=normalize)
     
-    def _get_cache_key(self, text: str) -> str:
-        """Generate cache key for text."""
-        return hashlib.md5(text.encode()).hexdigest()
+    def _get_cache_key(self, text: Union[str, bytes, memoryview]) -> str:
+        """Generate cache key for text, or for its UTF-8 bytes (which hash the same)."""
+        if isinstance(text, str):
+            text = text.encode('utf-8')
+        return xxhash.xxh3_128_hexdigest(text)
+    
+    def chunk_cache_keys(self, text: str, chunks: List[Chunk]) -> List[str]:
+        """
+        Generate cache keys for chunks of a document.
+        
+        ASCII documents are encoded once and each chunk is hashed from a
+        zero-copy slice at its character offsets; otherwise each chunk's
+        text is encoded on its own.
+        
+        Args:
+            text: Full document text the chunks were cut from
+            chunks: Chunks of text
+            
+        Returns:
+            Cache keys, matching _get_cache_key(chunk.chunk_text)
+        """
+        if not text.isascii():
+            return [self._get_cache_key(chunk.chunk_text) for chunk in chunks]
+        
+        doc_bytes = memoryview(text.encode('ascii'))
+        return [self._get_cache_key(doc_bytes[chunk.start_char:chunk.end_char]) for chunk in chunks]
+    
+    @property
+    def embedding_cache(self) -> EmbeddingCache:
+        """On-disk embedding cache, opened on first use."""
+        if self._embedding_cache is None:
+            self._embedding_cache = EmbeddingCache(
+                self.cache_dir, self.embedding_dimension, self.model_name
+            )
+        return self._embedding_cache
     
     def embed_with_cache(
         self,
@@ -181,36 +510,13 @@ class Embedder:
         Returns:
             Embedding vector
         """
-        cache_key = self._get_cache_key(text)
-        cache_file = self.cache_dir / f"{cache_key}.pkl"
-        
-        # Check cache
-        if cache_file.exists():
-            try:
-                with open(cache_file, 'rb') as f:
-                    embedding = pickle.load(f)
-                logger.debug(f"Loaded embedding from cache: {cache_key}")
-                return embedding
-            except Exception as e:
-                logger.warning(f"Failed to load cached embedding: {e}")
-        
-        # Generate new embedding
-        embedding = self.embed_text(text, normalize=normalize)
-        
-        # Save to cache
-        try:
-            with open(cache_file, 'wb') as f:
-                pickle.dump(embedding, f)
-            logger.debug(f"Saved embedding to cache: {cache_key}")
-        except Exception as e:
-            logger.warning(f"Failed to save embedding to cache: {e}")
-        
-        return embedding
+        return self.embed_batch_with_cache([text], normalize=normalize)[0]
     
     def embed_batch_with_cache(
         self,
         texts: List[str],
-        normalize: bool = True
+        normalize: bool = True,
+        keys: Optional[List[str]] = None
     ) -> np.ndarray:
         """
         Generate embeddings for batch with caching.
@@ -218,62 +524,61 @@ class Embedder:
         Args:
             texts: List of texts
             normalize: Whether to normalize
+            keys: Precomputed cache keys for texts (e.g. from chunk_cache_keys)
             
         Returns:
             2D array of embeddings
         """
-        embeddings = []
-        texts_to_embed = []
-        text_indices = []
-        
-        # Check cache for each text
-        for i, text in enumerate(texts):
-            cache_key = self._get_cache_key(text)
-            cache_file = self.cache_dir / f"{cache_key}.pkl"
-            
-            if cache_file.exists():
-                try:
-                    with open(cache_file, 'rb') as f:
-                        embedding = pickle.load(f)
-                    embeddings.append((i, embedding))
-                except Exception:
-                    texts_to_embed.append(text)
-                    text_indices.append(i)
-            else:
-                texts_to_embed.append(text)
-                text_indices.append(i)
-        
-        # Generate embeddings for uncached texts
-        if texts_to_embed:
-            logger.info(f"Generating {len(texts_to_embed)} new embeddings (cached: {len(embeddings)})")
-            new_embeddings = self.embed_chunks(texts_to_embed, normalize=normalize)
+        if not texts:
+            return np.array([])
+        
+        if keys is None:
+            keys = [self._get_cache_key(text) for text in texts]
+        if not normalize:
+            # Raw and normalized vectors of the same text are different entries
+            keys = [f"{key}:raw" for key in keys]
+        result = np.empty((len(texts), self.embedding_dimension), dtype=np.float32)
+        
+        # Check cache for all texts at once
+        try:
+            found, cached = self.embedding_cache.get_many(keys)
+        except Exception as e:
+            logger.warning(f"Failed to load cached embeddings: {e}")
+            found, cached = [], None
+        if found:
+            result[found] = cached
+        
+        # Generate embeddings for uncached texts, encoding duplicates once
+        found_set = set(found)
+        missing: dict = {}
+        for i, key in enumerate(keys):
+            if i not in found_set:
+                missing.setdefault(key, []).append(i)
+        if missing:
+            logger.info(f"Generating {len(missing)} new embeddings (cached: {len(found)})")
+            first_indices = [indices[0] for indices in missing.values()]
+            new_embeddings = self.embed_chunks([texts[i] for i in first_indices], normalize=normalize)
+            for embedding, indices in zip(new_embeddings, missing.values()):
+                result[indices] = embedding
             
-            # Save to cache and add to results
-            for idx, text, embedding in zip(text_indices, texts_to_embed, new_embeddings):
-                embeddings.append((idx, embedding))
-                
-                # Save to cache
-                try:
-                    cache_key = self._get_cache_key(text)
-                    cache_file = self.cache_dir / f"{cache_key}.pkl"
-                    with open(cache_file, 'wb') as f:
-                        pickle.dump(embedding, f)
-                except Exception as e:
-                    logger.warning(f"Failed to cache embedding: {e}")
-        
-        # Sort by original index and extract embeddings
-        embeddings.sort(key=lambda x: x[0])
-        result = np.array([emb for _, emb in embeddings])
+            # Save to cache
+            try:
+                self.embedding_cache.put_many(list(missing), new_embeddings)
+            except Exception as e:
+                logger.warning(f"Failed to cache embeddings: {e}")
         
         return result
     
     def clear_cache(self):
         """Clear the embedding cache."""
-        import shutil
-        if self.cache_dir.exists():
-            shutil.rmtree(self.cache_dir)
-            self.cache_dir.mkdir(parents=True, exist_ok=True)
-            logger.info("Embedding cache cleared")
+        if self._embedding_cache is not None:
+            self._embedding_cache.clear()
+        else:
+            import shutil
+            if self.cache_dir.exists():
+                shutil.rmtree(self.cache_dir)
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+        logger.info("Embedding cache cleared")
     
     def get_dimension(self) -> int:
         """Get embedding dimension."""
@@ -282,7 +587,8 @@ class Embedder:
     def cosine_similarity(
         self,
         embedding1: np.ndarray,
-        embedding2: np.ndarray
+        embedding2: np.ndarray,
+        assume_normalized: bool = True
     ) -> float:
         """
         Calculate cosine similarity between two embeddings.
@@ -290,28 +596,57 @@ class Embedder:
         Args:
             embedding1: First embedding
             embedding2: Second embedding
+            assume_normalized: Both embeddings are already unit length, as
+                the embed_* methods return by default; pass False for raw vectors
             
         Returns:
             Cosine similarity score
         """
-        # Normalize if not already
-        emb1_norm = embedding1 / (np.linalg.norm(embedding1) + 1e-10)
-        emb2_norm = embedding2 / (np.linalg.norm(embedding2) + 1e-10)
+        similarity = np.dot(embedding1, embedding2)
+        if assume_normalized:
+            return float(similarity)
+        
+        norms = np.linalg.norm(embedding1) * np.linalg.norm(embedding2)
+        return float(similarity / (norms + 1e-10))
+    
+    def cosine_similarity_matrix(
+        self,
+        queries: np.ndarray,
+        docs: np.ndarray
+    ) -> np.ndarray:
+        """
+        Calculate pairwise cosine similarities in a single matrix product.
         
-        # Compute dot product
-        similarity = np.dot(emb1_norm, emb2_norm)
-        return float(similarity)
+        Both inputs must already be L2-normalized (the default for
+        embed_text/embed_chunks/embed_query); no normalization is applied here.
+        
+        Args:
+            queries: 2D array (n_queries x dimension)
+            docs: 2D array (n_docs x dimension)
+            
+        Returns:
+            2D array (n_queries x n_docs) of similarity scores
+        """
+        return np.atleast_2d(queries) @ np.atleast_2d(docs).T
 
 
 # Global embedder instance (singleton pattern)
 _embedder_instance: Optional[Embedder] = None
+_embedder_lock = threading.Lock()
 
 
 def get_embedder() -> Embedder:
-    """Get or create global embedder instance."""
+    """
+    Get or create global embedder instance.
+    
+    Concurrent first callers (request threads, LLM batch workers) share one
+    instance; its model is loaded once, on first use (see Embedder.model).
+    """
     global _embedder_instance
     
     if _embedder_instance is None:
-        _embedder_instance = Embedder()
+        with _embedder_lock:
+            if _embedder_instance is None:
+                _embedder_instance = Embedder()
     
     return _embedder_instance
@@ -1,6 +1,8 @@
 """Text extraction from various document formats."""
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+import codecs
+import multiprocessing
 import os
 from pathlib import Path
 
@@ -8,8 +10,15 @@ import fitz  # PyMuPDF
 from docx import Document
 import chardet
 
+from app.utils.helpers import pool_chunksize, process_pool, resolve_worker_count
 from app.utils.logger import app_logger as logger
 
+# Bytes fed to chardet when a file is not valid UTF-8
+CHARDET_SAMPLE_SIZE = 64 * 1024
+
+# Pages each worker process must get before a PDF is extracted in parallel
+MIN_PAGES_PER_WORKER = 32
+
 
 class ExtractionResult:
     """Structured output from text extraction."""
@@ -45,15 +54,87 @@ class TextExtractor(ABC):
     def supports(self, file_extension: str) -> bool:
         """Check if this extractor supports the file type."""
         pass
+    
+    def iter_pages(self, file_path: str) -> Iterator[Tuple[int, str]]:
+        """
+        Yield the text of the file page by page.
+        
+        Formats without pages yield the whole text as page 1.
+        
+        Args:
+            file_path: Path to file
+            
+        Yields:
+            Tuples of (page_number, page_text), page numbers starting at 1
+        """
+        yield 1, self.extract(file_path).text
 
 
 class PDFExtractor(TextExtractor):
     """Extract text from PDF files using PyMuPDF."""
     
+    def __init__(self, page_workers: Optional[int] = 1):
+        """
+        Initialize extractor.
+        
+        Args:
+            page_workers: Worker processes for large PDFs (1 = extract in this
+                process, None = CPU count - 1). Starting processes costs more
+                than small PDFs take, so this is opt-in for bulk jobs.
+        """
+        self.page_workers = page_workers
+    
     def supports(self, file_extension: str) -> bool:
         """Check if file is a PDF."""
         return file_extension.lower() == '.pdf'
     
+    def _page_texts(self, doc: "fitz.Document", file_path: str) -> List[str]:
+        """
+        Get the text of every page, optionally splitting large PDFs across processes.
+        
+        PyMuPDF is not thread-safe, so parallelism comes from worker
+        processes that each open the file and extract a contiguous page range.
+        Only used when page_workers is not 1.
+        
+        Args:
+            doc: Open document
+            file_path: Path to the PDF, reopened by each worker
+            
+        Returns:
+            Page texts in page order
+        """
+        page_count = len(doc)
+        workers = resolve_worker_count(self.page_workers, page_count // MIN_PAGES_PER_WORKER)
+        
+        # Daemonic pool workers (e.g. under extract_batch) can't start their own pool
+        if workers <= 1 or multiprocessing.current_process().daemon:
+            return [page.get_text() for page in doc]
+        
+        step = -(-page_count // workers)
+        ranges = [(file_path, start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        with process_pool(workers) as pool:
+            parts = pool.starmap(_extract_page_range, ranges)
+        
+        return [text for part in parts for text in part]
+    
+    def iter_pages(self, file_path: str) -> Iterator[Tuple[int, str]]:
+        """
+        Yield page texts one at a time without building the full document.
+        
+        Pair with RecursiveChunker.chunk_stream to chunk large PDFs in
+        bounded memory; offsets line up with extract(), which joins pages
+        with a newline.
+        
+        Args:
+            file_path: Path to PDF file
+            
+        Yields:
+            Tuples of (page_number, page_text), page numbers starting at 1
+        """
+        with fitz.open(file_path) as doc:
+            for page_num, page in enumerate(doc, start=1):
+                yield page_num, page.get_text()
+    
     def extract(self, file_path: str) -> ExtractionResult:
         """
         Extract text from PDF page-by-page with metadata.
@@ -72,10 +153,7 @@ class PDFExtractor(TextExtractor):
             page_mapping = []
             current_char_position = 0
             
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                page_text = page.get_text()
-                
+            for page_num, page_text in enumerate(self._page_texts(doc, file_path)):
                 # Track character positions for highlighting
                 page_start = current_char_position
                 page_end = current_char_position + len(page_text)
@@ -219,15 +297,25 @@ class TXTExtractor(TextExtractor):
         logger.info(f"Extracting text from TXT: {file_path}")
         
         try:
-            # Detect encoding
             with open(file_path, 'rb') as f:
                 raw_data = f.read()
-                result = chardet.detect(raw_data)
-                encoding = result['encoding'] or 'utf-8'
             
-            # Read with detected encoding
-            with open(file_path, 'r', encoding=encoding, errors='ignore') as f:
-                text = f.read()
+            # Most files are UTF-8 (or ASCII); only run detection when that fails
+            if raw_data.startswith(codecs.BOM_UTF8):
+                encoding = 'utf-8-sig'
+                text = raw_data[len(codecs.BOM_UTF8):].decode('utf-8', errors='ignore')
+            else:
+                try:
+                    encoding = 'utf-8'
+                    text = raw_data.decode('utf-8')
+                except UnicodeDecodeError:
+                    result = chardet.detect(raw_data[:CHARDET_SAMPLE_SIZE])
+                    encoding = result['encoding'] or 'latin-1'
+                    text = raw_data.decode(encoding, errors='ignore')
+            
+            # Match text-mode reads, which translate \r\n and \r to \n
+            if '\r' in text:
+                text = text.replace('\r\n', '\n').replace('\r', '\n')
             
             # Create simple page mapping (no actual pages in text files)
             page_mapping = [{
@@ -303,3 +391,45 @@ class ExtractorFactory:
         """
         extractor = self.get_extractor(file_path)
         return extractor.extract(file_path)
+    
+    def extract_batch(
+        self,
+        file_paths: List[str],
+        workers: Optional[int] = None
+    ) -> List[ExtractionResult]:
+        """
+        Extract text from several files across a process pool.
+        
+        Args:
+            file_paths: Paths to files
+            workers: Number of worker processes (default: CPU count - 1, 1 = serial)
+            
+        Returns:
+            ExtractionResults in the same order as file_paths
+        """
+        workers = resolve_worker_count(workers, len(file_paths))
+        if workers > 1:
+            with process_pool(workers, initializer=_init_extract_worker) as pool:
+                return pool.map(_extract_one, file_paths, chunksize=pool_chunksize(len(file_paths), workers))
+        return [self.extract(file_path) for file_path in file_paths]
+
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop) in a worker process."""
+    with fitz.open(file_path) as doc:
+        return [doc[page_num].get_text() for page_num in range(start, stop)]
+
+
+# Per-process factory for extract_batch pool workers
+_worker_factory: Optional[ExtractorFactory] = None
+
+
+def _init_extract_worker():
+    """Build the extractor factory once when a pool worker starts."""
+    global _worker_factory
+    _worker_factory = ExtractorFactory()
+
+
+def _extract_one(file_path: str) -> ExtractionResult:
+    """Extract a single file in a worker process."""
+    return _worker_factory.extract(file_path)
@@ -1,14 +1,51 @@
 """FAISS index management for vector similarity search."""
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+import math
+import os
 import numpy as np
 import faiss
+import orjson
 import pickle
 from pathlib import Path
 
 from app.config import settings
+from app.core.ingestion.metadata_store import MetadataStore
 from app.utils.logger import app_logger as logger
 
 
+# Metadata is stored next to the index file; pickle files are read for
+# indexes saved before the columnar format
+METADATA_FILENAME = "metadata.json"
+LEGACY_METADATA_FILENAME = "metadata.pkl"
+
+# Index types that must be trained before use; vectors are buffered in a
+# flat index until FAISS_IVF_TRAIN_SIZE have been added
+TRAINED_INDEX_TYPES = ("IndexIVFPQ", "ScalarQuantizer8bit")
+
+# Batched search is compute-bound and scales with threads; a single query is
+# memory-bound and only pays OpenMP overhead for extra threads
+FAISS_THREADS = max(1, min(os.cpu_count() or 1, settings.faiss_threads or 8))
+faiss.omp_set_num_threads(FAISS_THREADS)
+
+
+@contextmanager
+def omp_threads(num_threads: int) -> Iterator[None]:
+    """
+    Temporarily set the number of FAISS OpenMP threads.
+    
+    Args:
+        num_threads: Threads to use inside the block
+    """
+    previous = faiss.omp_get_max_threads()
+    faiss.omp_set_num_threads(num_threads)
+    try:
+        yield
+    finally:
+        faiss.omp_set_num_threads(previous)
+
+
 class FaissIndexManager:
     """
     Manage FAISS index for efficient vector similarity search.
@@ -27,7 +64,9 @@ class FaissIndexManager:
         
         Args:
             dimension: Embedding dimension
-            index_type: Type of FAISS index (IndexFlatIP or IndexFlatL2)
+            index_type: Type of FAISS index (IndexFlatIP, IndexFlatL2,
+                IndexHNSWFlat, RefinedHNSW, IndexIVFPQ, ScalarQuantizerFP16
+                or ScalarQuantizer8bit)
             index_path: Path to save/load index
         """
         self.dimension = dimension
@@ -36,9 +75,33 @@ class FaissIndexManager:
         self.metadata_path = Path(settings.faiss_metadata_path)
         
         self.index: Optional[faiss.Index] = None
-        self.metadata: Dict[int, Dict[str, Any]] = {}
+        self.metadata = MetadataStore()
         self.current_id = 0
         
+        # Set while the index's inverted lists are memory-mapped (read-only)
+        self._mmap_path: Optional[Path] = None
+        
+        # Saves run one at a time, off the caller's thread
+        self._save_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="faiss-save")
+        
+        # Per-query search breadth for approximate indexes
+        self.ef_search = settings.faiss_hnsw_ef_search
+        self.nprobe = settings.faiss_ivf_nprobe
+        self.refine_k_factor = settings.faiss_refine_k_factor
+        
+        # Optional GPU copy of the index used for search; self.index stays
+        # on CPU and remains the source of truth for adds, deletes and saves
+        self.gpu_res = None
+        self._gpu_index: Optional[faiss.Index] = None
+        if settings.faiss_use_gpu:
+            if hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0:
+                self.gpu_res = faiss.StandardGpuResources()
+                logger.info(
+                    "FAISS GPU search enabled; batch queries to amortize host/device transfers"
+                )
+            else:
+                logger.warning("FAISS_USE_GPU is set but no GPU is available, using CPU")
+        
         logger.info(f"Initialized FaissIndexManager with type={self.index_type}")
     
     def create_index(self, dimension: int = None):
@@ -56,19 +119,52 @@ class FaissIndexManager:
         
         logger.info(f"Creating FAISS index with dimension={self.dimension}")
         
+        self.index = self._new_index()
+        self._gpu_index = None
+        self._mmap_path = None
+        
+        self.metadata = MetadataStore()
+        self.current_id = 0
+        
+        logger.info(f"Created {self.index_type} index")
+    
+    def _new_index(self) -> faiss.IndexIDMap2:
+        """
+        Build an empty ID-mapped index of the configured type.
+        
+        Returns:
+            Empty IndexIDMap2
+        """
         if self.index_type == "IndexFlatIP":
             # Inner product (cosine similarity for normalized vectors)
-            self.index = faiss.IndexFlatIP(self.dimension)
+            base_index = faiss.IndexFlatIP(self.dimension)
         elif self.index_type == "IndexFlatL2":
             # L2 distance
-            self.index = faiss.IndexFlatL2(self.dimension)
+            base_index = faiss.IndexFlatL2(self.dimension)
+        elif self.index_type in ("IndexHNSWFlat", "RefinedHNSW"):
+            # Graph index, sublinear search without training
+            base_index = faiss.IndexHNSWFlat(
+                self.dimension, settings.faiss_hnsw_m, faiss.METRIC_INNER_PRODUCT
+            )
+            base_index.hnsw.efConstruction = settings.faiss_hnsw_ef_construction
+            if self.index_type == "RefinedHNSW":
+                # Keeps exact vectors to re-score HNSW candidates, recovering
+                # near brute-force recall
+                base_index = faiss.IndexRefineFlat(base_index)
+        elif self.index_type == "ScalarQuantizerFP16":
+            # Half the bytes scanned per query; fp16 needs no training
+            base_index = faiss.IndexScalarQuantizer(
+                self.dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+            )
+        elif self.index_type in TRAINED_INDEX_TYPES:
+            # Needs training data; vectors go to a flat index until enough
+            # have arrived (see _train_pending)
+            base_index = faiss.IndexFlatIP(self.dimension)
         else:
             raise ValueError(f"Unsupported index type: {self.index_type}")
         
-        self.metadata = {}
-        self.current_id = 0
-        
-        logger.info(f"Created {self.index_type} index")
+        # Explicit IDs keep vector IDs stable and allow in-place removal
+        return faiss.IndexIDMap2(base_index)
     
     def add_vectors(
         self,
@@ -91,21 +187,29 @@ class FaissIndexManager:
         if len(embeddings) != len(metadata_list):
             raise ValueError("Number of embeddings must match metadata list length")
         
-        # Ensure embeddings are contiguous float32
-        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        # Contiguous float32, unit length for inner-product indexes
+        embeddings = self._as_index_input(embeddings)
+        
+        self._ensure_writable()
         
         # Get starting ID
         start_id = self.current_id
         
         # Add to index
-        self.index.add(embeddings)
+        ids = np.arange(start_id, start_id + len(embeddings), dtype=np.int64)
+        self.index.add_with_ids(embeddings, ids)
+        self._gpu_index = None
+        
+        if (
+            self.index_type in TRAINED_INDEX_TYPES
+            and isinstance(self._base_index(), faiss.IndexFlat)
+            and self.index.ntotal >= settings.faiss_ivf_train_size
+        ):
+            self._train_pending()
         
         # Store metadata
-        vector_ids = []
-        for i, meta in enumerate(metadata_list):
-            vec_id = start_id + i
-            self.metadata[vec_id] = meta
-            vector_ids.append(vec_id)
+        self.metadata.add(ids, metadata_list)
+        vector_ids = ids.tolist()
         
         self.current_id += len(embeddings)
         
@@ -128,53 +232,77 @@ class FaissIndexManager:
         Returns:
             List of results with metadata and scores
         """
-        if self.index is None or self.index.ntotal == 0:
-            logger.warning("Index is empty or not created")
-            return []
+        results = self.search_batch(np.asarray(query_embedding).reshape(1, -1), top_k)[0]
         
-        # Ensure query is 2D and float32
-        if query_embedding.ndim == 1:
-            query_embedding = query_embedding.reshape(1, -1)
-        query_embedding = np.ascontiguousarray(query_embedding, dtype=np.float32)
+        logger.info(f"Found {len(results)} results for query")
         
-        # Search
-        top_k = min(top_k, self.index.ntotal)
-        distances, indices = self.index.search(query_embedding, top_k)
+        return results
+    
+    def search_batch(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 5
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for similar vectors for several queries in one FAISS call.
         
-        # Prepare results
-        results = []
-        for i in range(top_k):
-            idx = int(indices[0][i])
-            distance = float(distances[0][i])
-            
-            if idx == -1:  # No more results
-                break
-            
-            # Convert distance to similarity score
-            if self.index_type == "IndexFlatIP":
-                # For inner product, higher is better (already similarity)
-                score = distance
-            else:
-                # For L2, lower is better (convert to similarity)
-                score = 1.0 / (1.0 + distance)
+        Prefer this over calling search() in a loop: one call lets FAISS
+        parallelize across queries (and amortizes transfers on GPU).
+        
+        Args:
+            query_embeddings: 2D array of query embeddings (num_queries x dimension)
+            top_k: Number of results to return per query
             
-            result = {
-                "faiss_id": idx,
-                "score": score,
-                "distance": distance,
-                **self.metadata.get(idx, {})
-            }
-            results.append(result)
+        Returns:
+            One list of results with metadata and scores per query
+        """
+        if query_embeddings.ndim == 1:
+            query_embeddings = query_embeddings.reshape(1, -1)
         
-        logger.info(f"Found {len(results)} results for query")
+        if self.index is None or self.index.ntotal == 0:
+            logger.warning("Index is empty or not created")
+            return [[] for _ in range(len(query_embeddings))]
         
-        return results
+        # Contiguous float32, unit length for inner-product indexes
+        query_embeddings = self._as_index_input(query_embeddings)
+        
+        # Search
+        top_k = min(top_k, self.index.ntotal)
+        index = self._search_index()
+        self._set_search_params(index, top_k)
+        with omp_threads(1 if len(query_embeddings) == 1 else FAISS_THREADS):
+            distances, indices = index.search(query_embeddings, top_k)
+        
+        # Convert distances to similarity scores
+        if self.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            # For inner product, higher is better (already similarity)
+            scores = distances
+        else:
+            # For L2, lower is better (convert to similarity)
+            scores = 1.0 / (1.0 + distances)
+        
+        # Prepare results; FAISS pads rows with -1 when fewer hits exist
+        hits = indices >= 0
+        batch_results = []
+        for row_hits, row_ids, row_scores, row_distances in zip(hits, indices, scores, distances):
+            row_ids = row_ids[row_hits]
+            batch_results.append([
+                {"faiss_id": idx, "score": score, "distance": distance, **meta}
+                for idx, score, distance, meta in zip(
+                    row_ids.tolist(),
+                    row_scores[row_hits].tolist(),
+                    row_distances[row_hits].tolist(),
+                    self.metadata.get_many(row_ids)
+                )
+            ])
+        
+        return batch_results
     
     def delete_by_doc_id(self, doc_id: str) -> int:
         """
         Delete all vectors associated with a document.
         
-        Note: FAISS doesn't support deletion, so we rebuild the index.
+        Vectors are removed in place by ID; other vectors keep their IDs.
         
         Args:
             doc_id: Document ID to delete
@@ -185,73 +313,99 @@ class FaissIndexManager:
         if self.index is None:
             return 0
         
-        # Find vectors to keep
-        vectors_to_keep = []
-        metadata_to_keep = []
+        ids = self.metadata.ids_for_doc(doc_id)
         
-        for vec_id, meta in self.metadata.items():
-            if meta.get("doc_id") != doc_id:
-                # This vector should be kept
-                # We need to extract the vector from the index
-                vectors_to_keep.append(vec_id)
-                metadata_to_keep.append(meta)
-        
-        deleted_count = len(self.metadata) - len(vectors_to_keep)
-        
-        if deleted_count > 0:
-            logger.info(f"Deleting {deleted_count} vectors for doc_id: {doc_id}")
+        if ids.size > 0:
+            logger.info(f"Deleting {ids.size} vectors for doc_id: {doc_id}")
             
-            # Rebuild index
-            if vectors_to_keep:
-                # Extract vectors to keep
-                embeddings_to_keep = []
-                for vec_id in vectors_to_keep:
-                    # Reconstruct vector from index
-                    vec = self.index.reconstruct(vec_id)
-                    embeddings_to_keep.append(vec)
-                
-                # Create new index
-                self.create_index(self.dimension)
-                
-                # Re-add kept vectors
-                if embeddings_to_keep:
-                    embeddings_array = np.array(embeddings_to_keep)
-                    self.add_vectors(embeddings_array, metadata_to_keep)
+            self._ensure_writable()
+            if isinstance(self._core_index(), faiss.IndexHNSW):
+                # HNSW graphs do not support removal
+                self._rebuild_without(ids)
             else:
-                # No vectors left, create empty index
-                self.create_index(self.dimension)
+                self.index.remove_ids(ids)
+            self._gpu_index = None
+            self.metadata.remove(ids)
             
-            logger.info(f"Deleted {deleted_count} vectors")
+            logger.info(f"Deleted {ids.size} vectors")
         
-        return deleted_count
+        return int(ids.size)
     
-    def save_index(self, path: str = None):
+    def save_index(self, path: str = None) -> Future:
         """
-        Save index and metadata to disk.
+        Save index and metadata to disk in the background.
+        
+        The index is serialized and the metadata snapshotted before this
+        returns, so later changes never leak into the save. Files are written
+        next to their targets and swapped in with os.replace, so a reader (or
+        a memory-mapped index) never sees a partially written file.
         
         Args:
             path: Optional custom path (uses default if not provided)
+            
+        Returns:
+            Future that completes once both files are written
         """
         if self.index is None:
             raise ValueError("No index to save")
         
         index_path = Path(path) if path else self.index_path
-        metadata_path = index_path.parent / "metadata.pkl"
         
-        # Ensure directory exists
-        index_path.parent.mkdir(parents=True, exist_ok=True)
+        header = {
+            "current_id": self.current_id,
+            "dimension": self.dimension,
+            "index_type": self.index_type
+        }
+        return self._save_executor.submit(
+            self._write_files,
+            index_path,
+            faiss.serialize_index(self.index),
+            self.metadata.copy(),
+            header
+        )
+    
+    def flush(self):
+        """Block until all pending background saves have finished."""
+        self._save_executor.submit(lambda: None).result()
+    
+    @staticmethod
+    def _write_files(
+        index_path: Path,
+        index_bytes: np.ndarray,
+        metadata: MetadataStore,
+        header: Dict[str, Any]
+    ):
+        """
+        Write a serialized index and its metadata atomically.
         
-        # Save FAISS index
-        faiss.write_index(self.index, str(index_path))
+        Args:
+            index_path: Target index file
+            index_bytes: Output of faiss.serialize_index
+            metadata: Metadata snapshot
+            header: Manager state stored alongside the metadata
+        """
+        metadata_path = index_path.parent / METADATA_FILENAME
         
-        # Save metadata
-        with open(metadata_path, 'wb') as f:
-            pickle.dump({
-                "metadata": self.metadata,
-                "current_id": self.current_id,
-                "dimension": self.dimension,
-                "index_type": self.index_type
-            }, f)
+        try:
+            # Ensure directory exists
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            
+            # Save FAISS index
+            tmp_index_path = index_path.with_name(index_path.name + ".tmp")
+            index_bytes.tofile(tmp_index_path)
+            os.replace(tmp_index_path, index_path)
+            
+            # Save metadata
+            tmp_metadata_path = metadata_path.with_name(metadata_path.name + ".tmp")
+            tmp_metadata_path.write_bytes(orjson.dumps(
+                {**metadata.to_columns(), **header},
+                option=orjson.OPT_SERIALIZE_NUMPY,
+                default=str
+            ))
+            os.replace(tmp_metadata_path, metadata_path)
+        except Exception as e:
+            logger.error(f"Failed to save index: {e}")
+            raise
         
         logger.info(f"Saved index to {index_path}")
     
@@ -259,6 +413,11 @@ class FaissIndexManager:
         """
         Load index and metadata from disk.
         
+        The index file is memory-mapped, so loading is fast and pages are
+        read on demand; the first searches after a load are slightly slower.
+        IVF indexes are read fully into memory before their first change.
+        Pending background saves by this manager finish first.
+        
         Args:
             path: Optional custom path (uses default if not provided)
             
@@ -266,7 +425,9 @@ class FaissIndexManager:
             True if loaded successfully, False otherwise
         """
         index_path = Path(path) if path else self.index_path
-        metadata_path = index_path.parent / "metadata.pkl"
+        metadata_path = index_path.parent / METADATA_FILENAME
+        
+        self.flush()
         
         if not index_path.exists():
             logger.warning(f"Index file not found: {index_path}")
@@ -274,16 +435,31 @@ class FaissIndexManager:
         
         try:
             # Load FAISS index
-            self.index = faiss.read_index(str(index_path))
+            self.index = faiss.read_index(str(index_path), faiss.IO_FLAG_MMAP)
+            self._mmap_path = None
+            if isinstance(self.index, faiss.IndexIVF):
+                self._mmap_path = index_path
+            elif not isinstance(self.index, faiss.IndexIDMap2):
+                self.index = self._with_sequential_ids(faiss.read_index(str(index_path)))
+            elif isinstance(self._base_index(), faiss.IndexIVF):
+                self.index = self._without_id_map(faiss.read_index(str(index_path)))
+            self._gpu_index = None
             
             # Load metadata
+            legacy_metadata_path = index_path.parent / LEGACY_METADATA_FILENAME
+            data = None
             if metadata_path.exists():
-                with open(metadata_path, 'rb') as f:
+                data = orjson.loads(metadata_path.read_bytes())
+                self.metadata = MetadataStore.from_columns(data)
+            elif legacy_metadata_path.exists():
+                with open(legacy_metadata_path, 'rb') as f:
                     data = pickle.load(f)
-                    self.metadata = data["metadata"]
-                    self.current_id = data["current_id"]
-                    self.dimension = data["dimension"]
-                    self.index_type = data.get("index_type", self.index_type)
+                self.metadata = MetadataStore.from_dict(data["metadata"])
+            
+            if data is not None:
+                self.current_id = data["current_id"]
+                self.dimension = data["dimension"]
+                self.index_type = data.get("index_type", self.index_type)
             
             logger.info(f"Loaded index from {index_path} ({self.index.ntotal} vectors)")
             return True
@@ -292,6 +468,220 @@ class FaissIndexManager:
             logger.error(f"Failed to load index: {e}")
             return False
     
+    @staticmethod
+    def _with_sequential_ids(index: faiss.Index) -> faiss.IndexIDMap2:
+        """
+        Convert an index saved without explicit IDs to an ID-mapped one.
+        
+        Older indexes numbered vectors by position, so position i gets ID i.
+        
+        Args:
+            index: Index without an ID map
+            
+        Returns:
+            Equivalent IndexIDMap2
+        """
+        logger.info(f"Converting {index.ntotal}-vector index to explicit IDs")
+        
+        vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else None
+        index.reset()
+        
+        id_index = faiss.IndexIDMap2(index)
+        if vectors is not None:
+            id_index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+        return id_index
+    
+    @staticmethod
+    def _without_id_map(index: faiss.IndexIDMap2) -> faiss.IndexIVF:
+        """
+        Move the IDs of an ID-mapped IVF index into the IVF index itself.
+        
+        IVF removal does not renumber storage positions, so an ID map over an
+        IVF index breaks on the first delete. The inverted lists already hold
+        one entry per vector; their position labels are swapped for the
+        mapped IDs, list by list, without decoding any codes.
+        
+        Args:
+            index: IndexIDMap2 wrapping an IVF index
+            
+        Returns:
+            IVF index labelled with the mapped IDs
+        """
+        logger.info(f"Moving IDs of {index.ntotal}-vector IVF index into its inverted lists")
+        
+        id_map = faiss.vector_to_array(index.id_map).astype(np.int64, copy=False)
+        ivf_index = faiss.clone_index(index.index)
+        invlists = ivf_index.invlists
+        for list_no in range(ivf_index.nlist):
+            list_size = invlists.list_size(list_no)
+            if list_size == 0:
+                continue
+            positions = faiss.rev_swig_ptr(invlists.get_ids(list_no), list_size).copy()
+            codes = faiss.rev_swig_ptr(
+                invlists.get_codes(list_no), list_size * invlists.code_size
+            ).copy()
+            list_ids = np.ascontiguousarray(id_map[positions])
+            invlists.update_entries(
+                list_no, 0, list_size, faiss.swig_ptr(list_ids), faiss.swig_ptr(codes)
+            )
+        return ivf_index
+    
+    def _as_index_input(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Convert vectors to the layout the index expects, copying only if needed.
+        
+        Input that is already contiguous float32 is used as-is. Inner product
+        only equals cosine similarity for unit vectors, so vectors for
+        inner-product indexes that are not already unit length (the embedder
+        normalizes by default) are L2-normalized with FAISS's SIMD kernel.
+        That happens on a copy; the caller's array is never modified.
+        
+        Args:
+            vectors: 2D array of vectors
+            
+        Returns:
+            Contiguous float32 array
+        """
+        converted = np.ascontiguousarray(vectors, dtype=np.float32)
+        
+        if self.index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            squared_norms = np.einsum("ij,ij->i", converted, converted)
+            if not np.allclose(squared_norms, 1.0, atol=1e-4):
+                if converted is vectors:
+                    converted = converted.copy()
+                faiss.normalize_L2(converted)
+        
+        return converted
+    
+    def _ensure_writable(self):
+        """Replace a memory-mapped (read-only) index with an in-memory copy."""
+        if self._mmap_path is None:
+            return
+        
+        logger.info(f"Reading {self._mmap_path} into memory for writing")
+        self.index = faiss.read_index(str(self._mmap_path))
+        self._mmap_path = None
+        self._gpu_index = None
+    
+    def _base_index(self) -> Optional[faiss.Index]:
+        """Return the index wrapped by the ID map (or the bare IVF index), downcast."""
+        if self.index is None:
+            return None
+        return self._unwrap_id_map(self.index)
+    
+    @staticmethod
+    def _unwrap_id_map(index: faiss.Index) -> faiss.Index:
+        """Return the index below an ID map; IVF indexes keep their own IDs and have none."""
+        if isinstance(index, faiss.IndexIDMap):
+            return faiss.downcast_index(index.index)
+        return index
+    
+    def _core_index(self) -> Optional[faiss.Index]:
+        """Return the index doing the approximate search, below any refine wrapper."""
+        base_index = self._base_index()
+        if isinstance(base_index, faiss.IndexRefine):
+            return faiss.downcast_index(base_index.base_index)
+        return base_index
+    
+    def _search_index(self) -> faiss.Index:
+        """
+        Return the index to run searches against.
+        
+        With GPU enabled this is a GPU copy of self.index, re-uploaded after
+        the CPU index changes. HNSW has no GPU implementation and stays on CPU.
+        
+        Returns:
+            Index to search
+        """
+        if self.gpu_res is None or isinstance(self._core_index(), faiss.IndexHNSW):
+            return self.index
+        
+        if self._gpu_index is None:
+            self._gpu_index = faiss.index_cpu_to_gpu(
+                self.gpu_res, settings.faiss_gpu_device, self.index
+            )
+        return self._gpu_index
+    
+    def _set_search_params(self, index: faiss.Index, top_k: int):
+        """
+        Apply per-query search breadth to approximate indexes.
+        
+        Args:
+            index: Index about to be searched
+            top_k: Number of results requested
+        """
+        base_index = self._unwrap_id_map(index)
+        if isinstance(base_index, faiss.IndexRefine):
+            base_index.k_factor = self.refine_k_factor
+            base_index = faiss.downcast_index(base_index.base_index)
+        
+        if isinstance(base_index, faiss.IndexHNSW):
+            base_index.hnsw.efSearch = max(self.ef_search, top_k)
+        elif hasattr(base_index, "nprobe"):
+            # CPU and GPU IVF indexes
+            base_index.nprobe = self.nprobe
+    
+    def _id_mapped_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Read all stored vectors with their IDs.
+        
+        Both come back from single C++ calls (reconstruct_n over storage
+        positions and the ID map copied as one array), never per vector.
+        
+        Returns:
+            Tuple of (vectors, ids) in storage order
+        """
+        ids = faiss.vector_to_array(self.index.id_map).astype(np.int64, copy=False)
+        vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+        return vectors, ids
+    
+    def _train_pending(self):
+        """Train the configured index on the buffered vectors and move them into it."""
+        vectors, ids = self._id_mapped_vectors()
+        
+        if self.index_type == "IndexIVFPQ":
+            nlist = max(1, int(4 * math.sqrt(len(vectors))))
+            # Sub-quantizer count must divide the dimension
+            m = max(k for k in range(1, max(1, self.dimension // 8) + 1) if self.dimension % k == 0)
+            
+            logger.info(f"Training IVF-PQ index on {len(vectors)} vectors (nlist={nlist}, m={m})")
+            
+            quantizer = faiss.IndexFlatIP(self.dimension)
+            trained_index = faiss.IndexIVFPQ(
+                quantizer, self.dimension, nlist, m, 8, faiss.METRIC_INNER_PRODUCT
+            )
+        else:
+            logger.info(f"Training 8-bit scalar quantizer on {len(vectors)} vectors")
+            
+            trained_index = faiss.IndexScalarQuantizer(
+                self.dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+            )
+        trained_index.train(vectors)
+        
+        if isinstance(trained_index, faiss.IndexIVF):
+            # IVF stores IDs in its inverted lists and removes by ID without
+            # renumbering, which an ID map on top would misread
+            self.index = trained_index
+        else:
+            self.index = faiss.IndexIDMap2(trained_index)
+        self.index.add_with_ids(vectors, ids)
+        self._gpu_index = None
+    
+    def _rebuild_without(self, ids: np.ndarray):
+        """
+        Rebuild the index without the given IDs, keeping all other IDs.
+        
+        Args:
+            ids: IDs to drop
+        """
+        vectors, stored_ids = self._id_mapped_vectors()
+        # Boolean mask over storage positions; survivors are gathered in one copy
+        keep = ~np.isin(stored_ids, ids)
+        
+        self.index = self._new_index()
+        if keep.any():
+            self.index.add_with_ids(vectors[keep], stored_ids[keep])
+    
     def get_stats(self) -> Dict[str, Any]:
         """
         Get index statistics.
@@ -321,7 +711,9 @@ class FaissIndexManager:
             self.create_index(self.dimension)
         else:
             self.index = None
-            self.metadata = {}
+            self._gpu_index = None
+            self._mmap_path = None
+            self.metadata = MetadataStore()
             self.current_id = 0
         
         logger.info("Index cleared")
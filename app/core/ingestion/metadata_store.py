@@ -0,0 +1,317 @@
+"""Column-oriented storage for per-vector metadata."""
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+
+# Integer fields kept in int64 columns
+INT_FIELDS = ("chunk_index", "start_char", "end_char")
+
+# Marks a row without a value in an integer column
+MISSING = np.iinfo(np.int64).min
+
+# Minimum number of rows allocated when a column grows
+MIN_CAPACITY = 1024
+
+
+class MetadataStore:
+    """
+    Per-vector metadata stored as parallel arrays instead of one dict per vector.
+    
+    doc_id is dictionary-encoded into an int32 column, integer fields live
+    in int64 columns, chunk texts share one UTF-8 buffer addressed by
+    offsets, and any other fields (e.g. the nested document metadata, which
+    chunks of one document share) are kept per row. Rows are ordered by
+    vector ID, so lookups are a binary search and deleting a document is a
+    vectorized mask.
+    """
+    
+    def __init__(self):
+        """Initialize an empty store."""
+        self._size = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._doc_codes = np.empty(0, dtype=np.int32)
+        self._ints = {field: np.empty(0, dtype=np.int64) for field in INT_FIELDS}
+        self._text_bounds = np.empty((0, 2), dtype=np.int64)
+        self._text = bytearray()
+        self._extras: List[Optional[Dict[str, Any]]] = []
+        
+        self._doc_names: List[str] = []
+        self._doc_codes_by_name: Dict[str, int] = {}
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    @property
+    def ids(self) -> np.ndarray:
+        """Vector IDs in ascending order."""
+        return self._ids[:self._size]
+    
+    def add(self, ids: np.ndarray, rows: List[Dict[str, Any]]):
+        """
+        Append metadata for new vectors.
+        
+        Args:
+            ids: Vector IDs, greater than any ID already stored
+            rows: Metadata dict for each ID
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        n = len(rows)
+        if n == 0:
+            return
+        if self._size and ids[0] <= self._ids[self._size - 1]:
+            raise ValueError("Vector IDs must be added in increasing order")
+        
+        self._reserve(n)
+        rows_slice = slice(self._size, self._size + n)
+        self._ids[rows_slice] = ids
+        
+        doc_codes = np.full(n, -1, dtype=np.int32)
+        ints = {field: np.full(n, MISSING, dtype=np.int64) for field in INT_FIELDS}
+        text_bounds = np.full((n, 2), -1, dtype=np.int64)
+        
+        for i, row in enumerate(rows):
+            extras = {}
+            for key, value in row.items():
+                if key == "doc_id" and isinstance(value, str):
+                    doc_codes[i] = self._doc_code(value)
+                elif key in ints and isinstance(value, int) and not isinstance(value, bool):
+                    ints[key][i] = value
+                elif key == "chunk_text" and isinstance(value, str):
+                    start = len(self._text)
+                    self._text += value.encode("utf-8")
+                    text_bounds[i] = (start, len(self._text))
+                else:
+                    extras[key] = value
+            self._extras.append(extras or None)
+        
+        self._doc_codes[rows_slice] = doc_codes
+        for field, values in ints.items():
+            self._ints[field][rows_slice] = values
+        self._text_bounds[rows_slice] = text_bounds
+        self._size += n
+    
+    def get(self, vec_id: int, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get metadata for one vector.
+        
+        Args:
+            vec_id: Vector ID
+            default: Returned when the ID is unknown
+            
+        Returns:
+            Metadata dict
+        """
+        pos = int(np.searchsorted(self.ids, vec_id))
+        if pos < self._size and self._ids[pos] == vec_id:
+            return self._row(pos)
+        return default
+    
+    def get_many(self, ids: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Get metadata for several vectors with one vectorized lookup.
+        
+        Args:
+            ids: Vector IDs
+            
+        Returns:
+            Metadata dict per ID (empty for unknown IDs)
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, ids)
+        found = positions < self._size
+        found[found] = self._ids[positions[found]] == ids[found]
+        
+        return [
+            self._row(pos) if ok else {}
+            for pos, ok in zip(positions.tolist(), found.tolist())
+        ]
+    
+    def ids_for_doc(self, doc_id: str) -> np.ndarray:
+        """
+        Get the IDs of all vectors belonging to a document.
+        
+        Args:
+            doc_id: Document ID
+            
+        Returns:
+            Vector IDs
+        """
+        code = self._doc_codes_by_name.get(doc_id)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return self.ids[self._doc_codes[:self._size] == code].copy()
+    
+    def remove(self, ids: np.ndarray):
+        """
+        Remove metadata for the given vector IDs.
+        
+        Args:
+            ids: Vector IDs to remove
+        """
+        keep = ~np.isin(self.ids, ids)
+        kept = int(keep.sum())
+        if kept == self._size:
+            return
+        
+        self._ids = self.ids[keep]
+        self._doc_codes = self._doc_codes[:self._size][keep]
+        self._ints = {field: column[:self._size][keep] for field, column in self._ints.items()}
+        self._text_bounds = self._text_bounds[:self._size][keep]
+        self._extras = [extras for extras, k in zip(self._extras, keep.tolist()) if k]
+        self._size = kept
+        
+        # Reclaim text of removed rows once it dominates the buffer
+        live_bytes = int(np.maximum(self._text_bounds[:, 1] - self._text_bounds[:, 0], 0).sum())
+        if len(self._text) > 2 * live_bytes:
+            self._compact_text()
+    
+    def copy(self) -> "MetadataStore":
+        """
+        Snapshot the store; later changes to either copy don't affect the other.
+        
+        Returns:
+            Independent MetadataStore (row extras are shared, not deep-copied)
+        """
+        snapshot = MetadataStore()
+        snapshot._size = self._size
+        snapshot._ids = self.ids.copy()
+        snapshot._doc_codes = self._doc_codes[:self._size].copy()
+        snapshot._ints = {field: column[:self._size].copy() for field, column in self._ints.items()}
+        snapshot._text_bounds = self._text_bounds[:self._size].copy()
+        snapshot._text = bytearray(self._text)
+        snapshot._extras = list(self._extras)
+        snapshot._doc_names = list(self._doc_names)
+        snapshot._doc_codes_by_name = dict(self._doc_codes_by_name)
+        return snapshot
+    
+    def rows(self) -> Iterable[Dict[str, Any]]:
+        """Yield metadata dicts in ID order."""
+        for pos in range(self._size):
+            yield self._row(pos)
+    
+    def to_columns(self) -> Dict[str, Any]:
+        """
+        Lay out metadata as one array per field for serialization.
+        
+        Returns:
+            Dict with "ids", "columns" (field -> values in ID order) and
+            "missing" (field -> positions of rows without that field)
+        """
+        rows = list(self.rows())
+        fields = dict.fromkeys(key for row in rows for key in row)
+        
+        columns = {}
+        missing = {}
+        for field in fields:
+            columns[field] = [row.get(field) for row in rows]
+            absent = [pos for pos, row in enumerate(rows) if field not in row]
+            if absent:
+                missing[field] = absent
+        
+        return {"ids": self.ids.tolist(), "columns": columns, "missing": missing}
+    
+    @classmethod
+    def from_columns(cls, data: Dict[str, Any]) -> "MetadataStore":
+        """
+        Build a store from the output of to_columns.
+        
+        Args:
+            data: Columnar metadata
+            
+        Returns:
+            MetadataStore
+        """
+        rows = [{} for _ in data["ids"]]
+        missing = data.get("missing", {})
+        
+        for field, values in data["columns"].items():
+            absent = set(missing.get(field, ()))
+            for pos, (row, value) in enumerate(zip(rows, values)):
+                if pos not in absent:
+                    row[field] = value
+        
+        return cls.from_dict(dict(zip(data["ids"], rows)))
+    
+    @classmethod
+    def from_dict(cls, metadata: Dict[int, Dict[str, Any]]) -> "MetadataStore":
+        """
+        Build a store from metadata dicts keyed by vector ID.
+        
+        Args:
+            metadata: Metadata dicts keyed by vector ID
+            
+        Returns:
+            MetadataStore
+        """
+        store = cls()
+        ids = sorted(metadata)
+        store.add(np.array(ids, dtype=np.int64), [metadata[vec_id] for vec_id in ids])
+        return store
+    
+    def _row(self, pos: int) -> Dict[str, Any]:
+        """Rebuild the metadata dict stored at a row position."""
+        row = {}
+        
+        code = self._doc_codes[pos]
+        if code >= 0:
+            row["doc_id"] = self._doc_names[code]
+        
+        value = self._ints["chunk_index"][pos]
+        if value != MISSING:
+            row["chunk_index"] = int(value)
+        
+        start, end = self._text_bounds[pos]
+        if start >= 0:
+            row["chunk_text"] = self._text[start:end].decode("utf-8")
+        
+        for field in ("start_char", "end_char"):
+            value = self._ints[field][pos]
+            if value != MISSING:
+                row[field] = int(value)
+        
+        extras = self._extras[pos]
+        if extras:
+            row.update(extras)
+        return row
+    
+    def _doc_code(self, doc_id: str) -> int:
+        """Dictionary-encode a document ID."""
+        code = self._doc_codes_by_name.get(doc_id)
+        if code is None:
+            code = len(self._doc_names)
+            self._doc_names.append(doc_id)
+            self._doc_codes_by_name[doc_id] = code
+        return code
+    
+    def _reserve(self, extra: int):
+        """Grow the columns geometrically to fit extra rows."""
+        needed = self._size + extra
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        
+        capacity = max(needed, 2 * capacity, MIN_CAPACITY)
+        self._ids = _resized(self._ids, self._size, capacity)
+        self._doc_codes = _resized(self._doc_codes, self._size, capacity)
+        self._ints = {
+            field: _resized(column, self._size, capacity) for field, column in self._ints.items()
+        }
+        self._text_bounds = _resized(self._text_bounds, self._size, capacity)
+    
+    def _compact_text(self):
+        """Rewrite the text buffer with only the texts of stored rows."""
+        text = bytearray()
+        bounds = self._text_bounds.copy()
+        for pos, (start, end) in enumerate(self._text_bounds.tolist()):
+            if start >= 0:
+                bounds[pos] = (len(text), len(text) + end - start)
+                text += self._text[start:end]
+        
+        self._text = text
+        self._text_bounds = bounds
+
+
+def _resized(column: np.ndarray, size: int, capacity: int) -> np.ndarray:
+    """Copy the first size rows of a column into a new array of the given capacity."""
+    resized = np.empty((capacity,) + column.shape[1:], dtype=column.dtype)
+    resized[:size] = column[:size]
+    return resized
@@ -0,0 +1,65 @@
+"""Streaming extract -> chunk -> embed pipeline."""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.ingestion.chunker import Chunk, RecursiveChunker
+from app.core.ingestion.embedder import Embedder, get_embedder
+from app.core.ingestion.extractors import ExtractorFactory
+from app.utils.logger import app_logger as logger
+
+
+def ingest(
+    file_path: str,
+    doc_id: str,
+    metadata: Optional[Dict[str, Any]] = None,
+    batch_size: int = 64,
+    chunker: Optional[RecursiveChunker] = None,
+    embedder: Optional[Embedder] = None,
+    extractor_factory: Optional[ExtractorFactory] = None
+) -> Iterator[Tuple[Chunk, np.ndarray]]:
+    """
+    Extract, chunk and embed a file as a stream.
+    
+    Pages are fed to the chunker as they are extracted and chunks are
+    embedded batch_size at a time, so neither the full document text nor
+    all of its chunks are held in memory at once.
+    
+    Args:
+        file_path: Path to file
+        doc_id: Document identifier
+        metadata: Metadata attached to every chunk
+        batch_size: Number of chunks embedded per encode call
+        chunker: Chunker to use (default: RecursiveChunker())
+        embedder: Embedder to use (default: global embedder)
+        extractor_factory: Extractor factory to use (default: ExtractorFactory())
+        
+    Yields:
+        Tuples of (chunk, normalized embedding) in document order
+    """
+    chunker = chunker or RecursiveChunker()
+    embedder = embedder or get_embedder()
+    extractor = (extractor_factory or ExtractorFactory()).get_extractor(file_path)
+    
+    pages = (page_text for _, page_text in extractor.iter_pages(file_path))
+    
+    batch: List[Chunk] = []
+    total_chunks = 0
+    for chunk in chunker.chunk_stream(pages, doc_id, metadata):
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield from _embed_batch(embedder, batch)
+            total_chunks += len(batch)
+            batch = []
+    
+    if batch:
+        yield from _embed_batch(embedder, batch)
+        total_chunks += len(batch)
+    
+    logger.info(f"Ingested {total_chunks} chunks for doc_id: {doc_id}")
+
+
+def _embed_batch(embedder: Embedder, batch: List[Chunk]) -> Iterator[Tuple[Chunk, np.ndarray]]:
+    """Embed a batch of chunks and pair each chunk with its vector."""
+    embeddings = embedder.embed_chunks([chunk.chunk_text for chunk in batch], normalize=True)
+    return zip(batch, embeddings)
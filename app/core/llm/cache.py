@@ -0,0 +1,523 @@
+"""In-memory cache for deterministic LLM generations."""
+import asyncio
+import atexit
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+import numpy as np
+
+from app.config import settings
+from app.utils.logger import app_logger as logger
+
+# SHA-256 hex digest of the request parameters
+CacheKey = str
+
+# (question, digest of the retrieved chunk IDs) matched by SemanticLLMCache
+SemanticKey = Tuple[str, str]
+
+T = TypeVar("T")
+
+# Rows preallocated for the semantic cache's embedding matrix before it grows
+MIN_SEMANTIC_CAPACITY = 64
+
+# Recent prompt embeddings kept by the semantic cache (384 floats, ~1.5 KB each)
+PROMPT_EMBEDDING_CACHE_SIZE = 4096
+
+
+class LLMResponseCache:
+    """
+    LRU cache of generated text keyed on every parameter of the request.
+    
+    Only temperature-0 generations are cached: sampled outputs are expected
+    to vary between calls, so replaying one would change behavior. With a
+    path, entries are loaded at startup and written back by flush().
+    """
+    
+    def __init__(self, max_size: int = 512, path: Optional[str] = None):
+        """
+        Initialize cache.
+        
+        Args:
+            max_size: Maximum number of cached responses
+            path: JSON file to persist entries to (in-memory only if None)
+        """
+        self.max_size = max_size
+        self.path = Path(path) if path else None
+        # OrderedDict kept in LRU order: hits move to the end, eviction pops the front.
+        self._entries: "OrderedDict[CacheKey, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        
+        if self.path is not None:
+            self._load()
+            atexit.register(self.flush)
+    
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+    
+    @staticmethod
+    def make_key(
+        model: str,
+        prompt: str,
+        max_tokens: Optional[int],
+        temperature: Optional[float],
+        **params: Any
+    ) -> Optional[CacheKey]:
+        """
+        Build the cache key for a generation request.
+        
+        Args:
+            model: Model name
+            prompt: Input prompt
+            max_tokens: Maximum tokens
+            temperature: Sampling temperature
+            **params: Other generation parameters that affect the output (e.g. top_p)
+            
+        Returns:
+            Cache key, or None if the request is not cacheable
+        """
+        if temperature is None or temperature > 0:
+            return None
+        
+        request = {
+            "model": model,
+            "prompt": prompt,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            **params
+        }
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+    
+    def get(self, key: Optional[CacheKey]) -> Optional[str]:
+        """
+        Look up a cached response.
+        
+        Args:
+            key: Key from make_key (None is always a miss)
+            
+        Returns:
+            Cached text or None
+        """
+        if key is None:
+            return None
+        
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        
+        logger.debug("LLM response cache hit")
+        return text
+    
+    def put(self, key: Optional[CacheKey], text: str):
+        """
+        Store a response.
+        
+        Args:
+            key: Key from make_key (None is ignored)
+            text: Generated text
+        """
+        if key is None:
+            return
+        
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._dirty = True
+    
+    def clear(self):
+        """Drop all cached responses."""
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+            self.hits = 0
+            self.misses = 0
+    
+    def flush(self):
+        """Write entries to the cache file, if persistence is enabled and anything changed."""
+        if self.path is None:
+            return
+        
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = list(self._entries.items())
+            self._dirty = False
+        
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save LLM response cache: {e}")
+    
+    def _load(self):
+        """Restore entries written by flush(), oldest first."""
+        if not self.path.exists():
+            return
+        
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load LLM response cache: {e}")
+            return
+        
+        for key, text in entries[-self.max_size:]:
+            self._entries[key] = text
+        logger.info(f"Loaded {len(self._entries)} cached LLM responses")
+
+
+class SingleFlight:
+    """
+    Collapse concurrent identical calls into one.
+    
+    While a call for a key is running, other callers with the same key wait
+    for its result instead of repeating the work (e.g. a paid API request).
+    Keys are cache keys, so None (an uncacheable request) is never shared.
+    """
+    
+    def __init__(self):
+        """Initialize with no calls in flight."""
+        self._calls: Dict[str, Future] = {}
+        self._acalls: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Future] = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key: Optional[str], fn: Callable[[], T]) -> T:
+        """
+        Run fn, or wait for the running call with the same key.
+        
+        Args:
+            key: Call key (None always runs fn)
+            fn: Zero-argument callable doing the work
+            
+        Returns:
+            Result of fn (possibly from another caller's run)
+        """
+        if key is None:
+            return fn()
+        
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        
+        if not leader:
+            return future.result()
+        
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+    
+    async def ado(self, key: Optional[str], fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Async counterpart of do(); calls are shared within one event loop.
+        
+        Args:
+            key: Call key (None always awaits fn)
+            fn: Zero-argument callable returning an awaitable doing the work
+            
+        Returns:
+            Result of fn (possibly from another caller's run)
+        """
+        if key is None:
+            return await fn()
+        
+        loop = asyncio.get_running_loop()
+        call_key = (loop, key)
+        future = self._acalls.get(call_key)
+        if future is not None:
+            # Shielded so a cancelled waiter doesn't cancel the shared call
+            return await asyncio.shield(future)
+        
+        future = self._acalls[call_key] = loop.create_future()
+        # Mark the outcome as retrieved even if nobody else was waiting
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._acalls[call_key]
+
+
+# Global cache instance
+_response_cache: Optional[LLMResponseCache] = None
+
+# Guards creation of the global caches, which LLM instances share
+_singleton_lock = threading.Lock()
+
+
+def get_llm_response_cache() -> LLMResponseCache:
+    """Get or create global LLM response cache."""
+    global _response_cache
+    if _response_cache is None:
+        with _singleton_lock:
+            if _response_cache is None:
+                _response_cache = LLMResponseCache(
+                    max_size=settings.llm_cache_size,
+                    path=settings.llm_cache_path or None
+                )
+    return _response_cache
+
+
+class SemanticLLMCache:
+    """
+    Cache that also answers paraphrased questions.
+    
+    Prompt embeddings are kept in one contiguous float32 matrix, so a lookup
+    is a single matrix-vector product; the most similar stored prompt is
+    reused when its cosine similarity reaches the threshold. Entries are
+    scoped (e.g. by model and max_tokens) and only low-temperature
+    generations are cached. Once full, the oldest entries are overwritten.
+    Providers match on the user question with the retrieved chunks in the
+    scope (see semantic_key), never on the full prompt.
+    """
+    
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        max_size: int = 512,
+        max_temperature: float = 0.3,
+        embed_fn: Optional[Callable[[str], np.ndarray]] = None,
+        enabled: bool = True
+    ):
+        """
+        Initialize cache.
+        
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            max_size: Maximum number of cached responses
+            max_temperature: Highest sampling temperature that is cached
+            embed_fn: Returns a unit-norm embedding for a prompt (defaults to the shared embedder)
+            enabled: Whether lookups and stores do anything
+        """
+        self.threshold = threshold
+        self.max_size = max_size
+        self.max_temperature = max_temperature
+        self.enabled = enabled
+        self._embed_fn = embed_fn
+        self._lock = threading.Lock()
+        
+        self._embeddings: Optional[np.ndarray] = None
+        self._scopes = np.empty(0, dtype=np.int32)
+        self._responses: List[Optional[str]] = []
+        self._scope_codes: Dict[str, int] = {}
+        self._prompt_embeddings: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._size = 0
+        self._next = 0
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size."""
+        return {"hits": self.hits, "misses": self.misses, "size": self._size}
+    
+    def lookup(
+        self,
+        prompt: Optional[str],
+        scope: str,
+        temperature: Optional[float]
+    ) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Find the response of the most similar cached prompt.
+        
+        Args:
+            prompt: Text to match on, e.g. the user question (None skips the cache)
+            scope: Entries are only matched within the same scope
+            temperature: Sampling temperature of the request
+            
+        Returns:
+            (cached text or None, prompt embedding to pass to put, or None
+            if the request is not cacheable)
+        """
+        if (
+            not self.enabled
+            or prompt is None
+            or temperature is None
+            or temperature > self.max_temperature
+        ):
+            return None, None
+        
+        try:
+            vector = self._embed(prompt)
+        except Exception as e:
+            logger.warning(f"Semantic LLM cache unavailable: {e}")
+            return None, None
+        
+        with self._lock:
+            code = self._scope_codes.get(scope)
+            if code is not None and self._size:
+                sims = self._embeddings[:self._size] @ vector
+                sims[self._scopes[:self._size] != code] = -np.inf
+                best = int(sims.argmax())
+                if sims[best] >= self.threshold:
+                    self.hits += 1
+                    logger.debug(f"Semantic LLM cache hit (similarity {sims[best]:.3f})")
+                    return self._responses[best], vector
+            self.misses += 1
+        
+        return None, vector
+    
+    def put(self, vector: Optional[np.ndarray], scope: str, text: str):
+        """
+        Store a response.
+        
+        Args:
+            vector: Prompt embedding from lookup (None is ignored)
+            scope: Scope the entry belongs to
+            text: Generated text
+        """
+        if vector is None:
+            return
+        
+        with self._lock:
+            if self._embeddings is None:
+                capacity = min(MIN_SEMANTIC_CAPACITY, self.max_size)
+                self._embeddings = np.empty((capacity, len(vector)), dtype=np.float32)
+                self._scopes = np.empty(capacity, dtype=np.int32)
+            elif self._next == len(self._embeddings) and self._next < self.max_size:
+                # Double the preallocated rows so appends stay amortized O(1)
+                capacity = min(2 * len(self._embeddings), self.max_size)
+                embeddings = np.empty((capacity, self._embeddings.shape[1]), dtype=np.float32)
+                embeddings[:self._size] = self._embeddings[:self._size]
+                scopes = np.empty(capacity, dtype=np.int32)
+                scopes[:self._size] = self._scopes[:self._size]
+                self._embeddings, self._scopes = embeddings, scopes
+            
+            pos = self._next % self.max_size
+            self._embeddings[pos] = vector
+            self._scopes[pos] = self._scope_codes.setdefault(scope, len(self._scope_codes))
+            if pos == len(self._responses):
+                self._responses.append(text)
+            else:
+                self._responses[pos] = text
+            
+            self._next = pos + 1
+            self._size = max(self._size, self._next)
+    
+    def clear(self):
+        """Drop all cached responses."""
+        with self._lock:
+            self._embeddings = None
+            self._scopes = np.empty(0, dtype=np.int32)
+            self._responses = []
+            self._scope_codes = {}
+            self._size = 0
+            self._next = 0
+            self.hits = 0
+            self.misses = 0
+    
+    def _embed(self, prompt: str) -> np.ndarray:
+        """
+        Embed a prompt, reusing the vector when the same prompt was seen recently.
+        
+        Retries and streaming fallbacks resend identical prompts, so this
+        skips a model forward pass on the lookup path.
+        """
+        digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            vector = self._prompt_embeddings.get(digest)
+            if vector is not None:
+                self._prompt_embeddings.move_to_end(digest)
+                return vector
+        
+        if self._embed_fn is None:
+            from app.core.ingestion.embedder import get_embedder
+            self._embed_fn = get_embedder().embed_query
+        vector = np.asarray(self._embed_fn(prompt), dtype=np.float32).ravel()
+        # Shared between callers, so never modified in place
+        vector.flags.writeable = False
+        
+        with self._lock:
+            self._prompt_embeddings[digest] = vector
+            while len(self._prompt_embeddings) > PROMPT_EMBEDDING_CACHE_SIZE:
+                self._prompt_embeddings.popitem(last=False)
+        return vector
+
+
+def semantic_key(question: str, chunks: List[Dict[str, Any]]) -> SemanticKey:
+    """
+    Build the semantic cache key for an answer grounded in retrieved chunks.
+    
+    Only the question is embedded: a RAG prompt is mostly context, and the
+    embedder's 256-token window would cut the question off. Answers are
+    reused only for the same retrieved chunks.
+    
+    Args:
+        question: User question
+        chunks: Chunks the prompt was built from
+        
+    Returns:
+        (question, chunk digest) pair
+    """
+    chunk_ids = ",".join(sorted(str(chunk.get("chunk_id", "")) for chunk in chunks))
+    return question, hashlib.blake2b(chunk_ids.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def semantic_lookup_args(key: Optional[SemanticKey], scope: str) -> Tuple[Optional[str], str]:
+    """
+    Split a semantic key into the text to embed and the scope to match in.
+    
+    Args:
+        key: Key from semantic_key, or None if the request has none
+        scope: Provider scope (e.g. model and max_tokens)
+        
+    Returns:
+        (text to embed or None, scope narrowed to the key's chunks)
+    """
+    if key is None:
+        return None, scope
+    text, chunk_digest = key
+    return text, f"{scope}:{chunk_digest}"
+
+
+# Global semantic cache instance
+_semantic_cache: Optional[SemanticLLMCache] = None
+
+
+def get_semantic_llm_cache() -> SemanticLLMCache:
+    """Get or create global semantic LLM cache."""
+    global _semantic_cache
+    if _semantic_cache is None:
+        with _singleton_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticLLMCache(
+                    threshold=settings.llm_semantic_cache_threshold,
+                    max_size=settings.llm_cache_size,
+                    enabled=settings.llm_semantic_cache
+                )
+    return _semantic_cache
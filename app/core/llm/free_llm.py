@@ -1,12 +1,27 @@
 """Hugging Face Inference API wrapper - FREE alternative to OpenAI."""
-from typing import Optional
+from typing import Any, Dict, Iterator, Optional
+import asyncio
+import threading
+import httpx
 import requests
 import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from app.config import settings
 from app.utils.logger import app_logger as logger
+from app.core.llm.cache import SemanticKey, get_llm_response_cache
 from app.core.llm.orchestrator import BaseLLM
 
+# Response fields holding the output text, by task (text2text, translation)
+HF_TEXT_FIELDS = ("generated_text", "translation_text")
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 
 class HuggingFaceLLM(BaseLLM):
     """
@@ -39,12 +54,33 @@ class HuggingFaceLLM(BaseLLM):
         self.default_temperature = temperature
         self.default_max_tokens = max_tokens
         
-        # Updated to new HF endpoint
-        self.api_url = f"https://router.huggingface.co/hf-inference/models/{self.model}"
+        self.api_url = f"{settings.hf_inference_endpoint.rstrip('/')}/{self.model}"
         self.headers = {"Content-Type": "application/json"}
         if self.api_key:
             self.headers["Authorization"] = f"Bearer {self.api_key}"
         
+        # One pooled session keeps connections (and TLS) warm across calls;
+        # transient gateway errors are retried with backoff
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        retries = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[503, 504],
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False
+        )
+        self.session.mount(
+            "https://",
+            HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retries)
+        )
+        
+        self.response_cache = get_llm_response_cache()
+        
+        # Async client for agenerate(); created per event loop on first use
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._aclient_loop: Optional[asyncio.AbstractEventLoop] = None
+        
         logger.info(f"Initialized Hugging Face LLM with model: {self.model}")
         if not self.api_key:
             logger.warning("No HF API key provided - using public inference (rate limited)")
@@ -53,7 +89,8 @@ class HuggingFaceLLM(BaseLLM):
         self,
         prompt: str,
         max_tokens: int = None,
-        temperature: float = None
+        temperature: float = None,
+        semantic_key: Optional[SemanticKey] = None
     ) -> str:
         """
         Generate response using Hugging Face Inference API.
@@ -62,63 +99,133 @@ class HuggingFaceLLM(BaseLLM):
             prompt: Input prompt
             max_tokens: Maximum tokens
             temperature: Sampling temperature
+            semantic_key: Unused; this provider has no semantic cache
             
         Returns:
             Generated text
         """
         max_tokens = max_tokens or self.default_max_tokens
-        temperature = temperature or self.default_temperature
+        temperature = temperature if temperature is not None else self.default_temperature
+        
+        cache_key = self.response_cache.make_key(self.model, prompt, max_tokens, temperature)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         try:
-            payload = {
-                "inputs": prompt,
-                "parameters": {
-                    "max_new_tokens": max_tokens,
-                    "temperature": temperature,
-                    "return_full_text": False
-                }
-            }
-            
-            response = requests.post(
+            response = self.session.post(
                 self.api_url,
-                headers=self.headers,
-                json=payload,
+                json=self._build_payload(prompt, max_tokens, temperature),
                 timeout=30
             )
-            
+            text = self._handle_response(response)
             if response.status_code == 200:
-                result = response.json()
-                
-                # Handle different response formats
-                if isinstance(result, list) and len(result) > 0:
-                    if "generated_text" in result[0]:
-                        return result[0]["generated_text"]
-                    elif "translation_text" in result[0]:
-                        return result[0]["translation_text"]
-                    else:
-                        return str(result[0])
-                elif isinstance(result, dict):
-                    if "generated_text" in result:
-                        return result["generated_text"]
-                    else:
-                        return str(result)
-                else:
-                    return str(result)
-            
-            elif response.status_code == 503:
-                # Model is loading
-                error = response.json()
-                wait_time = error.get("estimated_time", 20)
-                logger.warning(f"Model loading, estimated wait: {wait_time}s")
-                return f"⏳ Model is loading (estimated {wait_time}s). Please try again in a moment."
+                self.response_cache.put(cache_key, text)
+            return text
+        
+        except Exception as e:
+            logger.error(f"Error calling Hugging Face API: {str(e)}")
+            return f"Error: {str(e)}"
+    
+    async def agenerate(
+        self,
+        prompt: str,
+        max_tokens: int = None,
+        temperature: float = None,
+        semantic_key: Optional[SemanticKey] = None
+    ) -> str:
+        """
+        Generate response without blocking the event loop.
+        
+        Concurrent calls (e.g. via asyncio.gather) share one pooled
+        connection set and are served in parallel by the API.
+        
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens
+            temperature: Sampling temperature
+            semantic_key: Unused; this provider has no semantic cache
             
-            else:
-                logger.error(f"HF API error: {response.status_code} - {response.text}")
-                return f"Error: Unable to generate response (status {response.status_code})"
-                
+        Returns:
+            Generated text
+        """
+        max_tokens = max_tokens or self.default_max_tokens
+        temperature = temperature if temperature is not None else self.default_temperature
+        
+        cache_key = self.response_cache.make_key(self.model, prompt, max_tokens, temperature)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = await self._async_client().post(
+                self.api_url,
+                json=self._build_payload(prompt, max_tokens, temperature)
+            )
+            text = self._handle_response(response)
+            if response.status_code == 200:
+                self.response_cache.put(cache_key, text)
+            return text
+        
         except Exception as e:
             logger.error(f"Error calling Hugging Face API: {str(e)}")
             return f"Error: {str(e)}"
+    
+    def _async_client(self) -> httpx.AsyncClient:
+        """Return the async client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            self._aclient = httpx.AsyncClient(
+                headers=self.headers,
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=32),
+                timeout=30
+            )
+            self._aclient_loop = loop
+        return self._aclient
+    
+    @staticmethod
+    def _build_payload(prompt: str, max_tokens: int, temperature: float) -> Dict[str, Any]:
+        """Build the inference request body."""
+        parameters = {"max_new_tokens": max_tokens, "return_full_text": False}
+        if temperature > 0:
+            parameters["temperature"] = temperature
+        else:
+            # The API rejects temperature=0; greedy decoding is the equivalent
+            parameters["do_sample"] = False
+        return {"inputs": prompt, "parameters": parameters}
+    
+    def _handle_response(self, response) -> str:
+        """
+        Turn an inference API response into text.
+        
+        Args:
+            response: requests or httpx response
+            
+        Returns:
+            Generated text or a user-facing error message
+        """
+        if response.status_code == 200:
+            result = response.json()
+            
+            # Task endpoints return either [{...}] or {...}
+            item = result[0] if isinstance(result, list) and result else result
+            if isinstance(item, dict):
+                for field in HF_TEXT_FIELDS:
+                    if field in item:
+                        return item[field]
+            return str(item)
+        
+        elif response.status_code == 503:
+            # Model is loading
+            error = response.json()
+            wait_time = error.get("estimated_time", 20)
+            logger.warning(f"Model loading, estimated wait: {wait_time}s")
+            return f"⏳ Model is loading (estimated {wait_time}s). Please try again in a moment."
+        
+        else:
+            logger.error(f"HF API error: {response.status_code} - {response.text}")
+            return f"Error: Unable to generate response (status {response.status_code})"
 
 
 class LocalLLM(BaseLLM):
@@ -140,20 +247,30 @@ class LocalLLM(BaseLLM):
             max_tokens: Maximum tokens
         """
         try:
-            from transformers import pipeline
+            from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, pipeline
             
             self.model = model or "google/flan-t5-small"
             self.default_max_tokens = max_tokens
+            self.response_cache = get_llm_response_cache()
             
             logger.info(f"Loading local model: {self.model}")
             
+            tokenizer = AutoTokenizer.from_pretrained(self.model)
+            seq2seq_model = AutoModelForSeq2SeqLM.from_pretrained(self.model)
+            if settings.local_model_int8:
+                seq2seq_model = self._quantize_int8(seq2seq_model)
+            
             # Use text generation pipeline
             self.pipeline = pipeline(
                 "text2text-generation",
-                model=self.model,
+                model=seq2seq_model,
+                tokenizer=tokenizer,
                 device=-1  # CPU
             )
             
+            if settings.local_model_compile:
+                self._compile()
+            
             logger.info(f"Initialized Local LLM with model: {self.model}")
             
         except ImportError:
@@ -162,11 +279,59 @@ class LocalLLM(BaseLLM):
                 "Install with: pip install transformers torch"
             )
     
+    @staticmethod
+    def _quantize_int8(model):
+        """
+        Quantize the model's Linear layers to INT8 for CPU inference.
+        
+        Weights take a quarter of the FP32 bytes and matmuls use int8 dot
+        products (VNNI where available). Falls back to the FP32 model if the
+        quantization backend is unavailable.
+        
+        Args:
+            model: FP32 transformers model on CPU
+            
+        Returns:
+            Quantized model, or the original on failure
+        """
+        try:
+            import torch
+            
+            quantized = torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+            logger.info("Quantized local model to INT8")
+            return quantized
+        except Exception as e:
+            logger.warning(f"INT8 quantization failed, using FP32 model: {e}")
+            return model
+    
+    def _compile(self):
+        """
+        Compile the model's forward pass with torch.compile.
+        
+        generate() calls forward once per token, so compiling it removes
+        per-token Python dispatch. A warm-up call pays the compilation cost
+        at startup instead of on the first question.
+        """
+        model = self.pipeline.model
+        eager_forward = model.forward
+        try:
+            import torch
+            
+            model.forward = torch.compile(eager_forward, fullgraph=False, mode="reduce-overhead")
+            self.pipeline("warm up", max_new_tokens=2)
+            logger.info("Compiled local model with torch.compile")
+        except Exception as e:
+            model.forward = eager_forward
+            logger.warning(f"torch.compile failed, using eager model: {e}")
+    
     def generate(
         self,
         prompt: str,
         max_tokens: int = None,
-        temperature: float = None
+        temperature: float = None,
+        semantic_key: Optional[SemanticKey] = None
     ) -> str:
         """
         Generate response using local model with improved quality.
@@ -175,6 +340,7 @@ class LocalLLM(BaseLLM):
             prompt: Input prompt
             max_tokens: Maximum tokens
             temperature: Sampling temperature
+            semantic_key: Unused; this provider has no semantic cache
             
         Returns:
             Generated text
@@ -182,20 +348,16 @@ class LocalLLM(BaseLLM):
         max_tokens = max_tokens or self.default_max_tokens
         temperature = temperature if temperature is not None else 0.7
         
+        cache_key = self.response_cache.make_key(self.model, prompt, max_tokens, temperature)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             # Generate with improved parameters for better quality
             logger.info(f"Generating with max_tokens={max_tokens}, temperature={temperature}")
             
-            result = self.pipeline(
-                prompt,
-                max_new_tokens=max_tokens,
-                do_sample=True,  # Always use sampling for better variety
-                temperature=max(temperature, 0.7),  # Higher temp for more detailed responses
-                top_p=0.95,  # Increased for more diverse tokens
-                top_k=50,  # Add top-k sampling
-                num_return_sequences=1,
-                repetition_penalty=1.2  # Reduce repetition
-            )
+            result = self.pipeline(prompt, **self._generation_kwargs(max_tokens, temperature))
             
             if result and len(result) > 0:
                 generated_text = result[0]["generated_text"]
@@ -210,6 +372,7 @@ class LocalLLM(BaseLLM):
                     logger.warning("Generated text is too short or empty")
                     return "Based on the documents, I don't have enough information to provide a detailed answer to this specific question."
                 
+                self.response_cache.put(cache_key, cleaned)
                 return cleaned
             else:
                 logger.warning("Pipeline returned no results")
@@ -218,6 +381,89 @@ class LocalLLM(BaseLLM):
         except Exception as e:
             logger.error(f"Error generating with local model: {str(e)}")
             return f"I encountered an error while generating the answer. Please try again."
+    
+    def generate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = None,
+        temperature: float = None
+    ) -> Iterator[str]:
+        """
+        Yield generated text as tokens are produced.
+        
+        Generation runs in a background thread feeding a TextIteratorStreamer,
+        so the first words reach the caller after one decoding step instead
+        of after the whole answer.
+        
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens
+            temperature: Sampling temperature
+            
+        Yields:
+            Text fragments in generation order
+        """
+        from transformers import TextIteratorStreamer
+        
+        max_tokens = max_tokens or self.default_max_tokens
+        temperature = temperature if temperature is not None else 0.7
+        
+        tokenizer = self.pipeline.tokenizer
+        model = self.pipeline.model
+        inputs = tokenizer(prompt, return_tensors="pt", truncation=True).to(model.device)
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        
+        errors = []
+        
+        def run():
+            try:
+                model.generate(
+                    input_ids=inputs["input_ids"],
+                    attention_mask=inputs["attention_mask"],
+                    **self._generation_kwargs(max_tokens, temperature),
+                    streamer=streamer
+                )
+            except Exception as e:
+                # Unblock the consumer; the error is re-raised below
+                errors.append(e)
+                streamer.end()
+        
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        
+        try:
+            yield from streamer
+        finally:
+            thread.join()
+        
+        if errors:
+            logger.error(f"Error streaming from local model: {errors[0]}")
+            raise errors[0]
+    
+    @staticmethod
+    def _generation_kwargs(max_tokens: int, temperature: float) -> Dict[str, Any]:
+        """
+        Decoding parameters shared by generate() and generate_stream().
+        
+        Temperature 0 decodes greedily, so the cached answer is the one a
+        repeat request would produce.
+        """
+        if temperature <= 0:
+            return {
+                "max_new_tokens": max_tokens,
+                "do_sample": False,
+                "num_return_sequences": 1,
+                "repetition_penalty": 1.2
+            }
+        return {
+            "max_new_tokens": max_tokens,
+            "do_sample": True,  # Always use sampling for better variety
+            "temperature": max(temperature, 0.7),  # Higher temp for more detailed responses
+            "top_p": 0.95,  # Increased for more diverse tokens
+            "top_k": 50,  # Add top-k sampling
+            "num_return_sequences": 1,
+            "repetition_penalty": 1.2  # Reduce repetition
+        }
 
 
 def get_free_llm() -> BaseLLM:
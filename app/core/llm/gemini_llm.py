@@ -1,11 +1,73 @@
 """Google Gemini API wrapper - FREE tier with generous limits!"""
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+import asyncio
+import time
+import httpx
 import requests
-import json
+import orjson
+import numpy as np
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from app.config import settings
 from app.utils.logger import app_logger as logger
+from app.utils.helpers import backoff_delay
 from app.core.llm.orchestrator import BaseLLM
+from app.core.llm.cache import (
+    SemanticKey, SingleFlight, get_llm_response_cache, get_semantic_llm_cache, semantic_lookup_args
+)
+from app.core.llm.free_llm import HTTP2_AVAILABLE
+from app.core.llm.sse import SSE_READ_SIZE, aiter_sse_data, iter_sse_data
+from app.core.llm.http_utils import aread_body, read_body
+from app.core.llm.prompts import PROMPT_RESERVE, estimate_tokens, fit_prompt
+from app.core.llm.stats import CallStats
+
+# Use v1 API endpoint (more stable than v1beta)
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1/models"
+
+# Tries per model when rate limited (429), with exponential backoff in between
+RATE_LIMIT_ATTEMPTS = 5
+
+# Seconds agenerate() waits on a model before also starting the next fallback
+HEDGE_DELAY = 10.0
+
+# Tried in order after the configured model (November 2025 models)
+FALLBACK_MODELS = (
+    "gemini-2.0-flash",  # Recommended - stable and fast
+    "gemini-2.0-flash-001",
+    "gemini-2.0-flash-lite"
+)
+
+# Models tried in order by the streaming methods
+STREAM_MODELS = ("gemini-2.0-flash", "gemini-2.0-flash-001")
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Nucleus/top-k sampling settings sent with every request
+TOP_P = 0.95
+TOP_K = 40
+
+# Shared by all instances so connections (and TLS sessions) are reused across
+# calls; transient errors are retried with backoff
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False
+        )
+    )
+)
+
+
+class TerminalError(Exception):
+    """A request error that every fallback model would repeat (bad request, bad key)."""
 
 
 class GeminiLLM(BaseLLM):
@@ -22,6 +84,9 @@ class GeminiLLM(BaseLLM):
     - gemini-pro-vision (image + text)
     """
     
+    # Gemini 2.0 Flash input window, in tokens
+    context_limit = 1_048_576
+    
     def __init__(
         self,
         api_key: str = None,
@@ -47,8 +112,30 @@ class GeminiLLM(BaseLLM):
         if not self.api_key:
             raise ValueError("Gemini API key not provided")
         
-        # Use v1 API endpoint (more stable than v1beta)
-        self.api_url = f"https://generativelanguage.googleapis.com/v1/models/{self.model}:generateContent"
+        self.api_url = f"{GEMINI_API_BASE}/{self.model}:generateContent"
+        
+        # Configured model first, then the fallbacks; URLs (with the API key as
+        # a query parameter) are built once instead of on every call
+        self.model_names = tuple(dict.fromkeys((self.model,) + FALLBACK_MODELS))
+        self._generate_urls = {
+            name: f"{GEMINI_API_BASE}/{name}:generateContent?key={self.api_key}"
+            for name in self.model_names
+        }
+        self._stream_urls = {
+            name: f"{GEMINI_API_BASE}/{name}:streamGenerateContent?key={self.api_key}&alt=sse"
+            for name in STREAM_MODELS
+        }
+        
+        # Deterministic (temperature 0) answers are served from memory on repeat prompts
+        self.response_cache = get_llm_response_cache()
+        # Low-temperature answers may also be reused for paraphrased questions
+        self.semantic_cache = get_semantic_llm_cache()
+        self._inflight = SingleFlight()
+        self.call_stats = CallStats("Gemini")
+        
+        # Async client for agenerate(); created per event loop on first use
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._aclient_loop: Optional[asyncio.AbstractEventLoop] = None
         
         logger.info(f"Initialized Gemini LLM with model: {self.model}")
     
@@ -56,7 +143,8 @@ class GeminiLLM(BaseLLM):
         self,
         prompt: str,
         max_tokens: int = None,
-        temperature: float = None
+        temperature: float = None,
+        semantic_key: Optional[SemanticKey] = None
     ) -> str:
         """
         Generate response using Gemini API with fallback models.
@@ -65,130 +153,430 @@ class GeminiLLM(BaseLLM):
             prompt: Input prompt
             max_tokens: Maximum tokens
             temperature: Sampling temperature
+            semantic_key: Question and chunk digest for the semantic cache
+                (from cache.semantic_key); without one only exact prompts match
             
         Returns:
             Generated text
         """
         max_tokens = max_tokens or self.default_max_tokens
-        temperature = temperature or self.default_temperature
+        prompt = self._budget(prompt, max_tokens + PROMPT_RESERVE)
+        temperature = temperature if temperature is not None else self.default_temperature
         
-        # Try multiple model names as fallback (November 2025 models)
-        model_names_to_try = [
-            self.model,  # Try configured model first
-            "gemini-2.0-flash",  # Recommended - stable and fast
-            "gemini-2.0-flash-001",
-            "gemini-2.0-flash-lite"
-        ]
+        cache_key = self.response_cache.make_key(
+            self.model, prompt, max_tokens, temperature, top_p=TOP_P, top_k=TOP_K
+        )
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            self.call_stats.cache_hit()
+            return cached
+        
+        # Identical concurrent requests share one API call
+        return self._inflight.do(
+            cache_key,
+            lambda: self._generate_uncached(prompt, max_tokens, temperature, cache_key, semantic_key)
+        )
+    
+    def _generate_uncached(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        cache_key: Optional[str],
+        semantic_key: Optional[SemanticKey] = None
+    ) -> str:
+        """Generate with fallback models, bypassing the exact-match cache."""
+        question, scope = semantic_lookup_args(semantic_key, f"{self.model}:{max_tokens}")
+        cached, prompt_vector = self.semantic_cache.lookup(question, scope, temperature)
+        if cached is not None:
+            self.call_stats.cache_hit()
+            return cached
         
         last_error = None
         
-        for model_name in model_names_to_try:
+        for model_name in self.model_names:
             try:
-                return self._attempt_generate(prompt, max_tokens, temperature, model_name)
+                return self._attempt_generate(
+                    prompt, max_tokens, temperature, model_name, cache_key, prompt_vector, scope
+                )
+            except TerminalError as e:
+                logger.error(f"Gemini request rejected, not trying other models: {e}")
+                return f"Error: {e}"
             except Exception as e:
                 last_error = e
-                logger.warning(f"Model {model_name} failed, trying next...")
+                logger.warning(f"Model {model_name} failed ({e!r}), trying next...")
                 continue
         
         # If all models failed
         logger.error(f"All Gemini models failed. Last error: {last_error}")
-        return f"Error: All models failed. Please check your API key and try again."
+        return self._failure_message(last_error)
+    
+    async def agenerate(
+        self,
+        prompt: str,
+        max_tokens: int = None,
+        temperature: float = None,
+        semantic_key: Optional[SemanticKey] = None
+    ) -> str:
+        """
+        Generate response without blocking the event loop.
+        
+        Concurrent calls (e.g. via asyncio.gather) share one pooled
+        connection set and are served in parallel by the API.
+        
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens
+            temperature: Sampling temperature
+            semantic_key: Question and chunk digest for the semantic cache
+            
+        Returns:
+            Generated text
+        """
+        max_tokens = max_tokens or self.default_max_tokens
+        prompt = self._budget(prompt, max_tokens + PROMPT_RESERVE)
+        temperature = temperature if temperature is not None else self.default_temperature
+        
+        cache_key = self.response_cache.make_key(
+            self.model, prompt, max_tokens, temperature, top_p=TOP_P, top_k=TOP_K
+        )
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            self.call_stats.cache_hit()
+            return cached
+        
+        return await self._inflight.ado(
+            cache_key,
+            lambda: self._agenerate_uncached(prompt, max_tokens, temperature, cache_key, semantic_key)
+        )
+    
+    async def _agenerate_uncached(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        cache_key: Optional[str],
+        semantic_key: Optional[SemanticKey] = None
+    ) -> str:
+        """
+        Async counterpart of _generate_uncached.
+        
+        Fallback models are hedged rather than strictly sequential: a model
+        that fails starts the next one at once, and a model still running
+        after HEDGE_DELAY gets the next one started alongside it. The first
+        answer wins and the remaining requests are cancelled, so a stalled
+        model costs HEDGE_DELAY instead of a full timeout.
+        """
+        question, scope = semantic_lookup_args(semantic_key, f"{self.model}:{max_tokens}")
+        cached, prompt_vector = await asyncio.to_thread(
+            self.semantic_cache.lookup, question, scope, temperature
+        )
+        if cached is not None:
+            self.call_stats.cache_hit()
+            return cached
+        
+        last_error = None
+        remaining = iter(self.model_names)
+        running: Dict[asyncio.Task, str] = {}
+        
+        def start_next() -> bool:
+            model_name = next(remaining, None)
+            if model_name is None:
+                return False
+            task = asyncio.create_task(self._aattempt_generate(
+                prompt, max_tokens, temperature, model_name, cache_key, prompt_vector, scope
+            ))
+            running[task] = model_name
+            return True
+        
+        start_next()
+        try:
+            while running:
+                done, _ = await asyncio.wait(
+                    running, timeout=HEDGE_DELAY, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if start_next():
+                        logger.warning("Gemini model slow to answer, also trying the next one...")
+                    continue
+                
+                # Earlier (preferred) models first when several finish together
+                for task in sorted(done, key=lambda t: self.model_names.index(running[t])):
+                    model_name = running.pop(task)
+                    try:
+                        return task.result()
+                    except TerminalError as e:
+                        logger.error(f"Gemini request rejected, not trying other models: {e}")
+                        return f"Error: {e}"
+                    except Exception as e:
+                        last_error = e
+                        logger.warning(f"Model {model_name} failed ({e!r}), trying next...")
+                        start_next()
+        finally:
+            for task in running:
+                task.cancel()
+        
+        logger.error(f"All Gemini models failed. Last error: {last_error}")
+        return self._failure_message(last_error)
     
     def _attempt_generate(
         self,
         prompt: str,
         max_tokens: int,
         temperature: float,
-        model_name: str
+        model_name: str,
+        cache_key: Optional[str] = None,
+        prompt_vector: Optional[np.ndarray] = None,
+        scope: str = ""
     ) -> str:
-        """Attempt to generate with a specific model."""
+        """
+        Attempt to generate with a specific model, caching the text on success.
+        
+        Raises:
+            TerminalError: If the request itself was rejected
+            Exception: On timeouts and other failures, so the caller moves on
+                to the next fallback model
+        """
         try:
-            # Build API URL for this model
-            api_url = f"https://generativelanguage.googleapis.com/v1/models/{model_name}:generateContent"
-            # Gemini API request format
-            payload = {
-                "contents": [{
-                    "parts": [{
-                        "text": prompt
-                    }]
-                }],
-                "generationConfig": {
-                    "temperature": temperature,
-                    "maxOutputTokens": max_tokens,
-                    "topP": 0.95,
-                    "topK": 40
-                }
-            }
-            
-            # Add API key as query parameter
-            url_with_key = f"{api_url}?key={self.api_key}"
-            
-            response = requests.post(
-                url_with_key,
-                headers={"Content-Type": "application/json"},
-                json=payload,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
+            with self.call_stats.track() as call:
+                payload = orjson.dumps(self._build_payload(prompt, max_tokens, temperature))
+                for attempt in range(RATE_LIMIT_ATTEMPTS):
+                    response = _SESSION.post(
+                        self._generate_urls[model_name],
+                        headers=JSON_HEADERS,
+                        data=payload,
+                        stream=True,
+                        timeout=30
+                    )
+                    if response.status_code != 429 or attempt == RATE_LIMIT_ATTEMPTS - 1:
+                        break
+                    delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+                    if delay is None:
+                        # Asked to wait longer than we retry for; report the limit
+                        break
+                    response.close()
+                    logger.warning(f"Gemini API rate limit reached, retrying in {delay:.1f}s")
+                    time.sleep(delay)
                 
-                # Extract generated text from Gemini response
-                if "candidates" in result and len(result["candidates"]) > 0:
-                    candidate = result["candidates"][0]
-                    
-                    # Check for safety/finish reasons that might block content
-                    finish_reason = candidate.get("finishReason", "")
-                    if finish_reason == "SAFETY":
-                        return "⚠️ Response blocked due to safety filters. Try rephrasing your question."
-                    
-                    if "content" in candidate:
-                        content = candidate["content"]
-                        if "parts" in content and len(content["parts"]) > 0:
-                            # Check if parts has text
-                            if "text" in content["parts"][0]:
-                                text = content["parts"][0]["text"]
-                                logger.info(f"Successfully generated response with model: {model_name} ({len(text)} chars)")
-                                return text
-                            else:
-                                # Sometimes parts is empty due to MAX_TOKENS or other reasons
-                                logger.warning(f"No text in response parts. Finish reason: {finish_reason}")
-                                if finish_reason == "MAX_TOKENS":
-                                    return "⚠️ Response was truncated. The context may be too long. Try asking a more specific question."
-                                raise Exception(f"No text in response (finish: {finish_reason})")
+                text, generated = self._handle_response(response, read_body(response), model_name)
+                if generated:
+                    call.chars_out = len(text)
+                    self._remember(cache_key, prompt_vector, scope, text)
+                return text
                 
-                logger.warning(f"Unexpected Gemini response format: {result}")
-                raise Exception("Unexpected response format")
-            
-            elif response.status_code == 400:
-                error_data = response.json()
-                error_msg = error_data.get("error", {}).get("message", "Bad request")
-                logger.error(f"Gemini API error 400 with {model_name}: {error_msg}")
-                raise Exception(f"400: {error_msg}")
+        except requests.exceptions.Timeout:
+            logger.error(f"Gemini API request to {model_name} timed out")
+            raise
+        
+        except TerminalError:
+            raise
+        
+        except Exception as e:
+            logger.error(f"Error calling Gemini API: {str(e)}")
+            raise
+    
+    async def _aattempt_generate(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        model_name: str,
+        cache_key: Optional[str] = None,
+        prompt_vector: Optional[np.ndarray] = None,
+        scope: str = ""
+    ) -> str:
+        """Async counterpart of _attempt_generate."""
+        try:
+            with self.call_stats.track() as call:
+                payload = orjson.dumps(self._build_payload(prompt, max_tokens, temperature))
+                for attempt in range(RATE_LIMIT_ATTEMPTS):
+                    client = self._async_client()
+                    response = await client.send(
+                        client.build_request("POST", self._generate_urls[model_name], content=payload),
+                        stream=True
+                    )
+                    if response.status_code != 429 or attempt == RATE_LIMIT_ATTEMPTS - 1:
+                        break
+                    delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+                    if delay is None:
+                        # Asked to wait longer than we retry for; report the limit
+                        break
+                    await response.aclose()
+                    logger.warning(f"Gemini API rate limit reached, retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                
+                body = await aread_body(response)
+                text, generated = self._handle_response(response, body, model_name)
+                if generated:
+                    call.chars_out = len(text)
+                    self._remember(cache_key, prompt_vector, scope, text)
+                return text
+        
+        except httpx.TimeoutException:
+            logger.error(f"Gemini API request to {model_name} timed out")
+            raise
+        
+        except TerminalError:
+            raise
+        
+        except Exception as e:
+            logger.error(f"Error calling Gemini API: {str(e)}")
+            raise
+    
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """API call counters (calls, errors, cache hits, latency, output size)."""
+        return self.call_stats.stats
+    
+    @staticmethod
+    def _failure_message(error: Optional[Exception]) -> str:
+        """User-facing message once every fallback model has failed."""
+        if isinstance(error, (requests.exceptions.Timeout, httpx.TimeoutException)):
+            return "Error: Request timed out. Please try again."
+        return "Error: All models failed. Please check your API key and try again."
+    
+    def _remember(
+        self,
+        cache_key: Optional[str],
+        prompt_vector: Optional[np.ndarray],
+        scope: str,
+        text: str
+    ):
+        """Store a generated answer in the exact-match and semantic caches."""
+        self.response_cache.put(cache_key, text)
+        self.semantic_cache.put(prompt_vector, scope, text)
+    
+    def _budget(self, prompt: str, reserve: int) -> str:
+        """
+        Trim a prompt that would overflow the context window.
+        
+        Args:
+            prompt: Input prompt
+            reserve: Tokens to keep free for the completion
             
-            elif response.status_code == 404:
-                logger.warning(f"Model {model_name} not found (404)")
-                raise Exception(f"Model {model_name} not found")
+        Returns:
+            Prompt that fits in context_limit - reserve (estimated) tokens
+        """
+        budget = self.context_limit - reserve
+        fitted = fit_prompt(prompt, budget)
+        if fitted is not prompt:
+            logger.warning(
+                f"Prompt of ~{estimate_tokens(prompt)} tokens exceeds the Gemini budget "
+                f"of {budget}; dropped the middle of the context"
+            )
+        return fitted
+    
+    def _async_client(self) -> httpx.AsyncClient:
+        """Return the async client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            self._aclient = httpx.AsyncClient(
+                headers=JSON_HEADERS,
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+                timeout=30
+            )
+            self._aclient_loop = loop
+        return self._aclient
+    
+    @staticmethod
+    def _build_payload(prompt: str, max_tokens: int, temperature: float) -> Dict[str, Any]:
+        """Build the Gemini request body."""
+        return {
+            "contents": [{
+                "parts": [{
+                    "text": prompt
+                }]
+            }],
+            "generationConfig": {
+                "temperature": temperature,
+                "maxOutputTokens": max_tokens,
+                "topP": TOP_P,
+                "topK": TOP_K
+            }
+        }
+    
+    def _handle_response(self, response, body: bytes, model_name: str) -> Tuple[str, bool]:
+        """
+        Turn a generateContent response into text.
+        
+        Args:
+            response: requests or httpx response
+            body: Response body, read with a size limit
+            model_name: Model the request was sent to
             
-            elif response.status_code == 429:
-                logger.warning("Gemini API rate limit reached")
-                return "⚠️ Rate limit reached. Please wait a moment and try again."
+        Returns:
+            (text, whether the text was generated by the model rather than
+            a user-facing notice)
             
-            elif response.status_code == 403:
-                logger.error("Gemini API key invalid or forbidden")
-                raise Exception("Invalid API key or access forbidden")
+        Raises:
+            TerminalError: If the request itself was rejected
+            Exception: If the next fallback model should be tried
+        """
+        if response.status_code == 200:
+            result = orjson.loads(body)
             
-            else:
-                logger.error(f"Gemini API error: {response.status_code} - {response.text}")
-                raise Exception(f"Status {response.status_code}")
+            # Extract generated text from Gemini response
+            if "candidates" in result and len(result["candidates"]) > 0:
+                candidate = result["candidates"][0]
                 
-        except requests.exceptions.Timeout:
-            logger.error("Gemini API request timed out")
-            return "Error: Request timed out. Please try again."
+                # Check for safety/finish reasons that might block content
+                finish_reason = candidate.get("finishReason", "")
+                if finish_reason == "SAFETY":
+                    return "⚠️ Response blocked due to safety filters. Try rephrasing your question.", False
+                
+                if "content" in candidate:
+                    content = candidate["content"]
+                    if "parts" in content and len(content["parts"]) > 0:
+                        # Check if parts has text
+                        if "text" in content["parts"][0]:
+                            text = content["parts"][0]["text"]
+                            logger.info(f"Successfully generated response with model: {model_name} ({len(text)} chars)")
+                            return text, True
+                        else:
+                            # Sometimes parts is empty due to MAX_TOKENS or other reasons
+                            logger.warning(f"No text in response parts. Finish reason: {finish_reason}")
+                            if finish_reason == "MAX_TOKENS":
+                                return "⚠️ Response was truncated. The context may be too long. Try asking a more specific question.", False
+                            raise Exception(f"No text in response (finish: {finish_reason})")
+            
+            logger.warning(f"Unexpected Gemini response format: {result}")
+            raise Exception("Unexpected response format")
         
-        except Exception as e:
-            logger.error(f"Error calling Gemini API: {str(e)}")
-            return f"Error: {str(e)}"
+        elif response.status_code == 400:
+            error_data = orjson.loads(body)
+            error_msg = error_data.get("error", {}).get("message", "Bad request")
+            logger.error(f"Gemini API error 400 with {model_name}: {error_msg}")
+            raise TerminalError(f"400: {error_msg}")
+        
+        elif response.status_code == 404:
+            logger.warning(f"Model {model_name} not found (404)")
+            raise Exception(f"Model {model_name} not found")
+        
+        elif response.status_code == 429:
+            logger.warning("Gemini API rate limit reached")
+            return "⚠️ Rate limit reached. Please wait a moment and try again.", False
+        
+        elif response.status_code == 403:
+            logger.error("Gemini API key invalid or forbidden")
+            raise TerminalError("Invalid API key or access forbidden")
+        
+        else:
+            logger.error(f"Gemini API error: {response.status_code} - {body[:500].decode('utf-8', 'replace')}")
+            raise Exception(f"Status {response.status_code}")
+    
+    @staticmethod
+    def _parse_stream_data(data: bytes) -> Optional[str]:
+        """Extract the text chunk from one SSE data payload, if it carries one."""
+        try:
+            data = orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return None
+        # Nearly every chunk has the full path, so try it directly
+        try:
+            return data['candidates'][0]['content']['parts'][0]['text']
+        except (KeyError, IndexError, TypeError):
+            return None
     
     def stream_generate(self, prompt: str, max_tokens: int = None, temperature: float = None):
         """
@@ -205,53 +593,29 @@ class GeminiLLM(BaseLLM):
             Text chunks as they arrive
         """
         max_tokens = max_tokens or self.default_max_tokens
-        temperature = temperature or self.default_temperature
+        prompt = self._budget(prompt, max_tokens + PROMPT_RESERVE)
+        temperature = temperature if temperature is not None else self.default_temperature
+        payload = orjson.dumps(self._build_payload(prompt, max_tokens, temperature))
         
         # Try models in order
-        for model_name in ["gemini-2.0-flash", "gemini-2.0-flash-001"]:
+        for model_name in STREAM_MODELS:
             try:
-                api_url = f"https://generativelanguage.googleapis.com/v1/models/{model_name}:streamGenerateContent"
-                
-                payload = {
-                    "contents": [{
-                        "parts": [{"text": prompt}]
-                    }],
-                    "generationConfig": {
-                        "temperature": temperature,
-                        "maxOutputTokens": max_tokens,
-                        "topP": 0.95,
-                        "topK": 40
-                    }
-                }
-                
-                url_with_key = f"{api_url}?key={self.api_key}&alt=sse"
-                
-                response = requests.post(
-                    url_with_key,
-                    headers={"Content-Type": "application/json"},
-                    json=payload,
+                response = _SESSION.post(
+                    self._stream_urls[model_name],
+                    headers=JSON_HEADERS,
+                    data=payload,
                     stream=True,
                     timeout=30
                 )
                 
                 if response.status_code == 200:
                     full_text = ""
-                    for line in response.iter_lines():
-                        if line:
-                            line = line.decode('utf-8')
-                            if line.startswith('data: '):
-                                try:
-                                    data = json.loads(line[6:])
-                                    if 'candidates' in data:
-                                        candidate = data['candidates'][0]
-                                        if 'content' in candidate and 'parts' in candidate['content']:
-                                            parts = candidate['content']['parts']
-                                            if parts and 'text' in parts[0]:
-                                                chunk = parts[0]['text']
-                                                full_text += chunk
-                                                yield chunk
-                                except json.JSONDecodeError:
-                                    continue
+                    # Chunked SSE bodies are handed over chunk by chunk; the size only caps each read
+                    for data in iter_sse_data(response.iter_content(chunk_size=SSE_READ_SIZE)):
+                        chunk = self._parse_stream_data(data)
+                        if chunk:
+                            full_text += chunk
+                            yield chunk
                     
                     if full_text:
                         logger.info(f"Streamed {len(full_text)} chars from {model_name}")
@@ -265,3 +629,51 @@ class GeminiLLM(BaseLLM):
         logger.warning("Streaming failed, falling back to regular generation")
         result = self.generate(prompt, max_tokens, temperature)
         yield result
+    
+    async def astream_generate(
+        self,
+        prompt: str,
+        max_tokens: int = None,
+        temperature: float = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream generation from Gemini API without blocking the event loop.
+        
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens
+            temperature: Sampling temperature
+            
+        Yields:
+            Text chunks as they arrive
+        """
+        max_tokens = max_tokens or self.default_max_tokens
+        prompt = self._budget(prompt, max_tokens + PROMPT_RESERVE)
+        temperature = temperature if temperature is not None else self.default_temperature
+        payload = orjson.dumps(self._build_payload(prompt, max_tokens, temperature))
+        
+        for model_name in STREAM_MODELS:
+            try:
+                full_text = ""
+                async with self._async_client().stream(
+                    "POST",
+                    self._stream_urls[model_name],
+                    content=payload
+                ) as response:
+                    if response.status_code == 200:
+                        async for data in aiter_sse_data(response.aiter_bytes()):
+                            chunk = self._parse_stream_data(data)
+                            if chunk:
+                                full_text += chunk
+                                yield chunk
+                
+                if full_text:
+                    logger.info(f"Streamed {len(full_text)} chars from {model_name}")
+                    return
+            
+            except Exception as e:
+                logger.warning(f"Streaming failed for {model_name}: {e}")
+                continue
+        
+        logger.warning("Streaming failed, falling back to regular generation")
+        yield await self.agenerate(prompt, max_tokens, temperature)
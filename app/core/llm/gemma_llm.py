@@ -1,11 +1,50 @@
 """Google Gemma model via HuggingFace Inference API."""
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator, Tuple
+import asyncio
+import time
+import httpx
 import requests
-import json
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from app.config import settings
 from app.utils.logger import app_logger as logger
+from app.utils.helpers import backoff_delay
 from app.core.llm.orchestrator import BaseLLM
+from app.core.llm.cache import (
+    SemanticKey, SingleFlight, get_llm_response_cache, get_semantic_llm_cache, semantic_lookup_args
+)
+from app.core.llm.free_llm import HTTP2_AVAILABLE
+from app.core.llm.sse import SSE_READ_SIZE, aiter_sse_data, iter_sse_data
+from app.core.llm.http_utils import aread_body, read_body
+from app.core.llm.prompts import PROMPT_RESERVE, estimate_tokens, fit_prompt
+from app.core.llm.stats import CallStats
+
+# Nucleus sampling setting sent with every request
+TOP_P = 0.95
+
+# Rate limited (429) or model still loading (503): retried with exponential backoff
+RETRY_STATUSES = (429, 503)
+RETRY_ATTEMPTS = 5
+
+# Shared by all instances so connections (and TLS sessions) are reused across
+# calls; transient errors are retried with backoff
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[500, 502, 504],
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False
+        )
+    )
+)
 
 
 class GemmaLLM(BaseLLM):
@@ -27,6 +66,9 @@ class GemmaLLM(BaseLLM):
     - google/gemma-1.1-7b-it (7B parameters)
     """
     
+    # Gemma 2 context window, in tokens
+    context_limit = 8192
+    
     def __init__(
         self,
         api_key: str = None,
@@ -59,6 +101,21 @@ class GemmaLLM(BaseLLM):
         
         # HuggingFace chat completions endpoint
         self.api_url = "https://router.huggingface.co/v1/chat/completions"
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        # Deterministic (temperature 0) answers are served from memory on repeat prompts
+        self.response_cache = get_llm_response_cache()
+        # Low-temperature answers may also be reused for paraphrased questions
+        self.semantic_cache = get_semantic_llm_cache()
+        self._inflight = SingleFlight()
+        self.call_stats = CallStats("Gemma")
+        
+        # Async client for agenerate(); created per event loop on first use
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._aclient_loop: Optional[asyncio.AbstractEventLoop] = None
         
         logger.info(f"Initialized Gemma LLM with model: {self.model}")
     
@@ -66,7 +123,8 @@ class GemmaLLM(BaseLLM):
         self,
         prompt: str,
         max_tokens: int = None,
-        temperature: float = None
+        temperature: float = None,
+        semantic_key: Optional[SemanticKey] = None
     ) -> str:
         """
         Generate response using Gemma model via HuggingFace API.
@@ -75,75 +133,158 @@ class GemmaLLM(BaseLLM):
             prompt: Input prompt
             max_tokens: Maximum tokens
             temperature: Sampling temperature
+            semantic_key: Question and chunk digest for the semantic cache
+                (from cache.semantic_key); without one only exact prompts match
             
         Returns:
             Generated text
         """
         max_tokens = max_tokens or self.default_max_tokens
-        temperature = temperature or self.default_temperature
+        prompt = self._budget(prompt, max_tokens + PROMPT_RESERVE)
+        temperature = temperature if temperature is not None else self.default_temperature
+        
+        cache_key = self.response_cache.make_key(self.model, prompt, max_tokens, temperature, top_p=TOP_P)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            self.call_stats.cache_hit()
+            return cached
+        
+        # Identical concurrent requests share one API call
+        return self._inflight.do(
+            cache_key,
+            lambda: self._generate_uncached(prompt, max_tokens, temperature, cache_key, semantic_key)
+        )
+    
+    def _generate_uncached(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        cache_key: Optional[str],
+        semantic_key: Optional[SemanticKey] = None
+    ) -> str:
+        """Call the API, bypassing the exact-match cache."""
+        question, scope = semantic_lookup_args(semantic_key, f"{self.model}:{max_tokens}")
+        cached, prompt_vector = self.semantic_cache.lookup(question, scope, temperature)
+        if cached is not None:
+            self.call_stats.cache_hit()
+            return cached
         
         try:
-            # Prepare request payload (OpenAI-compatible format)
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "max_tokens": max_tokens,
-                "temperature": temperature,
-                "top_p": 0.95,
-                "stream": False
-            }
-            
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
             logger.info(f"Calling Gemma API: {self.model}")
             
-            response = requests.post(
-                self.api_url,
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
+            with self.call_stats.track() as call:
+                payload = orjson.dumps(self._build_payload(prompt, max_tokens, temperature, stream=False))
+                for attempt in range(RETRY_ATTEMPTS):
+                    response = _SESSION.post(
+                        self.api_url, headers=self.headers, data=payload, stream=True, timeout=30
+                    )
+                    if response.status_code not in RETRY_STATUSES or attempt == RETRY_ATTEMPTS - 1:
+                        break
+                    delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+                    if delay is None:
+                        # Asked to wait longer than we retry for; report the limit
+                        break
+                    response.close()
+                    logger.warning(f"Gemma API returned {response.status_code}, retrying in {delay:.1f}s")
+                    time.sleep(delay)
                 
-                # Extract response from OpenAI-compatible format
-                if "choices" in result and len(result["choices"]) > 0:
-                    choice = result["choices"][0]
-                    if "message" in choice and "content" in choice["message"]:
-                        text = choice["message"]["content"]
-                        logger.info(f"Gemma response: {len(text)} chars")
-                        return text.strip()
+                text, generated = self._handle_response(response, read_body(response))
+                if generated:
+                    call.chars_out = len(text)
+                    self.response_cache.put(cache_key, text)
+                    self.semantic_cache.put(prompt_vector, scope, text)
+                return text
                 
-                logger.warning(f"Unexpected response format: {result}")
-                return "Error: Unexpected response format from Gemma API"
-            
-            elif response.status_code == 401:
-                logger.error("Invalid HuggingFace API key")
-                return "⚠️ Invalid HuggingFace API key. Please check your token."
-            
-            elif response.status_code == 429:
-                logger.warning("Rate limit reached")
-                return "⚠️ Rate limit reached. Please wait a moment and try again."
-            
-            elif response.status_code == 503:
-                logger.warning("Model is loading")
-                return "⏳ Model is loading. Please try again in a moment."
+        except requests.exceptions.Timeout:
+            logger.error("Gemma API request timed out")
+            return "Error: Request timed out. Please try again."
+        
+        except Exception as e:
+            logger.error(f"Error calling Gemma API: {str(e)}")
+            return f"Error: {str(e)}"
+    
+    async def agenerate(
+        self,
+        prompt: str,
+        max_tokens: int = None,
+        temperature: float = None,
+        semantic_key: Optional[SemanticKey] = None
+    ) -> str:
+        """
+        Generate response without blocking the event loop.
+        
+        Concurrent calls (e.g. via asyncio.gather) share one pooled
+        connection set and are served in parallel by the API.
+        
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens
+            temperature: Sampling temperature
+            semantic_key: Question and chunk digest for the semantic cache
             
-            else:
-                error_text = response.text
-                logger.error(f"Gemma API error {response.status_code}: {error_text}")
-                return f"Error: API returned status {response.status_code}"
+        Returns:
+            Generated text
+        """
+        max_tokens = max_tokens or self.default_max_tokens
+        prompt = self._budget(prompt, max_tokens + PROMPT_RESERVE)
+        temperature = temperature if temperature is not None else self.default_temperature
+        
+        cache_key = self.response_cache.make_key(self.model, prompt, max_tokens, temperature, top_p=TOP_P)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            self.call_stats.cache_hit()
+            return cached
+        
+        return await self._inflight.ado(
+            cache_key,
+            lambda: self._agenerate_uncached(prompt, max_tokens, temperature, cache_key, semantic_key)
+        )
+    
+    async def _agenerate_uncached(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        cache_key: Optional[str],
+        semantic_key: Optional[SemanticKey] = None
+    ) -> str:
+        """Async counterpart of _generate_uncached."""
+        question, scope = semantic_lookup_args(semantic_key, f"{self.model}:{max_tokens}")
+        cached, prompt_vector = await asyncio.to_thread(
+            self.semantic_cache.lookup, question, scope, temperature
+        )
+        if cached is not None:
+            self.call_stats.cache_hit()
+            return cached
+        
+        try:
+            with self.call_stats.track() as call:
+                payload = orjson.dumps(self._build_payload(prompt, max_tokens, temperature, stream=False))
+                for attempt in range(RETRY_ATTEMPTS):
+                    client = self._async_client()
+                    response = await client.send(
+                        client.build_request("POST", self.api_url, content=payload), stream=True
+                    )
+                    if response.status_code not in RETRY_STATUSES or attempt == RETRY_ATTEMPTS - 1:
+                        break
+                    delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+                    if delay is None:
+                        # Asked to wait longer than we retry for; report the limit
+                        break
+                    await response.aclose()
+                    logger.warning(f"Gemma API returned {response.status_code}, retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
                 
-        except requests.exceptions.Timeout:
+                body = await aread_body(response)
+                text, generated = self._handle_response(response, body)
+                if generated:
+                    call.chars_out = len(text)
+                    self.response_cache.put(cache_key, text)
+                    self.semantic_cache.put(prompt_vector, scope, text)
+                return text
+        
+        except httpx.TimeoutException:
             logger.error("Gemma API request timed out")
             return "Error: Request timed out. Please try again."
         
@@ -151,6 +292,133 @@ class GemmaLLM(BaseLLM):
             logger.error(f"Error calling Gemma API: {str(e)}")
             return f"Error: {str(e)}"
     
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """API call counters (calls, errors, cache hits, latency, output size)."""
+        return self.call_stats.stats
+    
+    def _budget(self, prompt: str, reserve: int) -> str:
+        """
+        Trim a prompt that would overflow the context window.
+        
+        Args:
+            prompt: Input prompt
+            reserve: Tokens to keep free for the completion
+            
+        Returns:
+            Prompt that fits in context_limit - reserve (estimated) tokens
+        """
+        budget = self.context_limit - reserve
+        fitted = fit_prompt(prompt, budget)
+        if fitted is not prompt:
+            logger.warning(
+                f"Prompt of ~{estimate_tokens(prompt)} tokens exceeds the Gemma budget "
+                f"of {budget}; dropped the middle of the context"
+            )
+        return fitted
+    
+    def _async_client(self) -> httpx.AsyncClient:
+        """Return the async client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            self._aclient = httpx.AsyncClient(
+                headers=self.headers,
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+                timeout=30
+            )
+            self._aclient_loop = loop
+        return self._aclient
+    
+    def _build_payload(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        stream: bool
+    ) -> Dict[str, Any]:
+        """Build the request body (OpenAI-compatible format)."""
+        return {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "top_p": TOP_P,
+            "stream": stream
+        }
+    
+    @staticmethod
+    def _handle_response(response, body: bytes) -> Tuple[str, bool]:
+        """
+        Turn a chat completions response into text.
+        
+        Args:
+            response: requests or httpx response
+            body: Response body, read with a size limit
+            
+        Returns:
+            (text, whether the text was generated by the model rather than
+            a user-facing error message)
+        """
+        if response.status_code == 200:
+            result = orjson.loads(body)
+            
+            # Extract response from OpenAI-compatible format
+            if "choices" in result and len(result["choices"]) > 0:
+                choice = result["choices"][0]
+                if "message" in choice and "content" in choice["message"]:
+                    text = choice["message"]["content"].strip()
+                    logger.info(f"Gemma response: {len(text)} chars")
+                    return text, True
+            
+            logger.warning(f"Unexpected response format: {result}")
+            return "Error: Unexpected response format from Gemma API", False
+        
+        elif response.status_code == 401:
+            logger.error("Invalid HuggingFace API key")
+            return "⚠️ Invalid HuggingFace API key. Please check your token.", False
+        
+        elif response.status_code == 429:
+            logger.warning("Rate limit reached")
+            return "⚠️ Rate limit reached. Please wait a moment and try again.", False
+        
+        elif response.status_code == 503:
+            logger.warning("Model is loading")
+            return "⏳ Model is loading. Please try again in a moment.", False
+        
+        else:
+            error_text = body[:500].decode("utf-8", "replace")
+            logger.error(f"Gemma API error {response.status_code}: {error_text}")
+            return f"Error: API returned status {response.status_code}", False
+    
+    @staticmethod
+    def _parse_stream_data(data: bytes) -> Optional[str]:
+        """
+        Extract the text chunk from one SSE data payload.
+        
+        Args:
+            data: Payload of an SSE data line
+            
+        Returns:
+            Text chunk ("" for payloads without one), or None at the end of the stream
+        """
+        if data == b'[DONE]':
+            return None
+        try:
+            chunk_data = orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return ""
+        # Every chunk but the role/stop ones has the full path, so try it directly
+        try:
+            return chunk_data["choices"][0]["delta"]["content"] or ""
+        except (KeyError, IndexError, TypeError):
+            return ""
+    
     def stream_generate(self, prompt: str, max_tokens: int = None, temperature: float = None):
         """
         Stream generation from Gemma model.
@@ -166,55 +434,28 @@ class GemmaLLM(BaseLLM):
             Text chunks as they arrive
         """
         max_tokens = max_tokens or self.default_max_tokens
-        temperature = temperature or self.default_temperature
+        prompt = self._budget(prompt, max_tokens + PROMPT_RESERVE)
+        temperature = temperature if temperature is not None else self.default_temperature
         
         try:
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "max_tokens": max_tokens,
-                "temperature": temperature,
-                "top_p": 0.95,
-                "stream": True  # Enable streaming
-            }
-            
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            response = requests.post(
+            response = _SESSION.post(
                 self.api_url,
-                headers=headers,
-                json=payload,
+                headers=self.headers,
+                data=orjson.dumps(self._build_payload(prompt, max_tokens, temperature, stream=True)),
                 stream=True,
                 timeout=30
             )
             
             if response.status_code == 200:
                 full_text = ""
-                for line in response.iter_lines():
-                    if line:
-                        line = line.decode('utf-8')
-                        if line.startswith('data: '):
-                            data = line[6:]
-                            if data == '[DONE]':
-                                break
-                            try:
-                                chunk_data = json.loads(data)
-                                if "choices" in chunk_data:
-                                    choice = chunk_data["choices"][0]
-                                    if "delta" in choice and "content" in choice["delta"]:
-                                        content = choice["delta"]["content"]
-                                        full_text += content
-                                        yield content
-                            except json.JSONDecodeError:
-                                continue
+                # Chunked SSE bodies are handed over chunk by chunk; the size only caps each read
+                for data in iter_sse_data(response.iter_content(chunk_size=SSE_READ_SIZE)):
+                    content = self._parse_stream_data(data)
+                    if content is None:
+                        break
+                    if content:
+                        full_text += content
+                        yield content
                 
                 if full_text:
                     logger.info(f"Streamed {len(full_text)} chars from Gemma")
@@ -229,6 +470,54 @@ class GemmaLLM(BaseLLM):
             logger.error(f"Streaming error: {e}")
             result = self.generate(prompt, max_tokens, temperature)
             yield result
+    
+    async def astream_generate(
+        self,
+        prompt: str,
+        max_tokens: int = None,
+        temperature: float = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream generation from Gemma model without blocking the event loop.
+        
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens
+            temperature: Sampling temperature
+            
+        Yields:
+            Text chunks as they arrive
+        """
+        max_tokens = max_tokens or self.default_max_tokens
+        prompt = self._budget(prompt, max_tokens + PROMPT_RESERVE)
+        temperature = temperature if temperature is not None else self.default_temperature
+        
+        try:
+            full_text = ""
+            async with self._async_client().stream(
+                "POST",
+                self.api_url,
+                content=orjson.dumps(self._build_payload(prompt, max_tokens, temperature, stream=True))
+            ) as response:
+                if response.status_code == 200:
+                    async for data in aiter_sse_data(response.aiter_bytes()):
+                        content = self._parse_stream_data(data)
+                        if content is None:
+                            break
+                        if content:
+                            full_text += content
+                            yield content
+            
+            if full_text:
+                logger.info(f"Streamed {len(full_text)} chars from Gemma")
+                return
+            
+            logger.warning("Streaming failed, falling back to regular generation")
+        
+        except Exception as e:
+            logger.error(f"Streaming error: {e}")
+        
+        yield await self.agenerate(prompt, max_tokens, temperature)
 
 
 def get_gemma_llm() -> BaseLLM:
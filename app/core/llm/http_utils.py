@@ -0,0 +1,68 @@
+"""Bounded response reading shared by the remote LLM clients."""
+import httpx
+import requests
+
+# Far larger than any plausible completion; bodies beyond this are refused
+MAX_RESPONSE_BYTES = 4 * 1024 * 1024
+
+
+class ResponseTooLarge(Exception):
+    """The response body exceeded MAX_RESPONSE_BYTES."""
+
+
+def read_body(response: requests.Response, limit: int = MAX_RESPONSE_BYTES) -> bytes:
+    """
+    Read a streamed (stream=True) response body, refusing oversized ones.
+    
+    Args:
+        response: requests response opened with stream=True
+        limit: Maximum body size in bytes
+        
+    Returns:
+        Body bytes
+        
+    Raises:
+        ResponseTooLarge: If Content-Length or the bytes received exceed limit
+    """
+    try:
+        _check_length(response.headers.get("Content-Length"), limit)
+        body = bytearray()
+        for chunk in response.iter_content(chunk_size=65536):
+            body += chunk
+            if len(body) > limit:
+                raise ResponseTooLarge(f"Response body exceeds {limit} bytes")
+        return bytes(body)
+    finally:
+        response.close()
+
+
+async def aread_body(response: httpx.Response, limit: int = MAX_RESPONSE_BYTES) -> bytes:
+    """
+    Async counterpart of read_body for httpx responses sent with stream=True.
+    
+    Args:
+        response: Unread httpx response
+        limit: Maximum body size in bytes
+        
+    Returns:
+        Body bytes
+        
+    Raises:
+        ResponseTooLarge: If Content-Length or the bytes received exceed limit
+    """
+    try:
+        _check_length(response.headers.get("Content-Length"), limit)
+        body = bytearray()
+        async for chunk in response.aiter_bytes():
+            body += chunk
+            if len(body) > limit:
+                raise ResponseTooLarge(f"Response body exceeds {limit} bytes")
+        return bytes(body)
+    finally:
+        await response.aclose()
+
+
+def _check_length(content_length, limit: int):
+    """Fail fast when the declared body size is over the limit."""
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise ResponseTooLarge(f"Response of {content_length} bytes exceeds {limit} bytes")
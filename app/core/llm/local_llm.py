@@ -1,11 +1,39 @@
 """Local LLM wrapper using Hugging Face transformers."""
+from functools import lru_cache
+from pathlib import Path
 from typing import Optional
+import re
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+from filelock import FileLock
+from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteria, StoppingCriteriaList
 
 from app.config import settings
 from app.utils.logger import app_logger as logger
 from app.core.llm.orchestrator import BaseLLM
+from app.core.llm.cache import SemanticKey, get_llm_response_cache
+
+# Markers where the model starts echoing prompt structure instead of answering
+_STOP_RE = re.compile(r"\n\nQuestion:|\n\nContext:|###|---")
+
+# Trailing tokens decoded at each step to look for a stop marker; enough to
+# cover the longest marker even when it is split into single characters
+STOP_WINDOW_TOKENS = 16
+
+
+class _StopOnMarkers(StoppingCriteria):
+    """Stop generating as soon as the new text contains a stop marker."""
+    
+    def __init__(self, tokenizer, prompt_length: int):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        start = max(self.prompt_length, input_ids.shape[1] - STOP_WINDOW_TOKENS)
+        done = [
+            _STOP_RE.search(self.tokenizer.decode(row[start:], skip_special_tokens=True)) is not None
+            for row in input_ids
+        ]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
 
 
 class LocalLLM(BaseLLM):
@@ -31,38 +59,33 @@ class LocalLLM(BaseLLM):
         """
         self.model_name = model_name or settings.local_model_name
         self.max_length = max_length or settings.local_model_max_length
+        # Deterministic (temperature 0) answers are served from memory on repeat prompts
+        self.response_cache = get_llm_response_cache()
         
-        # Determine device
-        if device:
-            self.device = device
-        elif torch.cuda.is_available():
-            self.device = "cuda"
-        elif torch.backends.mps.is_available():
-            self.device = "mps"
-        else:
-            self.device = "cpu"
+        self.device = device or _default_device()
         
         logger.info(f"Loading local model: {self.model_name} on {self.device}")
         
         # Load tokenizer and model
         try:
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_name,
-                torch_dtype=torch.float16 if self.device != "cpu" else torch.float32,
-                device_map="auto" if self.device == "cuda" else None
-            )
+            # Workers starting together would otherwise download into the
+            # HF cache concurrently; the first one fetches, the rest read
+            with FileLock(_lock_path(self.model_name)):
+                self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                self.model = AutoModelForCausalLM.from_pretrained(
+                    self.model_name,
+                    torch_dtype=_model_dtype(self.device),
+                    device_map="auto" if self.device == "cuda" else None,
+                    # Load straight into the final weights instead of a random init first
+                    low_cpu_mem_usage=True
+                )
             
             if self.device != "cuda":
                 self.model = self.model.to(self.device)
+            self.model.eval()
             
-            # Create generation pipeline
-            self.pipeline = pipeline(
-                "text-generation",
-                model=self.model,
-                tokenizer=self.tokenizer,
-                device=self.device if self.device != "mps" else -1
-            )
+            if settings.local_model_compile and self.device == "cuda":
+                self._compile()
             
             logger.info(f"Local model loaded successfully on {self.device}")
             
@@ -74,7 +97,8 @@ class LocalLLM(BaseLLM):
         self,
         prompt: str,
         max_tokens: int = 500,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        semantic_key: Optional[SemanticKey] = None
     ) -> str:
         """
         Generate text using local model.
@@ -83,33 +107,83 @@ class LocalLLM(BaseLLM):
             prompt: Input prompt
             max_tokens: Maximum tokens to generate
             temperature: Sampling temperature
+            semantic_key: Unused; this provider has no semantic cache
             
         Returns:
             Generated text
         """
+        cache_key = self.response_cache.make_key(self.model_name, prompt, max_tokens, temperature)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            # Generate
-            outputs = self.pipeline(
-                prompt,
-                max_new_tokens=max_tokens,
-                temperature=temperature,
-                do_sample=True,
-                top_p=0.9,
-                return_full_text=False
-            )
+            inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
+            
+            # Generate; the KV cache keeps each decoding step to the new token
+            with torch.inference_mode():
+                output = self.model.generate(
+                    **inputs,
+                    **self._sampling_kwargs(temperature),
+                    max_new_tokens=max_tokens,
+                    use_cache=True,
+                    pad_token_id=self._pad_token_id,
+                    # No decoding steps are spent on text _clean_response would cut
+                    stopping_criteria=StoppingCriteriaList([
+                        _StopOnMarkers(self.tokenizer, inputs["input_ids"].shape[1])
+                    ])
+                )
             
-            # Extract generated text
-            generated_text = outputs[0]["generated_text"]
+            # Decode only the new tokens
+            generated_text = self.tokenizer.decode(
+                output[0, inputs["input_ids"].shape[1]:],
+                skip_special_tokens=True
+            )
             
             # Clean up response
             response = self._clean_response(generated_text, prompt)
             
+            self.response_cache.put(cache_key, response)
             return response
             
         except Exception as e:
             logger.error(f"Generation failed: {e}")
             return "I apologize, but I encountered an error generating a response."
     
+    @property
+    def _pad_token_id(self) -> int:
+        """Padding token, falling back to EOS for models without one."""
+        if self.tokenizer.pad_token_id is not None:
+            return self.tokenizer.pad_token_id
+        return self.tokenizer.eos_token_id
+    
+    @staticmethod
+    def _sampling_kwargs(temperature: float) -> dict:
+        """Sampling settings for generate(); greedy decoding at temperature 0."""
+        if temperature <= 0:
+            return {"do_sample": False}
+        return {"do_sample": True, "temperature": temperature, "top_p": 0.9}
+    
+    def _compile(self):
+        """
+        Compile the model's forward pass with torch.compile.
+        
+        Decoding calls forward once per token with tiny kernels, so fusing
+        them and capturing CUDA graphs (mode="reduce-overhead") removes most
+        of the per-token launch overhead. A short warm-up generation pays the
+        compilation cost at startup instead of on the first question.
+        """
+        eager_forward = self.model.forward
+        try:
+            self.model.forward = torch.compile(eager_forward, mode="reduce-overhead", dynamic=True)
+            inputs = self.tokenizer("warm up", return_tensors="pt").to(self.model.device)
+            with torch.inference_mode():
+                self.model.generate(**inputs, max_new_tokens=4, pad_token_id=self._pad_token_id)
+            logger.info("Compiled local model with torch.compile")
+        except Exception as e:
+            self.model.forward = eager_forward
+            logger.warning(f"torch.compile failed, using eager model: {e}")
+    
     def _clean_response(self, generated: str, prompt: str) -> str:
         """Clean and extract response from generated text."""
         # Remove prompt if present
@@ -119,20 +193,50 @@ class LocalLLM(BaseLLM):
         # Remove common artifacts
         generated = generated.strip()
         
-        # Truncate at first occurrence of stop sequences
-        stop_sequences = ["\n\nQuestion:", "\n\nContext:", "###", "---"]
-        for stop in stop_sequences:
-            if stop in generated:
-                generated = generated.split(stop)[0].strip()
+        # Truncate at the earliest stop marker, found in one scan
+        match = _STOP_RE.search(generated)
+        if match:
+            generated = generated[:match.start()].strip()
         
         return generated
 
 
+def _default_device() -> str:
+    """Pick the fastest available device."""
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def _model_dtype(device: str) -> torch.dtype:
+    """
+    Weight dtype for a device.
+    
+    BF16 where the GPU supports it (same range as FP32, so BF16-trained
+    models don't overflow), FP16 on other accelerators, FP32 on CPU.
+    """
+    if device == "cuda" and torch.cuda.is_bf16_supported():
+        return torch.bfloat16
+    if device != "cpu":
+        return torch.float16
+    return torch.float32
+
+
+def _lock_path(model_name: str) -> Path:
+    """File lock guarding the download and load of one model."""
+    lock_dir = Path(settings.data_dir) / "locks"
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    return lock_dir / f"{model_name.replace('/', '--')}.lock"
+
+
+@lru_cache(maxsize=4)
+def _build_local_llm(model_name: str, device: str) -> LocalLLM:
+    """Load a local model once per process for each (model, device) pair."""
+    return LocalLLM(model_name=model_name, device=device)
+
+
 def get_local_llm() -> LocalLLM:
     """Get or create local LLM instance."""
-    global _local_llm_instance
-    
-    if '_local_llm_instance' not in globals():
-        globals()['_local_llm_instance'] = LocalLLM()
-    
-    return globals()['_local_llm_instance']
+    return _build_local_llm(settings.local_model_name, _default_device())
@@ -1,22 +1,150 @@
 """LLM orchestrator for question answering with context."""
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 from abc import ABC, abstractmethod
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
+from app.core.llm.cache import SemanticKey, semantic_key
+from app.core.llm.prompts import CHARS_PER_TOKEN, PROMPT_RESERVE
 from app.utils.logger import app_logger as logger
 
+# Concurrent requests per generate_batch call
+MAX_BATCH_WORKERS = 8
+
+# Fixed instructions opening every question-answering prompt
+ANSWER_INSTRUCTIONS = (
+    "You are a helpful assistant. Answer the question based on the context provided below.\n"
+    "Provide a clear, detailed answer based only on the context. "
+    "If the context doesn't contain enough information, say so politely."
+)
+
+
+def _page_info(page: Any) -> str:
+    """Page suffix for a source citation, empty when the page is unknown."""
+    return f", Page {page}" if page else ""
+
 
 class BaseLLM(ABC):
     """Abstract base class for LLM providers."""
     
+    # Input window in tokens; None if the provider does not limit prompts
+    context_limit: Optional[int] = None
+    
     @abstractmethod
     def generate(
         self,
         prompt: str,
         max_tokens: int = 500,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        semantic_key: Optional[SemanticKey] = None
     ) -> str:
-        """Generate response from prompt."""
+        """
+        Generate response from prompt.
+        
+        semantic_key (question and retrieved chunks, see cache.semantic_key)
+        lets providers with a semantic cache reuse answers to paraphrased
+        questions; other providers ignore it.
+        """
         pass
+    
+    async def agenerate(
+        self,
+        prompt: str,
+        max_tokens: int = None,
+        temperature: float = None,
+        semantic_key: Optional[SemanticKey] = None
+    ) -> str:
+        """
+        Generate response without blocking the event loop.
+        
+        Providers with a native async client override this; the default
+        runs generate() in a worker thread so calls can still be gathered.
+        """
+        kwargs = {}
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        return await asyncio.to_thread(self.generate, prompt, semantic_key=semantic_key, **kwargs)
+    
+    def generate_batch(
+        self,
+        prompts: List[str],
+        max_tokens: int = None,
+        temperature: float = None,
+        semantic_keys: Optional[List[SemanticKey]] = None
+    ) -> List[str]:
+        """
+        Generate responses for independent prompts concurrently.
+        
+        Calls run on a small thread pool, so remote providers overlap their
+        requests on pooled connections instead of waiting on each in turn.
+        
+        Args:
+            prompts: Input prompts
+            max_tokens: Maximum tokens per response
+            temperature: Sampling temperature
+            semantic_keys: Optional semantic cache key for each prompt
+            
+        Returns:
+            Generated texts, in prompt order
+        """
+        if not prompts:
+            return []
+        kwargs = {}
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        keys = semantic_keys or [None] * len(prompts)
+        
+        with ThreadPoolExecutor(max_workers=min(len(prompts), MAX_BATCH_WORKERS)) as executor:
+            return list(executor.map(
+                lambda prompt, key: self.generate(prompt, semantic_key=key, **kwargs), prompts, keys
+            ))
+    
+    async def agenerate_batch(
+        self,
+        prompts: List[str],
+        max_tokens: int = None,
+        temperature: float = None,
+        semantic_keys: Optional[List[SemanticKey]] = None
+    ) -> List[str]:
+        """
+        Async counterpart of generate_batch, built on agenerate.
+        
+        Args:
+            prompts: Input prompts
+            max_tokens: Maximum tokens per response
+            temperature: Sampling temperature
+            semantic_keys: Optional semantic cache key for each prompt
+            
+        Returns:
+            Generated texts, in prompt order
+        """
+        keys = semantic_keys or [None] * len(prompts)
+        return list(await asyncio.gather(
+            *(self.agenerate(prompt, max_tokens, temperature, key) for prompt, key in zip(prompts, keys))
+        ))
+    
+    def generate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = None,
+        temperature: float = None
+    ) -> Iterator[str]:
+        """
+        Yield the response in pieces as it is generated.
+        
+        Providers that can stream override this; the default yields the
+        full response once.
+        """
+        kwargs = {}
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        yield self.generate(prompt, **kwargs)
 
 
 class LLMOrchestrator:
@@ -55,8 +183,8 @@ class LLMOrchestrator:
         Returns:
             Generated answer
         """
-        # Build context from chunks
-        context = self._build_context(context_chunks)
+        # Build context from the best-ranked chunks that fit the model
+        context = self._build_context(context_chunks, self._context_chars(query, max_tokens))
         
         # Build prompt
         prompt = self._build_prompt(query, context)
@@ -68,36 +196,104 @@ class LLMOrchestrator:
         answer = self.llm.generate(
             prompt=prompt,
             max_tokens=max_tokens,
-            temperature=temperature
+            temperature=temperature,
+            semantic_key=semantic_key(query, context_chunks)
         )
         
         logger.info(f"Generated answer: {len(answer)} chars")
         return answer
     
-    def _build_context(self, chunks: List[Dict[str, Any]]) -> str:
+    async def answer_questions(
+        self,
+        queries: List[str],
+        context_chunks: List[List[Dict[str, Any]]],
+        max_tokens: int = 500,
+        temperature: float = 0.7
+    ) -> List[str]:
         """
-        Build context string from retrieved chunks.
+        Answer several independent questions concurrently.
+        
+        The LLM calls are awaited together, so N remote requests take about
+        as long as the slowest one instead of their sum.
         
         Args:
-            chunks: List of chunk dictionaries
+            queries: User questions
+            context_chunks: Retrieved chunks for each question
+            max_tokens: Maximum response tokens
+            temperature: Sampling temperature
             
         Returns:
-            Formatted context string
+            Generated answers, in query order
+        """
+        prompts = [
+            self._build_prompt(query, self._build_context(chunks, self._context_chars(query, max_tokens)))
+            for query, chunks in zip(queries, context_chunks)
+        ]
+        
+        keys = [semantic_key(query, chunks) for query, chunks in zip(queries, context_chunks)]
+        
+        logger.info(f"Generating answers for {len(prompts)} queries")
+        return await self.llm.agenerate_batch(prompts, max_tokens, temperature, keys)
+    
+    def _context_chars(self, query: str, max_tokens: int) -> Optional[int]:
         """
-        context_parts = []
+        Characters of context that fit the provider's window next to the prompt.
         
-        for i, chunk in enumerate(chunks):
-            filename = chunk.get("filename", "Unknown")
-            chunk_text = chunk.get("chunk_text", "")
-            page = chunk.get("page", "")
+        Args:
+            query: User question
+            max_tokens: Tokens reserved for the response
             
-            # Format with source citation
-            page_info = f", Page {page}" if page else ""
-            source_info = f"[Source {i+1}: {filename}{page_info}]"
+        Returns:
+            Character budget for the context, or None if the provider has no limit
+        """
+        if self.llm.context_limit is None:
+            return None
+        prompt_tokens = self.llm.context_limit - max_tokens - PROMPT_RESERVE
+        return prompt_tokens * CHARS_PER_TOKEN - len(self._build_prompt(query, ""))
+    
+    def _build_context(self, chunks: List[Dict[str, Any]], max_chars: Optional[int] = None) -> str:
+        """
+        Build context string from retrieved chunks.
+        
+        Chunks are laid out in document order rather than score order, so a
+        chunk retrieved again for a related question lands at the same spot
+        and the cached prompt prefix reaches further. Source numbers still
+        follow the retrieval rank, matching the returned sources list.
+        
+        When the context would exceed max_chars, the lowest-ranked chunks are
+        dropped before reordering, so the provider never has to trim the
+        prompt and lose a well-ranked chunk. The top chunk is always kept.
+        
+        Args:
+            chunks: List of chunk dictionaries, best first
+            max_chars: Optional context size limit in characters
             
-            context_parts.append(f"{source_info}\n{chunk_text}")
+        Returns:
+            Formatted context string
+        """
+        # One string per chunk (citation header and text), in rank order
+        entries = [
+            f"[Source {i + 1}: {chunk.get('filename', 'Unknown')}"
+            f"{_page_info(chunk.get('page'))}]\n{chunk.get('chunk_text', '')}"
+            for i, chunk in enumerate(chunks)
+        ]
+        
+        if max_chars is not None:
+            kept = 1
+            used = len(entries[0]) if entries else 0
+            while kept < len(entries) and used + 2 + len(entries[kept]) <= max_chars:
+                used += 2 + len(entries[kept])
+                kept += 1
+            if kept < len(entries):
+                logger.info(f"Context budget fits {kept} of {len(entries)} chunks")
+            entries = entries[:kept]
         
-        return "\n\n".join(context_parts)
+        # Stable sort: chunks without position info keep their retrieval order
+        order = sorted(
+            range(len(entries)),
+            key=lambda i: (str(chunks[i].get("doc_id", "")), chunks[i].get("chunk_index", 0))
+        )
+        return "\n\n".join([entries[i] for i in order])
     
     def _build_prompt(self, query: str, context: str) -> str:
         """
@@ -110,16 +306,15 @@ class LLMOrchestrator:
         Returns:
             Formatted prompt
         """
-        # Enhanced prompt - clearer separation to avoid LLM echoing instructions
-        prompt = f"""You are a helpful assistant. Answer the question based on the context provided below.
+        # All instructions lead the prompt and the per-query parts follow, so
+        # providers that cache repeated prefixes can reuse the static part
+        prompt = f"""{ANSWER_INSTRUCTIONS}
 
 Context Information:
 {context}
 
 User Question: {query}
 
-Provide a clear, detailed answer based only on the context above. If the context doesn't contain enough information, say so politely.
-
 Your Answer:"""
         
         return prompt
@@ -0,0 +1,55 @@
+"""Prompt sizing helpers shared by the remote LLM clients."""
+
+# Rough characters per token for English text
+CHARS_PER_TOKEN = 4
+
+# Tokens kept free on top of the completion for the model's own formatting
+PROMPT_RESERVE = 512
+
+# Characters always kept from the end of an oversized prompt (question and answer cue)
+TAIL_CHARS = 1000
+
+TRUNCATION_MARKER = "\n[...]\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token count estimate, without loading a tokenizer."""
+    return len(text) // CHARS_PER_TOKEN
+
+
+def fit_prompt(prompt: str, max_tokens: int) -> str:
+    """
+    Shorten a prompt to an estimated token budget.
+    
+    RAG prompts put instructions first, then retrieved context, then the
+    question. The start and the end are kept and the cut falls in between.
+    The orchestrator already drops whole chunks by rank to fit the window
+    (see LLMOrchestrator._build_context) and then lays them out in document
+    order, so this is a last-resort guard: the middle it cuts is not
+    ordered by relevance.
+    
+    Args:
+        prompt: Full prompt
+        max_tokens: Token budget for the prompt
+        
+    Returns:
+        The prompt itself if it fits, otherwise a shortened copy
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if max_chars <= 0 or len(prompt) <= max_chars:
+        return prompt
+    
+    tail_chars = min(TAIL_CHARS, max_chars // 2)
+    head_chars = max(max_chars - tail_chars - len(TRUNCATION_MARKER), 0)
+    
+    # Cut at line boundaries so neither side starts or ends mid-line
+    head = prompt[:head_chars]
+    cut = head.rfind("\n")
+    if cut > head_chars // 2:
+        head = head[:cut]
+    tail = prompt[-tail_chars:]
+    cut = tail.find("\n")
+    if 0 <= cut < tail_chars // 2:
+        tail = tail[cut + 1:]
+    
+    return head + TRUNCATION_MARKER + tail
@@ -1,11 +1,13 @@
 """Remote LLM wrappers for OpenAI and Anthropic."""
-from typing import Optional
+from typing import Any, Dict, Optional
+import asyncio
 import openai
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
 
 from app.config import settings
 from app.utils.logger import app_logger as logger
 from app.core.llm.orchestrator import BaseLLM
+from app.core.llm.cache import SemanticKey, get_llm_response_cache
 
 
 class OpenAILLM(BaseLLM):
@@ -37,8 +39,13 @@ class OpenAILLM(BaseLLM):
         if not self.api_key:
             raise ValueError("OpenAI API key not provided")
         
-        # Set API key
-        openai.api_key = self.api_key
+        self.client = openai.OpenAI(api_key=self.api_key)
+        # Deterministic (temperature 0) answers are served from memory on repeat prompts
+        self.response_cache = get_llm_response_cache()
+        
+        # Async client for agenerate(); created per event loop on first use
+        self._aclient: Optional[openai.AsyncOpenAI] = None
+        self._aclient_loop: Optional[asyncio.AbstractEventLoop] = None
         
         logger.info(f"Initialized OpenAI LLM with model: {self.model}")
     
@@ -46,7 +53,8 @@ class OpenAILLM(BaseLLM):
         self,
         prompt: str,
         max_tokens: int = None,
-        temperature: float = None
+        temperature: float = None,
+        semantic_key: Optional[SemanticKey] = None
     ) -> str:
         """
         Generate response using OpenAI API.
@@ -55,33 +63,92 @@ class OpenAILLM(BaseLLM):
             prompt: Input prompt
             max_tokens: Maximum tokens to generate
             temperature: Sampling temperature
+            semantic_key: Unused; this provider has no semantic cache
             
         Returns:
             Generated response
         """
-        max_tokens = max_tokens or self.default_max_tokens
-        temperature = temperature if temperature is not None else self.default_temperature
+        request = self._request(prompt, max_tokens, temperature)
+        cache_key = self.response_cache.make_key(
+            self.model, prompt, request["max_tokens"], request["temperature"]
+        )
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         try:
             logger.info(f"Calling OpenAI API with model: {self.model}")
             
-            response = openai.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
+            response = self.client.chat.completions.create(**request)
+            
+            answer = response.choices[0].message.content.strip()
+            
+            logger.info(f"OpenAI response received: {len(answer)} chars")
+            self.response_cache.put(cache_key, answer)
+            return answer
+            
+        except Exception as e:
+            logger.error(f"OpenAI API error: {e}")
+            return f"I apologize, but I encountered an error: {str(e)}"
+    
+    async def agenerate(
+        self,
+        prompt: str,
+        max_tokens: int = None,
+        temperature: float = None,
+        semantic_key: Optional[SemanticKey] = None
+    ) -> str:
+        """
+        Generate response without blocking the event loop.
+        
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens to generate
+            temperature: Sampling temperature
+            semantic_key: Unused; this provider has no semantic cache
+            
+        Returns:
+            Generated response
+        """
+        request = self._request(prompt, max_tokens, temperature)
+        cache_key = self.response_cache.make_key(
+            self.model, prompt, request["max_tokens"], request["temperature"]
+        )
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = await self._async_client().chat.completions.create(**request)
             
             answer = response.choices[0].message.content.strip()
             
             logger.info(f"OpenAI response received: {len(answer)} chars")
+            self.response_cache.put(cache_key, answer)
             return answer
             
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
             return f"I apologize, but I encountered an error: {str(e)}"
+    
+    def _request(self, prompt: str, max_tokens: Optional[int], temperature: Optional[float]) -> Dict[str, Any]:
+        """Build the chat completion arguments, filling in the defaults."""
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": max_tokens or self.default_max_tokens,
+            "temperature": temperature if temperature is not None else self.default_temperature
+        }
+    
+    def _async_client(self) -> openai.AsyncOpenAI:
+        """Return the async client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            self._aclient = openai.AsyncOpenAI(api_key=self.api_key)
+            self._aclient_loop = loop
+        return self._aclient
 
 
 class AnthropicLLM(BaseLLM):
@@ -108,6 +175,12 @@ class AnthropicLLM(BaseLLM):
             raise ValueError("Anthropic API key not provided")
         
         self.client = Anthropic(api_key=self.api_key)
+        # Deterministic (temperature 0) answers are served from memory on repeat prompts
+        self.response_cache = get_llm_response_cache()
+        
+        # Async client for agenerate(); created per event loop on first use
+        self._aclient: Optional[AsyncAnthropic] = None
+        self._aclient_loop: Optional[asyncio.AbstractEventLoop] = None
         
         logger.info(f"Initialized Anthropic LLM with model: {self.model}")
     
@@ -115,7 +188,8 @@ class AnthropicLLM(BaseLLM):
         self,
         prompt: str,
         max_tokens: int = 500,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        semantic_key: Optional[SemanticKey] = None
     ) -> str:
         """
         Generate response using Anthropic API.
@@ -124,30 +198,93 @@ class AnthropicLLM(BaseLLM):
             prompt: Input prompt
             max_tokens: Maximum tokens to generate
             temperature: Sampling temperature
+            semantic_key: Unused; this provider has no semantic cache
             
         Returns:
             Generated response
         """
+        cache_key = self.response_cache.make_key(self.model, prompt, max_tokens, temperature)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             logger.info(f"Calling Anthropic API with model: {self.model}")
             
             message = self.client.messages.create(
-                model=self.model,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
+                **self._request(prompt, max_tokens, temperature)
             )
             
             answer = message.content[0].text.strip()
             
             logger.info(f"Anthropic response received: {len(answer)} chars")
+            self.response_cache.put(cache_key, answer)
             return answer
             
         except Exception as e:
             logger.error(f"Anthropic API error: {e}")
             return f"I apologize, but I encountered an error: {str(e)}"
+    
+    async def agenerate(
+        self,
+        prompt: str,
+        max_tokens: int = None,
+        temperature: float = None,
+        semantic_key: Optional[SemanticKey] = None
+    ) -> str:
+        """
+        Generate response without blocking the event loop.
+        
+        Args:
+            prompt: Input prompt
+            max_tokens: Maximum tokens to generate (default 500)
+            temperature: Sampling temperature (default 0.7)
+            semantic_key: Unused; this provider has no semantic cache
+            
+        Returns:
+            Generated response
+        """
+        max_tokens = max_tokens or 500
+        temperature = 0.7 if temperature is None else temperature
+        
+        cache_key = self.response_cache.make_key(self.model, prompt, max_tokens, temperature)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        try:
+            message = await self._async_client().messages.create(
+                **self._request(prompt, max_tokens, temperature)
+            )
+            
+            answer = message.content[0].text.strip()
+            
+            logger.info(f"Anthropic response received: {len(answer)} chars")
+            self.response_cache.put(cache_key, answer)
+            return answer
+            
+        except Exception as e:
+            logger.error(f"Anthropic API error: {e}")
+            return f"I apologize, but I encountered an error: {str(e)}"
+    
+    def _request(self, prompt: str, max_tokens: int, temperature: float) -> Dict[str, Any]:
+        """Build the messages API arguments."""
+        return {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ]
+        }
+    
+    def _async_client(self) -> AsyncAnthropic:
+        """Return the async client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            self._aclient = AsyncAnthropic(api_key=self.api_key)
+            self._aclient_loop = loop
+        return self._aclient
 
 
 def get_remote_llm(provider: str = "openai") -> BaseLLM:
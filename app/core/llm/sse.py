@@ -0,0 +1,62 @@
+"""Server-sent events parsing shared by the streaming LLM clients."""
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, List
+
+DATA_PREFIX = b"data:"
+
+# Bytes requested per read from a streamed response
+SSE_READ_SIZE = 4096
+
+
+def iter_sse_data(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Yield the payload of each `data:` line in a byte stream.
+    
+    Lines are split and matched on raw bytes, so nothing is decoded until
+    the payload reaches the JSON parser.
+    
+    Args:
+        chunks: Response body chunks as they arrive
+        
+    Yields:
+        Payload bytes of each data line
+    """
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        yield from _take_data_lines(buffer)
+    buffer += b"\n"
+    yield from _take_data_lines(buffer)
+
+
+async def aiter_sse_data(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """
+    Async counterpart of iter_sse_data.
+    
+    Args:
+        chunks: Response body chunks as they arrive
+        
+    Yields:
+        Payload bytes of each data line
+    """
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer += chunk
+        for data in _take_data_lines(buffer):
+            yield data
+    buffer += b"\n"
+    for data in _take_data_lines(buffer):
+        yield data
+
+
+def _take_data_lines(buffer: bytearray) -> List[bytes]:
+    """Remove the complete lines from buffer and return their data payloads."""
+    payloads = []
+    start = 0
+    while (end := buffer.find(b"\n", start)) != -1:
+        if buffer.startswith(DATA_PREFIX, start):
+            # Optional single space after the colon; CRLF line endings are allowed
+            payload = bytes(buffer[start + len(DATA_PREFIX):end]).rstrip(b"\r")
+            payloads.append(payload[1:] if payload.startswith(b" ") else payload)
+        start = end + 1
+    del buffer[:start]
+    return payloads
@@ -0,0 +1,97 @@
+"""Lightweight per-client call statistics for LLM providers."""
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator
+
+from app.utils.logger import app_logger as logger
+
+# Calls between two periodic stats log lines
+STATS_LOG_INTERVAL = 100
+
+
+class CallStats:
+    """
+    Counters for API calls made by one LLM client.
+
+    Tracks calls, failed calls, cache hits, total latency and generated
+    characters, so regressions (an extra retry, a slow fallback) show up in
+    the logs without running a profiler.
+    """
+
+    def __init__(self, name: str, log_interval: int = STATS_LOG_INTERVAL):
+        """
+        Initialize counters.
+
+        Args:
+            name: Client name used in the periodic log line
+            log_interval: Log the counters every this many calls (0 disables)
+        """
+        self.name = name
+        self.log_interval = log_interval
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._errors = 0
+        self._cache_hits = 0
+        self._latency_ms = 0.0
+        self._chars_out = 0
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the counters."""
+        with self._lock:
+            return self._snapshot()
+
+    def cache_hit(self):
+        """Count a response served from a cache instead of the API."""
+        with self._lock:
+            self._cache_hits += 1
+
+    @contextmanager
+    def track(self) -> Iterator[SimpleNamespace]:
+        """
+        Time one API call.
+
+        Set chars_out on the yielded object to the length of the generated
+        text; a call that raises is counted as an error. Cancelled calls
+        (e.g. a hedged request that lost) are not counted.
+
+        Yields:
+            Object with a chars_out attribute
+        """
+        call = SimpleNamespace(chars_out=0)
+        started = time.perf_counter()
+        try:
+            yield call
+        except Exception:
+            self._record(started, 0, error=True)
+            raise
+        self._record(started, call.chars_out, error=False)
+
+    def _record(self, started: float, chars_out: int, error: bool):
+        """Add one finished call to the counters."""
+        latency_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._calls += 1
+            self._errors += error
+            self._latency_ms += latency_ms
+            self._chars_out += chars_out
+            snapshot = None
+            if self.log_interval and self._calls % self.log_interval == 0:
+                snapshot = self._snapshot()
+
+        if snapshot is not None:
+            logger.info(f"{self.name} call stats: {snapshot}")
+
+    def _snapshot(self) -> Dict[str, Any]:
+        """Build the stats dict; the lock must be held."""
+        return {
+            "calls": self._calls,
+            "errors": self._errors,
+            "cache_hits": self._cache_hits,
+            "latency_ms": round(self._latency_ms, 1),
+            "avg_latency_ms": round(self._latency_ms / self._calls, 1) if self._calls else 0.0,
+            "chars_out": self._chars_out,
+            "chars_per_s": round(self._chars_out / (self._latency_ms / 1000), 1) if self._latency_ms else 0.0
+        }
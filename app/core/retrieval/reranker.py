@@ -7,6 +7,7 @@ from typing import List, Dict, Any
 import numpy as np
 
 from app.utils.logger import app_logger as logger
+from app.core.retrieval.ranker import predict_by_length, prepare_cross_encoder
 
 
 class CrossEncoderReranker:
@@ -39,6 +40,7 @@ class CrossEncoderReranker:
             
             logger.info(f"Loading cross-encoder: {self.model_name}")
             self.model = CrossEncoder(self.model_name)
+            prepare_cross_encoder(self.model)
             logger.info(f"Cross-encoder loaded successfully")
             
         except ImportError:
@@ -73,11 +75,11 @@ class CrossEncoderReranker:
             return candidates[:top_k]
         
         # Prepare query-candidate pairs
-        pairs = [[query, c["chunk_text"]] for c in candidates]
+        pairs = [(query, c["chunk_text"]) for c in candidates]
         
         # Compute cross-encoder scores (higher = more relevant)
         logger.info(f"Reranking {len(candidates)} candidates with cross-encoder")
-        scores = self.model.predict(pairs)
+        scores = predict_by_length(self.model, pairs)
         
         # Add scores to candidates
         for candidate, score in zip(candidates, scores):
@@ -30,8 +30,8 @@ async def lifespan(app: FastAPI):
     db_manager = get_db_manager()
     db_manager.create_tables()
     
-    # Initialize embedder
-    logger.info("Loading embedding model...")
+    # Initialize embedder (model weights load on first embedding call)
+    logger.info("Initializing embedder...")
     embedder = get_embedder()
     logger.info(f"Embedding dimension: {embedder.get_dimension()}")
     
@@ -56,6 +56,7 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down application...")
+    index_manager.flush()
     db_manager.close()
     logger.info("Application shutdown complete")
 
@@ -1,7 +1,8 @@
 """Database models using SQLAlchemy."""
 from datetime import datetime
-from typing import Optional, Dict, Any
-from sqlalchemy import create_engine, String, DateTime, ForeignKey, Text, Float, Integer
+from typing import Optional, Dict, Any, List, Tuple
+from sqlalchemy import create_engine, event, select, func, text, String, DateTime, ForeignKey, Text, Float, Integer
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import DeclarativeBase, relationship, sessionmaker, Session, Mapped, mapped_column
 from sqlalchemy.pool import StaticPool
 import json
@@ -10,6 +11,10 @@ from app.config import settings
 from app.utils.logger import app_logger as logger
 
 
+# Above this many IDs, stage them in a temp table instead of an IN (...) list
+MAX_IN_PARAMS = 500
+
+
 class Base(DeclarativeBase):
     """Base class for all database models."""
     type_annotation_map = {
@@ -81,6 +86,26 @@ class Query(Base):
         return f"<Query(id={self.id}, query_text={self.query_text[:50]}...)>"
 
 
+class CacheMeta(Base):
+    """Single-row table holding a counter bumped on every document write."""
+    
+    __tablename__ = "cache_meta"
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f"<CacheMeta(version={self.version})>"
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Enable WAL so readers don't block on the writer, per pooled connection."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
 # Database engine and session
 class DatabaseManager:
     """Manage database connections and sessions."""
@@ -97,15 +122,30 @@ class DatabaseManager:
         # Configure engine based on database type
         if self.database_url.startswith("sqlite"):
             # SQLite-specific configuration
-            self.engine = create_engine(
-                self.database_url,
-                connect_args={"check_same_thread": False},
-                poolclass=StaticPool,
-                echo=settings.debug
-            )
+            if ":memory:" in self.database_url or self.database_url == "sqlite://":
+                # In-memory databases only exist on a single connection
+                self.engine = create_engine(
+                    self.database_url,
+                    connect_args={"check_same_thread": False},
+                    poolclass=StaticPool,
+                    echo=settings.debug
+                )
+            else:
+                self.engine = create_engine(
+                    self.database_url,
+                    connect_args={"check_same_thread": False},
+                    pool_size=settings.db_pool_size,
+                    max_overflow=settings.db_max_overflow,
+                    echo=settings.debug
+                )
+                event.listen(self.engine, "connect", _set_sqlite_pragmas)
         else:
             self.engine = create_engine(
                 self.database_url,
+                pool_size=settings.db_pool_size,
+                max_overflow=settings.db_max_overflow,
+                pool_pre_ping=True,
+                pool_recycle=settings.db_pool_recycle,
                 echo=settings.debug
             )
         
@@ -123,10 +163,11 @@ class DatabaseManager:
         inspector = inspect(self.engine)
         existing_tables = inspector.get_table_names()
         
-        # Only create tables if they don't exist
-        if not existing_tables:
+        # Only create tables that don't exist yet
+        missing_tables = set(Base.metadata.tables) - set(existing_tables)
+        if missing_tables:
             Base.metadata.create_all(bind=self.engine, checkfirst=True)
-            logger.info("Database tables created")
+            logger.info(f"Database tables created: {sorted(missing_tables)}")
         else:
             logger.info(f"Database tables already exist: {existing_tables}")
     
@@ -160,6 +201,93 @@ def get_db_manager() -> DatabaseManager:
     return _db_manager
 
 
+def count_records(db: Session) -> Tuple[int, int, int]:
+    """
+    Count documents, chunks and queries in a single round-trip.
+    
+    The three counts are fused into one SELECT of scalar subqueries and
+    executed through Core, so no ORM objects are hydrated.
+    
+    Args:
+        db: Database session
+        
+    Returns:
+        Tuple of (documents, chunks, queries)
+    """
+    row = db.execute(
+        select(
+            select(func.count()).select_from(Document).scalar_subquery(),
+            select(func.count()).select_from(Chunk).scalar_subquery(),
+            select(func.count()).select_from(Query).scalar_subquery()
+        )
+    ).one()
+    return row[0], row[1], row[2]
+
+
+def count_chunks(db: Session, doc_ids: Optional[List[str]] = None) -> int:
+    """
+    Count chunks, optionally restricted to a set of documents.
+    
+    Large ID lists are staged in a temporary table and joined, so the
+    statement never exceeds the driver's bound-parameter limit.
+    
+    Args:
+        db: Database session
+        doc_ids: Optional list of document IDs (None = all)
+        
+    Returns:
+        Number of chunks
+    """
+    if not doc_ids:
+        return db.scalar(select(func.count()).select_from(Chunk))
+    
+    if len(doc_ids) <= MAX_IN_PARAMS:
+        return db.scalar(
+            select(func.count()).select_from(Chunk).where(Chunk.doc_id.in_(doc_ids))
+        )
+    
+    db.execute(text("CREATE TEMP TABLE IF NOT EXISTS _count_doc_ids (id TEXT PRIMARY KEY)"))
+    db.execute(text("DELETE FROM _count_doc_ids"))
+    db.execute(
+        text("INSERT INTO _count_doc_ids (id) VALUES (:id)"),
+        [{"id": doc_id} for doc_id in set(doc_ids)]
+    )
+    total = db.scalar(text(
+        "SELECT COUNT(*) FROM chunks c JOIN _count_doc_ids t ON c.doc_id = t.id"
+    ))
+    db.execute(text("DELETE FROM _count_doc_ids"))
+    return total
+
+
+def bump_doc_version(db: Session):
+    """
+    Increment the document collection version.
+    
+    Call from every code path that adds, removes or reprocesses documents,
+    before committing, so response caches keyed on the version are dropped.
+    
+    Args:
+        db: Database session
+    """
+    result = db.execute(text("UPDATE cache_meta SET version = version + 1 WHERE id = 1"))
+    if result.rowcount == 0:
+        db.execute(text("INSERT INTO cache_meta (id, version) VALUES (1, 1)"))
+
+
+def read_doc_version(conn: Connection) -> int:
+    """
+    Read the document collection version.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        Current version (0 if no document was ever written)
+    """
+    row = conn.exec_driver_sql("SELECT version FROM cache_meta WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
 def get_db() -> Session:
     """
     Get database session for dependency injection.
@@ -1,13 +1,15 @@
 """Document management service."""
 from typing import List, Optional, BinaryIO
 from pathlib import Path
+import json
 import os
-import shutil
 from datetime import datetime
 
+import aiofiles
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
 
-from app.models.database import Document, Chunk, get_db_manager
+from app.models.database import Document, Chunk, get_db_manager, bump_doc_version
 from app.models.schemas import DocumentInfo, DocumentList
 from app.core.ingestion.extractors import ExtractorFactory
 from app.core.ingestion.chunker import RecursiveChunker
@@ -17,6 +19,9 @@ from app.config import settings
 from app.utils.helpers import generate_doc_id, calculate_file_hash
 from app.utils.logger import app_logger as logger
 
+# Block size used when streaming uploads to disk
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
 
 class DocumentService:
     """
@@ -60,19 +65,22 @@ class DocumentService:
         temp_path = os.path.join(settings.upload_dir, f"{doc_id}{file_extension}")
         
         try:
-            # Write file
-            with open(temp_path, 'wb') as f:
-                shutil.copyfileobj(file, f)
-            
-            file_size = os.path.getsize(temp_path)
-            
-            # Check file size
-            if file_size > settings.max_upload_size_bytes:
-                os.remove(temp_path)
-                raise ValueError(
-                    f"File too large: {file_size} bytes "
-                    f"(max: {settings.max_upload_size_bytes})"
-                )
+            # Stream to disk in fixed-size blocks without blocking the event loop
+            file_size = 0
+            async with aiofiles.open(temp_path, 'wb') as f:
+                while True:
+                    block = file.read(UPLOAD_BLOCK_SIZE)
+                    if not block:
+                        break
+                    file_size += len(block)
+                    
+                    # Check file size (stop writing as soon as the limit is crossed)
+                    if file_size > settings.max_upload_size_bytes:
+                        raise ValueError(
+                            f"File too large: over {settings.max_upload_size_bytes} bytes "
+                            f"(max: {settings.max_upload_size_bytes})"
+                        )
+                    await f.write(block)
             
             # Create document record
             document = Document(
@@ -95,6 +103,7 @@ class DocumentService:
                 
                 # Update status
                 document.status = "completed"
+                bump_doc_version(db)
                 db.commit()
                 
                 logger.info(f"Document processing completed: {doc_id}")
@@ -103,6 +112,7 @@ class DocumentService:
                 logger.error(f"Document processing failed: {e}")
                 document.status = "failed"
                 document.error_message = str(e)
+                bump_doc_version(db)
                 db.commit()
                 raise
             
@@ -142,9 +152,14 @@ class DocumentService:
         
         logger.info(f"Created {len(chunks)} chunks")
         
-        # 3. Generate embeddings
+        # 3. Generate embeddings; chunks seen before (re-uploads, reindexing)
+        # come from the on-disk embedding cache instead of the model
         chunk_texts = [chunk.chunk_text for chunk in chunks]
-        embeddings = self.embedder.embed_chunks(chunk_texts, normalize=True)
+        embeddings = self.embedder.embed_batch_with_cache(
+            chunk_texts,
+            normalize=True,
+            keys=self.embedder.chunk_cache_keys(text, chunks)
+        )
         
         logger.info(f"Generated {len(embeddings)} embeddings")
         
@@ -211,13 +226,41 @@ class DocumentService:
         Returns:
             DocumentList
         """
-        total = db.query(Document).count()
-        documents = db.query(Document).offset(skip).limit(limit).all()
+        total = db.scalar(select(func.count()).select_from(Document))
+        rows = db.execute(
+            select(
+                Document.id,
+                Document.filename,
+                Document.file_type,
+                Document.file_size,
+                Document.upload_date,
+                Document.status,
+                Document.total_chunks,
+                Document.error_message,
+                Document.doc_metadata
+            )
+            .offset(skip)
+            .limit(limit)
+        ).all()
+        
+        # Rows come straight from the database, so skip ORM hydration and
+        # Pydantic validation
+        documents = [
+            DocumentInfo.model_construct(
+                id=row.id,
+                filename=row.filename,
+                file_type=row.file_type,
+                file_size=row.file_size,
+                upload_date=row.upload_date,
+                status=row.status,
+                total_chunks=row.total_chunks,
+                error_message=row.error_message,
+                metadata=json.loads(row.doc_metadata) if row.doc_metadata else None
+            )
+            for row in rows
+        ]
         
-        return DocumentList(
-            documents=[DocumentInfo.model_validate(doc) for doc in documents],
-            total=total
-        )
+        return DocumentList(documents=documents, total=total)
     
     def delete_document(self, doc_id: str, db: Session) -> bool:
         """
@@ -244,6 +287,7 @@ class DocumentService:
         
         # Delete from database (cascades to chunks)
         db.delete(document)
+        bump_doc_version(db)
         db.commit()
         
         # Delete file if exists
@@ -305,6 +349,10 @@ class DocumentService:
                     
             except Exception as e:
                 logger.error(f"Failed to reindex {document.id}: {e}")
+                db.rollback()
+        
+        bump_doc_version(db)
+        db.commit()
         
         logger.info(f"Reindexed {reindexed_count} documents")
         return reindexed_count
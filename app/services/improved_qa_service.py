@@ -8,11 +8,28 @@ import time
 
 from app.core.retrieval.retriever import SemanticRetriever
 from app.core.retrieval.reranker import get_reranker
+from app.core.llm.cache import semantic_key
 from app.core.llm.remote_llm import get_llm
 from app.core.llm.orchestrator import LLMOrchestrator
 from app.utils.logger import app_logger as logger
 
 
+# Strict system instruction. It opens every prompt unchanged, so providers that
+# cache repeated prompt prefixes (e.g. Gemini's implicit caching) can reuse it
+GROUNDED_SYSTEM_PROMPT = """You are a helpful assistant that MUST ONLY use the CONTEXT documents provided below to answer questions.
+
+CRITICAL RULES:
+1. ONLY use information from the CONTEXT - do not use external knowledge
+2. If the answer is not in the CONTEXT, respond EXACTLY: "I don't know from the provided documents."
+3. Be specific and cite which document(s) you used
+4. Quote relevant parts when possible
+5. If partially answered, say what you know and what's missing
+
+FORMAT:
+Answer: [Your answer based on context]
+Sources: [List document numbers used, e.g., "Documents 1, 3"]"""
+
+
 def build_grounded_prompt(question: str, chunks: List[Dict[str, Any]]) -> str:
     """
     Build a grounded prompt that forces LLM to only use provided context.
@@ -41,22 +58,8 @@ def build_grounded_prompt(question: str, chunks: List[Dict[str, Any]]) -> str:
     
     context_block = "\n".join(ctx_parts)
     
-    # Strict system instruction
-    system = """You are a helpful assistant that MUST ONLY use the CONTEXT documents provided below to answer questions.
-
-CRITICAL RULES:
-1. ONLY use information from the CONTEXT - do not use external knowledge
-2. If the answer is not in the CONTEXT, respond EXACTLY: "I don't know from the provided documents."
-3. Be specific and cite which document(s) you used
-4. Quote relevant parts when possible
-5. If partially answered, say what you know and what's missing
-
-FORMAT:
-Answer: [Your answer based on context]
-Sources: [List document numbers used, e.g., "Documents 1, 3"]"""
-    
-    # Assemble full prompt
-    prompt = f"""{system}
+    # Static instructions first, so repeated calls share a cacheable prefix
+    prompt = f"""{GROUNDED_SYSTEM_PROMPT}
 
 CONTEXT:
 {context_block}
@@ -195,7 +198,8 @@ class ImprovedRAGPipeline:
         answer = self.llm.generate(
             prompt=prompt,
             max_tokens=max_tokens,
-            temperature=temperature
+            temperature=temperature,
+            semantic_key=semantic_key(question, top_chunks)
         )
         
         llm_time = time.time() - llm_start
@@ -168,8 +168,17 @@ class QAService:
         """
         total = db.query(QueryModel).count()
         
+        # Project only the columns QueryHistory needs: no ORM objects are
+        # materialized and the large retrieved_chunks text is never loaded
         queries = (
-            db.query(QueryModel)
+            db.query(
+                QueryModel.id,
+                QueryModel.query_text,
+                QueryModel.response,
+                QueryModel.timestamp,
+                QueryModel.processing_time,
+                QueryModel.top_k
+            )
             .order_by(QueryModel.timestamp.desc())
             .offset(skip)
             .limit(limit)
@@ -1,7 +1,11 @@
 """Utility helper functions."""
 import hashlib
+import multiprocessing
+import multiprocessing.pool
+import os
+import random
 import uuid
-from typing import Optional
+from typing import Callable, Optional, Sequence
 from datetime import datetime
 
 
@@ -40,6 +44,60 @@ def truncate_text(text: str, max_length: int = 100, suffix: str = "...") -> str:
     return text[:max_length - len(suffix)] + suffix
 
 
+def resolve_worker_count(workers: Optional[int], num_tasks: int) -> int:
+    """Resolve a process pool size, leaving one core for the parent process."""
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) - 1)
+    return max(1, min(workers, num_tasks))
+
+
+def process_pool(
+    workers: int,
+    initializer: Optional[Callable] = None,
+    initargs: Sequence = ()
+) -> multiprocessing.pool.Pool:
+    """
+    Start a process pool whose workers are spawned, not forked.
+    
+    Forking the threaded server process can deadlock on locks held by
+    other threads, so workers start as fresh interpreters.
+    """
+    return multiprocessing.get_context("spawn").Pool(workers, initializer, initargs)
+
+
+def pool_chunksize(num_tasks: int, workers: int) -> int:
+    """Tasks handed to each pool worker at a time (about four rounds per worker)."""
+    return max(1, num_tasks // (workers * 4))
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None, cap: float = 30.0) -> Optional[float]:
+    """
+    Seconds to wait before retrying a throttled request.
+    
+    Exponential (1s, 2s, 4s, ...) with up to 0.5s of jitter so clients
+    throttled together don't retry in lockstep; a numeric Retry-After
+    header is honored when it asks for longer, up to cap.
+    
+    Args:
+        attempt: Zero-based retry number
+        retry_after: Value of the Retry-After response header
+        cap: Maximum delay
+        
+    Returns:
+        Delay in seconds, or None if Retry-After asks for more than cap
+        (the caller should give up rather than hold the request open)
+    """
+    delay = min(2 ** attempt + random.uniform(0, 0.5), cap)
+    try:
+        requested = float(retry_after or 0)
+    except ValueError:
+        # HTTP-date form; fall back to the computed delay
+        return delay
+    if requested > cap:
+        return None
+    return max(requested, delay)
+
+
 def normalize_score(score: float, min_score: float = 0.0, max_score: float = 1.0) -> float:
     """Normalize score to 0-1 range."""
     if max_score == min_score:
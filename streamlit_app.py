@@ -26,7 +26,7 @@ try:
     from app.core.retrieval.retriever import SemanticRetriever
     from app.core.llm.orchestrator import LLMOrchestrator
     from app.core.llm.remote_llm import get_llm
-    from app.models.database import DatabaseManager, Document, Chunk
+    from app.models.database import DatabaseManager, Document, Chunk, bump_doc_version
     from app.services.improved_qa_service import ImprovedRAGPipeline
     from sqlalchemy.orm import Session
 except ImportError as e:
@@ -208,6 +208,7 @@ def process_document(uploaded_file, components):
                 )
                 session.add(db_chunk)
             
+            bump_doc_version(session)
             session.commit()
             st.info(f"✅ Saved document and {len(chunks)} chunks to database")
             
@@ -366,6 +367,7 @@ def delete_document(doc_id, components):
                 # Delete from database (use doc_id, not document_id)
                 session.query(Chunk).filter(Chunk.doc_id == doc_id).delete()
                 session.query(Document).filter(Document.id == doc_id).delete()
+                bump_doc_version(session)
                 session.commit()
                 
                 # Rebuild index without these chunks
@@ -569,6 +571,7 @@ def main():
                                 # Update FAISS IDs
                                 for chunk, faiss_id in zip(chunks, faiss_ids):
                                     chunk.faiss_id = faiss_id
+                                bump_doc_version(session)
                                 session.commit()
                                 
                                 # Save index
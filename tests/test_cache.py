@@ -0,0 +1,47 @@
+"""Tests for response caching."""
+import pytest
+
+from app.core.cache import RAGCache
+
+
+class TestRAGCache:
+    """Test query response cache."""
+
+    def test_lru_eviction(self, tmp_path):
+        """Test least recently used entry is evicted first."""
+        cache = RAGCache(cache_dir=str(tmp_path), max_size=2)
+
+        cache.set("first question", "1", [])
+        cache.set("second question", "2", [])
+        cache.get("first question")
+        cache.set("third question", "3", [])
+
+        assert cache.get("first question") is not None
+        assert cache.get("second question") is None
+        assert cache.get("third question")["answer"] == "3"
+
+    def test_persistence(self, tmp_path):
+        """Test entries survive a restart and invalidation is persisted."""
+        cache = RAGCache(cache_dir=str(tmp_path))
+        cache.set("What is RAG?", "Retrieval augmented generation", [{"doc_id": "doc1"}])
+        cache.set("What is FAISS?", "A vector index", [{"doc_id": "doc2"}])
+        cache.invalidate_by_doc("doc1")
+        cache.flush()
+
+        reloaded = RAGCache(cache_dir=str(tmp_path))
+
+        assert reloaded.get("what is faiss")["answer"] == "A vector index"
+        assert reloaded.get("What is RAG?") is None
+
+    def test_invalidate_restored_entries(self, tmp_path):
+        """Test entries restored from disk can be invalidated before being read."""
+        cache = RAGCache(cache_dir=str(tmp_path))
+        cache.set("What is RAG?", "Retrieval augmented generation", [{"doc_id": "doc1"}])
+        cache.set("What is FAISS?", "A vector index", [{"doc_id": "doc2"}])
+        cache.flush()
+
+        reloaded = RAGCache(cache_dir=str(tmp_path))
+        reloaded.invalidate_by_doc("doc2")
+
+        assert reloaded.get("What is FAISS?") is None
+        assert reloaded.get("What is RAG?")["answer"] == "Retrieval augmented generation"
@@ -0,0 +1,222 @@
+"""Tests for FAISS index management."""
+import faiss
+import numpy as np
+import pytest
+
+from app.core.ingestion.indexer import FaissIndexManager
+
+
+def _vectors(n: int, dimension: int = 8) -> np.ndarray:
+    """Random unit vectors."""
+    vectors = np.random.default_rng(0).standard_normal((n, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class TestFaissIndexManager:
+    """Test vector index operations."""
+    
+    def test_delete_keeps_other_ids(self, tmp_path):
+        """Test deleting a document leaves other vectors' IDs unchanged."""
+        manager = FaissIndexManager(dimension=8, index_path=str(tmp_path / "index.faiss"))
+        manager.create_index()
+        vectors = _vectors(4)
+        manager.add_vectors(vectors[:2], [{"doc_id": "a"}, {"doc_id": "a"}])
+        ids = manager.add_vectors(vectors[2:], [{"doc_id": "b"}, {"doc_id": "b"}])
+        
+        assert manager.delete_by_doc_id("a") == 2
+        
+        results = manager.search(vectors[3], top_k=1)
+        assert manager.index.ntotal == 2
+        assert results[0]["faiss_id"] == ids[1]
+        assert results[0]["doc_id"] == "b"
+    
+    def test_load_legacy_index(self, tmp_path):
+        """Test an index saved without explicit IDs is converted on load."""
+        index_path = tmp_path / "index.faiss"
+        legacy = faiss.IndexFlatIP(8)
+        legacy.add(_vectors(3))
+        faiss.write_index(legacy, str(index_path))
+        
+        manager = FaissIndexManager(dimension=8, index_path=str(index_path))
+        
+        assert manager.load_index()
+        assert isinstance(manager.index, faiss.IndexIDMap2)
+        assert manager.search(_vectors(3)[2], top_k=1)[0]["faiss_id"] == 2
+    
+    @pytest.mark.parametrize("index_type", ["IndexHNSWFlat", "RefinedHNSW"])
+    def test_hnsw_delete(self, tmp_path, index_type):
+        """Test deleting from an HNSW index keeps the remaining IDs searchable."""
+        manager = FaissIndexManager(
+            dimension=8, index_type=index_type, index_path=str(tmp_path / "index.faiss")
+        )
+        manager.create_index()
+        vectors = _vectors(20)
+        manager.add_vectors(vectors[:10], [{"doc_id": "a"}] * 10)
+        ids = manager.add_vectors(vectors[10:], [{"doc_id": "b"}] * 10)
+        
+        assert manager.delete_by_doc_id("a") == 10
+        
+        assert manager.index.ntotal == 10
+        assert manager.search(vectors[15], top_k=1)[0]["faiss_id"] == ids[5]
+    
+    def test_ivfpq_trains_after_buffering(self, tmp_path, monkeypatch):
+        """Test IVF-PQ vectors are searchable before and after training."""
+        monkeypatch.setattr("app.core.ingestion.indexer.settings.faiss_ivf_train_size", 300)
+        manager = FaissIndexManager(
+            dimension=16, index_type="IndexIVFPQ", index_path=str(tmp_path / "index.faiss")
+        )
+        manager.create_index()
+        vectors = _vectors(400, dimension=16)
+        
+        manager.add_vectors(vectors[:100], [{"doc_id": "a"}] * 100)
+        assert manager.search(vectors[5], top_k=1)[0]["faiss_id"] == 5
+        
+        manager.add_vectors(vectors[100:], [{"doc_id": "b"}] * 300)
+        
+        assert isinstance(manager._base_index(), faiss.IndexIVFPQ)
+        assert manager.index.ntotal == 400
+        assert manager.delete_by_doc_id("a") == 100
+        assert manager.index.ntotal == 300
+    
+    def test_ivfpq_search_after_delete(self, tmp_path, monkeypatch):
+        """Test a trained IVF-PQ index still returns the surviving IDs after a delete."""
+        monkeypatch.setattr("app.core.ingestion.indexer.settings.faiss_ivf_train_size", 300)
+        manager = FaissIndexManager(
+            dimension=16, index_type="IndexIVFPQ", index_path=str(tmp_path / "index.faiss")
+        )
+        manager.create_index()
+        vectors = _vectors(400, dimension=16)
+        manager.add_vectors(vectors[:100], [{"doc_id": "a"}] * 100)
+        manager.add_vectors(vectors[100:], [{"doc_id": "b"}] * 300)
+        
+        manager.delete_by_doc_id("a")
+        manager.add_vectors(vectors[:10], [{"doc_id": "c"}] * 10)
+        results = manager.search(vectors[250], top_k=3)
+        
+        assert len(results) == 3
+        assert all(result["faiss_id"] >= 100 for result in results)
+        assert results[0]["faiss_id"] == 250
+        assert manager.search(vectors[5], top_k=1)[0]["faiss_id"] == 405
+    
+    def test_id_mapped_ivf_index_loads_without_id_map(self, tmp_path):
+        """Test an IVF index saved inside an ID map is relabelled on load."""
+        index_path = str(tmp_path / "index.faiss")
+        manager = FaissIndexManager(dimension=16, index_type="IndexIVFPQ", index_path=index_path)
+        manager.create_index()
+        vectors = _vectors(400, dimension=16)
+        manager.add_vectors(vectors[:100], [{"doc_id": "a"}] * 100)
+        manager.add_vectors(vectors[100:], [{"doc_id": "b"}] * 300)
+        ivf_index = faiss.IndexIVFPQ(faiss.IndexFlatIP(16), 16, 16, 2, 8, faiss.METRIC_INNER_PRODUCT)
+        ivf_index.train(vectors)
+        manager.index = faiss.IndexIDMap2(ivf_index)
+        manager.index.add_with_ids(vectors, np.arange(400, dtype=np.int64))
+        manager.save_index().result()
+        
+        loaded = FaissIndexManager(index_type="IndexIVFPQ", index_path=index_path)
+        assert loaded.load_index()
+        assert loaded.delete_by_doc_id("a") == 100
+        
+        assert isinstance(loaded.index, faiss.IndexIVFPQ)
+        assert loaded.search(vectors[250], top_k=1)[0]["faiss_id"] == 250
+    
+    def test_search_batch_matches_search(self, tmp_path):
+        """Test batched search returns the same results as per-query search."""
+        manager = FaissIndexManager(dimension=8, index_path=str(tmp_path / "index.faiss"))
+        manager.create_index()
+        vectors = _vectors(10)
+        manager.add_vectors(vectors, [{"doc_id": str(i)} for i in range(10)])
+        
+        batch = manager.search_batch(vectors[:3], top_k=4)
+        
+        assert len(batch) == 3
+        for query, results in zip(vectors[:3], batch):
+            assert results == manager.search(query, top_k=4)
+    
+    def test_mmapped_ivf_index_is_writable(self, tmp_path, monkeypatch):
+        """Test a memory-mapped IVF index can still be changed and saved."""
+        monkeypatch.setattr("app.core.ingestion.indexer.settings.faiss_ivf_train_size", 300)
+        index_path = str(tmp_path / "index.faiss")
+        manager = FaissIndexManager(dimension=16, index_type="IndexIVFPQ", index_path=index_path)
+        manager.create_index()
+        vectors = _vectors(400, dimension=16)
+        manager.add_vectors(vectors[:300], [{"doc_id": "a"}] * 300)
+        manager.save_index().result()
+        
+        loaded = FaissIndexManager(index_type="IndexIVFPQ", index_path=index_path)
+        assert loaded.load_index()
+        loaded.add_vectors(vectors[300:], [{"doc_id": "b"}] * 100)
+        assert loaded.delete_by_doc_id("a") == 300
+        loaded.save_index().result()
+        
+        assert loaded.index.ntotal == 100
+    
+    def test_metadata_round_trip(self, tmp_path):
+        """Test metadata with differing fields survives save and load."""
+        index_path = str(tmp_path / "index.faiss")
+        manager = FaissIndexManager(dimension=8, index_path=index_path)
+        manager.create_index()
+        metadata = [{"doc_id": "a", "metadata": {"page": 1}}, {"doc_id": "b", "extra": None}]
+        manager.add_vectors(_vectors(2), metadata)
+        manager.save_index().result()
+        
+        loaded = FaissIndexManager(index_path=index_path)
+        
+        assert loaded.load_index()
+        assert [loaded.metadata.get(0), loaded.metadata.get(1)] == metadata
+        assert loaded.current_id == 2
+    
+    def test_inner_product_normalizes_copy(self, tmp_path):
+        """Test unnormalized vectors are scored as cosine without being modified."""
+        manager = FaissIndexManager(dimension=8, index_path=str(tmp_path / "index.faiss"))
+        manager.create_index()
+        vectors = _vectors(3) * 5.0
+        original = vectors.copy()
+        manager.add_vectors(vectors, [{"doc_id": "a"}] * 3)
+        
+        result = manager.search(vectors[1], top_k=1)[0]
+        
+        assert result["faiss_id"] == 1
+        assert result["score"] == pytest.approx(1.0, abs=1e-5)
+        np.testing.assert_array_equal(vectors, original)
+    
+    @pytest.mark.parametrize("index_type", ["ScalarQuantizerFP16", "ScalarQuantizer8bit"])
+    def test_scalar_quantizer(self, tmp_path, monkeypatch, index_type):
+        """Test scalar-quantized indexes find the nearest vector."""
+        monkeypatch.setattr("app.core.ingestion.indexer.settings.faiss_ivf_train_size", 50)
+        manager = FaissIndexManager(
+            dimension=16, index_type=index_type, index_path=str(tmp_path / "index.faiss")
+        )
+        manager.create_index()
+        vectors = _vectors(100, dimension=16)
+        manager.add_vectors(vectors, [{"doc_id": "a"}] * 100)
+        
+        assert isinstance(manager._base_index(), faiss.IndexScalarQuantizer)
+        assert manager.search(vectors[42], top_k=1)[0]["faiss_id"] == 42
+        assert manager.delete_by_doc_id("a") == 100
+    
+    def test_unit_vectors_are_not_copied(self, tmp_path):
+        """Test contiguous float32 unit vectors are passed to FAISS without a copy."""
+        manager = FaissIndexManager(dimension=8, index_path=str(tmp_path / "index.faiss"))
+        manager.create_index()
+        vectors = _vectors(3)
+        
+        assert manager._as_index_input(vectors) is vectors
+        assert manager._as_index_input(vectors * 2.0) is not vectors
+    
+    def test_background_save_is_a_snapshot(self, tmp_path):
+        """Test vectors added while a save is pending are not part of it."""
+        index_path = str(tmp_path / "index.faiss")
+        manager = FaissIndexManager(dimension=8, index_path=index_path)
+        manager.create_index()
+        vectors = _vectors(4)
+        manager.add_vectors(vectors[:2], [{"doc_id": "a"}] * 2)
+        
+        future = manager.save_index()
+        manager.add_vectors(vectors[2:], [{"doc_id": "b"}] * 2)
+        future.result()
+        
+        loaded = FaissIndexManager(index_path=index_path)
+        assert loaded.load_index()
+        assert loaded.index.ntotal == 2
+        assert len(loaded.metadata) == 2
+        assert not list(tmp_path.glob("*.tmp"))
@@ -1,10 +1,11 @@
 """Tests for ingestion pipeline."""
 import pytest
+import numpy as np
 from pathlib import Path
 
 from app.core.ingestion.chunker import RecursiveChunker, Chunk
-from app.core.ingestion.embedder import Embedder
-from app.utils.helpers import generate_doc_id
+from app.core.ingestion.embedder import Embedder, EmbeddingCache
+from app.utils.helpers import backoff_delay, generate_doc_id
 
 
 class TestChunker:
@@ -41,6 +42,31 @@ class TestChunker:
         
         assert len(chunks) == 0
     
+    def test_separator_free_text_respects_chunk_size(self):
+        """Test overlap never pushes chunks of unbroken text past chunk_size."""
+        chunker = RecursiveChunker(chunk_size=100, chunk_overlap=20)
+        
+        text = "x" * 1000
+        chunks = chunker.chunk(text, "test-doc")
+        
+        assert len(chunks) > 1
+        assert all(len(chunk.chunk_text) <= 100 for chunk in chunks)
+        assert chunks[0].start_char == 0 and chunks[-1].end_char == len(text)
+    
+    def test_chunk_stream_matches_chunk(self):
+        """Test streaming pages gives the same chunks as the joined text."""
+        chunker = RecursiveChunker(chunk_size=100, chunk_overlap=20)
+        pages = [
+            "First paragraph of page one.\n\nSecond paragraph. " * 5,
+            "Page two text.\n\nMore text on page two. " * 5,
+            "Short last page."
+        ]
+        
+        streamed = list(chunker.chunk_stream(pages, "doc"))
+        expected = chunker.chunk("\n".join(pages), "doc")
+        
+        assert [c.to_dict() for c in streamed] == [c.to_dict() for c in expected]
+    
     def test_short_text(self):
         """Test text shorter than chunk size."""
         chunker = RecursiveChunker(chunk_size=1000)
@@ -93,6 +119,52 @@ class TestEmbedder:
         assert 0.99 <= norm <= 1.01
 
 
+class TestEmbeddingCache:
+    """Test on-disk embedding cache."""
+    
+    def test_round_trip(self, tmp_path):
+        """Test vectors survive a reopen and misses are reported."""
+        vectors = np.random.rand(3, 8).astype(np.float32)
+        cache = EmbeddingCache(tmp_path, dimension=8)
+        cache.put_many(["a", "b", "c"], vectors)
+        
+        reopened = EmbeddingCache(tmp_path, dimension=8)
+        found, cached = reopened.get_many(["c", "missing", "a"])
+        
+        assert found == [0, 2]
+        assert np.allclose(cached, vectors[[2, 0]], atol=1e-2)
+    
+    def test_dimension_change_resets(self, tmp_path):
+        """Test cache is discarded when the embedding dimension changes."""
+        EmbeddingCache(tmp_path, dimension=8).put_many(["a"], np.ones((1, 8)))
+        
+        found, _ = EmbeddingCache(tmp_path, dimension=4).get_many(["a"])
+        
+        assert found == []
+    
+    def test_model_change_resets(self, tmp_path):
+        """Test cache is discarded when the embedding model changes."""
+        EmbeddingCache(tmp_path, dimension=8, model_name="m1").put_many(["a"], np.ones((1, 8)))
+        
+        found, _ = EmbeddingCache(tmp_path, dimension=8, model_name="m2").get_many(["a"])
+        
+        assert found == []
+    
+    def test_shared_directory_writes(self, tmp_path):
+        """Test two instances appending to one shard keep their rows apart."""
+        first = EmbeddingCache(tmp_path, dimension=8)
+        second = EmbeddingCache(tmp_path, dimension=8)
+        vectors = np.random.rand(4, 8).astype(np.float32)
+        
+        first.put_many(["a", "b"], vectors[:2])
+        second.put_many(["c", "d"], vectors[2:])
+        
+        for cache in (first, second, EmbeddingCache(tmp_path, dimension=8)):
+            found, cached = cache.get_many(["d", "a", "c", "b"])
+            assert found == [0, 1, 2, 3]
+            assert np.allclose(cached, vectors[[3, 0, 2, 1]], atol=1e-2)
+
+
 class TestHelpers:
     """Test utility helpers."""
     
@@ -109,3 +181,10 @@ class TestHelpers:
         doc_id2 = generate_doc_id("test2.pdf")
         
         assert doc_id1 != doc_id2
+    
+    def test_backoff_delay_caps_retry_after(self):
+        """Test Retry-After is honored up to the cap and refused beyond it."""
+        assert backoff_delay(0, "5", cap=30.0) == 5.0
+        assert backoff_delay(10, None, cap=30.0) == 30.0
+        assert backoff_delay(0, "3600", cap=30.0) is None
+        assert 1.0 <= backoff_delay(0, "Wed, 21 Oct 2015 07:28:00 GMT") <= 1.5
@@ -0,0 +1,171 @@
+"""Tests for LLM response caching."""
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from app.core.llm.cache import (
+    LLMResponseCache, SemanticLLMCache, SingleFlight, semantic_key, semantic_lookup_args
+)
+
+
+class TestLLMResponseCache:
+    """Test deterministic generation cache."""
+    
+    def test_only_temperature_zero_is_cached(self):
+        """Test sampled generations are never cached."""
+        cache = LLMResponseCache()
+        
+        assert cache.make_key("model", "prompt", 100, 0.7) is None
+        
+        key = cache.make_key("model", "prompt", 100, 0.0)
+        cache.put(key, "answer")
+        
+        assert cache.get(cache.make_key("model", "prompt", 100, 0.0)) == "answer"
+        assert cache.get(cache.make_key("model", "prompt", 200, 0.0)) is None
+        assert cache.get(cache.make_key("other", "prompt", 100, 0.0)) is None
+        assert cache.get(cache.make_key("model", "prompt", 100, 0.0, top_p=0.5)) is None
+        assert cache.stats["hits"] == 1
+    
+    def test_lru_eviction(self):
+        """Test least recently used response is evicted first."""
+        cache = LLMResponseCache(max_size=2)
+        keys = [cache.make_key("model", prompt, 100, 0.0) for prompt in ("a", "b", "c")]
+        
+        cache.put(keys[0], "A")
+        cache.put(keys[1], "B")
+        cache.get(keys[0])
+        cache.put(keys[2], "C")
+        
+        assert cache.get(keys[0]) == "A"
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[2]) == "C"
+    
+    def test_persistence(self, tmp_path):
+        """Test entries survive a restart when a cache file is configured."""
+        path = tmp_path / "llm_cache.json"
+        cache = LLMResponseCache(path=str(path))
+        key = cache.make_key("model", "prompt", 100, 0.0)
+        cache.put(key, "answer")
+        cache.flush()
+        
+        reloaded = LLMResponseCache(path=str(path))
+        
+        assert reloaded.get(key) == "answer"
+
+
+class TestSemanticLLMCache:
+    """Test similarity-based generation cache."""
+    
+    @staticmethod
+    def embed(prompt):
+        """Embed prompts as unit vectors that are close for paraphrases."""
+        vectors = {
+            "capital of France?": [1.0, 0.0, 0.0],
+            "France's capital?": [0.96, 0.28, 0.0],
+            "capital of Spain?": [0.6, 0.0, 0.8],
+        }
+        return np.array(vectors[prompt], dtype=np.float32)
+    
+    def test_paraphrase_hit(self):
+        """Test similar prompts reuse a response within the same scope only."""
+        cache = SemanticLLMCache(threshold=0.92, embed_fn=self.embed)
+        
+        text, vector = cache.lookup("capital of France?", "model", 0.0)
+        assert text is None
+        cache.put(vector, "model", "Paris")
+        
+        assert cache.lookup("France's capital?", "model", 0.0)[0] == "Paris"
+        assert cache.lookup("capital of Spain?", "model", 0.0)[0] is None
+        assert cache.lookup("France's capital?", "other", 0.0)[0] is None
+        assert cache.lookup("France's capital?", "model", 0.7) == (None, None)
+    
+    def test_semantic_key_scopes_by_chunks(self):
+        """Test the same question only matches answers built from the same chunks."""
+        cache = SemanticLLMCache(embed_fn=self.embed)
+        key = semantic_key("capital of France?", [{"chunk_id": 1}])
+        
+        text, scope = semantic_lookup_args(key, "model")
+        cache.put(cache.lookup(text, scope, 0.0)[1], scope, "Paris")
+        
+        other_text, other_scope = semantic_lookup_args(
+            semantic_key("France's capital?", [{"chunk_id": 2}]), "model"
+        )
+        assert cache.lookup(other_text, other_scope, 0.0)[0] is None
+        assert cache.lookup("France's capital?", scope, 0.0)[0] == "Paris"
+        assert cache.lookup(*semantic_lookup_args(None, "model"), 0.0) == (None, None)
+    
+    def test_repeated_prompt_embedded_once(self):
+        """Test lookups for a prompt seen before reuse its embedding."""
+        calls = []
+        
+        def embed(prompt):
+            calls.append(prompt)
+            return self.embed(prompt)
+        
+        cache = SemanticLLMCache(embed_fn=embed)
+        cache.lookup("capital of France?", "model", 0.0)
+        cache.lookup("capital of France?", "model", 0.0)
+        
+        assert calls == ["capital of France?"]
+    
+    def test_growth_and_eviction(self):
+        """Test the embedding matrix grows and overwrites the oldest entries once full."""
+        cache = SemanticLLMCache(max_size=100, embed_fn=lambda prompt: None)
+        basis = np.eye(128, dtype=np.float32)
+        
+        for i in range(128):
+            cache.put(basis[i], "model", str(i))
+        
+        assert cache.stats["size"] == 100
+        cache._embed_fn = lambda prompt: basis[int(prompt)]
+        assert cache.lookup("0", "model", 0.0)[0] is None
+        assert cache.lookup("127", "model", 0.0)[0] == "127"
+
+
+class TestSingleFlight:
+    """Test deduplication of concurrent identical calls."""
+    
+    def test_concurrent_calls_share_one_run(self):
+        """Test threads asking for the same key wait for the first call."""
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        runs = []
+        
+        def work():
+            runs.append(1)
+            started.set()
+            release.wait(5)
+            return "answer"
+        
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do("key", work)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(flight.do("key", work)))
+        follower.start()
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        
+        assert results == ["answer", "answer"]
+        assert len(runs) == 1
+        assert flight.do(None, lambda: "uncached") == "uncached"
+    
+    def test_async_calls_share_one_run(self):
+        """Test gathered coroutines with the same key await one call."""
+        flight = SingleFlight()
+        runs = []
+        
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.01)
+            return "answer"
+        
+        async def main():
+            return await asyncio.gather(*(flight.ado("key", work) for _ in range(3)))
+        
+        assert asyncio.run(main()) == ["answer"] * 3
+        assert len(runs) == 1
@@ -0,0 +1,34 @@
+"""Tests for LLM call statistics."""
+import pytest
+
+from app.core.llm.stats import CallStats
+
+
+class TestCallStats:
+    """Test per-client call counters."""
+    
+    def test_counts_calls_and_errors(self):
+        """Test successful and failed calls are both counted."""
+        stats = CallStats("test", log_interval=0)
+        
+        with stats.track() as call:
+            call.chars_out = 40
+        with pytest.raises(RuntimeError):
+            with stats.track():
+                raise RuntimeError("boom")
+        stats.cache_hit()
+        
+        snapshot = stats.stats
+        assert snapshot["calls"] == 2
+        assert snapshot["errors"] == 1
+        assert snapshot["cache_hits"] == 1
+        assert snapshot["chars_out"] == 40
+        assert snapshot["latency_ms"] >= 0
+    
+    def test_empty_stats(self):
+        """Test a fresh client reports zeros without dividing by zero."""
+        snapshot = CallStats("test").stats
+        
+        assert snapshot["calls"] == 0
+        assert snapshot["avg_latency_ms"] == 0.0
+        assert snapshot["chars_per_s"] == 0.0
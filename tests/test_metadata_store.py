@@ -0,0 +1,53 @@
+"""Tests for columnar vector metadata."""
+import numpy as np
+import pytest
+
+from app.core.ingestion.metadata_store import MetadataStore
+
+
+def _row(doc_id: str, index: int) -> dict:
+    """Metadata in the shape the document service stores."""
+    return {
+        "doc_id": doc_id,
+        "chunk_index": index,
+        "chunk_text": f"chunk {index} of {doc_id} – ünïcode",
+        "start_char": index * 10,
+        "end_char": index * 10 + 9,
+        "metadata": {"filename": f"{doc_id}.txt"}
+    }
+
+
+class TestMetadataStore:
+    """Test metadata column store."""
+    
+    def test_rows_round_trip(self):
+        """Test rows come back exactly as added, including unknown fields."""
+        store = MetadataStore()
+        rows = [_row("a", 0), _row("a", 1), {"doc_id": 7, "note": None}]
+        store.add(np.arange(3), rows)
+        
+        assert store.get_many(np.array([2, 0, 5])) == [rows[2], rows[0], {}]
+        assert store.get(1) == rows[1]
+    
+    def test_remove_document(self):
+        """Test removing a document keeps the other rows."""
+        store = MetadataStore()
+        store.add(np.arange(4), [_row("a", 0), _row("b", 0), _row("a", 1), _row("b", 1)])
+        
+        ids = store.ids_for_doc("a")
+        store.remove(ids)
+        
+        np.testing.assert_array_equal(ids, [0, 2])
+        assert len(store) == 2
+        assert store.get(3) == _row("b", 1)
+        assert store.get(0) is None
+    
+    def test_columns_round_trip(self):
+        """Test serialization layout rebuilds the same store."""
+        store = MetadataStore()
+        store.add(np.array([3, 8]), [_row("a", 0), {"doc_id": "b"}])
+        
+        restored = MetadataStore.from_columns(store.to_columns())
+        
+        assert list(restored.rows()) == list(store.rows())
+        np.testing.assert_array_equal(restored.ids, [3, 8])
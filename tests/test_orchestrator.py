@@ -0,0 +1,64 @@
+"""Tests for LLM prompt building."""
+from app.core.llm.cache import semantic_key
+from app.core.llm.orchestrator import ANSWER_INSTRUCTIONS, BaseLLM, LLMOrchestrator
+
+
+class EchoLLM(BaseLLM):
+    """LLM stub returning its prompt."""
+    
+    def generate(
+        self,
+        prompt: str,
+        max_tokens: int = 500,
+        temperature: float = 0.7,
+        semantic_key=None
+    ) -> str:
+        self.semantic_key = semantic_key
+        return prompt
+
+
+class TestPromptBuilding:
+    """Test prompt layout for prefix caching."""
+    
+    def test_static_prefix_and_document_order(self):
+        """Test instructions lead and chunks follow document order with rank labels."""
+        orchestrator = LLMOrchestrator(EchoLLM())
+        chunks = [
+            {"doc_id": "b", "chunk_index": 0, "filename": "b.txt", "chunk_text": "B0"},
+            {"doc_id": "a", "chunk_index": 3, "filename": "a.txt", "chunk_text": "A3"},
+            {"doc_id": "a", "chunk_index": 1, "filename": "a.txt", "chunk_text": "A1"},
+        ]
+        
+        prompt = orchestrator.answer_question("What is RAG?", chunks)
+        
+        assert prompt.startswith(ANSWER_INSTRUCTIONS)
+        assert prompt.index("[Source 3: a.txt]\nA1") < prompt.index("[Source 2: a.txt]\nA3")
+        assert prompt.index("[Source 2: a.txt]\nA3") < prompt.index("[Source 1: b.txt]\nB0")
+        assert prompt.rstrip().endswith("User Question: What is RAG?\n\nYour Answer:")
+    
+    def test_semantic_key_uses_question_and_chunks(self):
+        """Test the semantic cache key is the question, scoped to the retrieved chunks."""
+        llm = EchoLLM()
+        chunks = [{"chunk_id": 7, "chunk_text": "A"}, {"chunk_id": 3, "chunk_text": "B"}]
+        
+        LLMOrchestrator(llm).answer_question("What is RAG?", chunks)
+        
+        assert llm.semantic_key == semantic_key("What is RAG?", chunks[::-1])
+        assert llm.semantic_key[0] == "What is RAG?"
+        assert llm.semantic_key != semantic_key("What is RAG?", chunks[:1])
+    
+    def test_context_budget_drops_lowest_ranked_chunks(self):
+        """Test chunks over the model's window are dropped by rank, not position."""
+        llm = EchoLLM()
+        llm.context_limit = 1200
+        chunks = [
+            {"doc_id": "a", "chunk_index": i, "filename": "a.txt", "chunk_text": f"A{i} " + "x" * 700}
+            for i in (5, 0, 3, 1, 4, 2)
+        ]
+        
+        prompt = LLMOrchestrator(llm).answer_question("What is RAG?", chunks, max_tokens=100)
+        
+        assert "A5 " in prompt and "A0 " in prompt
+        assert "A2 " not in prompt and "A4 " not in prompt
+        assert prompt.index("A0 ") < prompt.index("A5 ")
+        assert len(prompt) // 4 <= 1200 - 100 - 512
@@ -0,0 +1,25 @@
+"""Tests for prompt sizing."""
+from app.core.llm.prompts import TRUNCATION_MARKER, estimate_tokens, fit_prompt
+
+
+class TestFitPrompt:
+    """Test prompt truncation to a token budget."""
+    
+    def test_short_prompt_unchanged(self):
+        """Test prompts within budget are returned as-is."""
+        prompt = "Answer the question.\n\nQUESTION: What is RAG?"
+        
+        assert fit_prompt(prompt, 100) is prompt
+    
+    def test_keeps_instructions_and_question(self):
+        """Test the middle of an oversized prompt is dropped."""
+        context = "\n".join(f"[DOCUMENT {i}] " + "x" * 200 for i in range(200))
+        prompt = f"SYSTEM RULES\n\nCONTEXT:\n{context}\n\nQUESTION: What is RAG?\n\nAnswer:"
+        
+        fitted = fit_prompt(prompt, 1000)
+        
+        assert estimate_tokens(fitted) <= 1000
+        assert fitted.startswith("SYSTEM RULES\n\nCONTEXT:\n[DOCUMENT 0]")
+        assert fitted.endswith("QUESTION: What is RAG?\n\nAnswer:")
+        assert TRUNCATION_MARKER in fitted
+        assert "[DOCUMENT 199]" not in fitted.split(TRUNCATION_MARKER)[0]
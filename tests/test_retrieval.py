@@ -2,7 +2,7 @@
 import pytest
 import numpy as np
 
-from app.core.retrieval.ranker import MMRRanker
+from app.core.retrieval.ranker import MMRRanker, predict_by_length
 
 
 class TestMMRRanker:
@@ -31,18 +31,39 @@ class TestMMRRanker:
 class TestRetrieval:
     """Test retrieval components."""
     
-    def test_cosine_similarity(self):
-        """Test cosine similarity calculation."""
-        ranker = MMRRanker()
+    def test_mmr_embedding_similarity(self):
+        """Test MMR skips near-duplicates in favour of dissimilar results."""
+        ranker = MMRRanker(lambda_param=0.5)
+        
+        results = [
+            {"doc_id": "doc1", "score": 0.9, "chunk_text": "Test 1"},
+            {"doc_id": "doc1", "score": 0.85, "chunk_text": "Test 1 again"},
+            {"doc_id": "doc2", "score": 0.6, "chunk_text": "Other"},
+        ]
+        embeddings = np.array([
+            [1.0, 0.0, 0.0],
+            [2.0, 0.0, 0.0],  # Same direction as the first, different norm
+            [0.0, 1.0, 0.0],
+        ])
+        
+        reranked = ranker.rerank(results, top_k=3, embeddings=embeddings)
+        
+        assert [r["chunk_text"] for r in reranked] == ["Test 1", "Other", "Test 1 again"]
+    
+    def test_predict_by_length_keeps_order(self):
+        """Test length-sorted cross-encoder scoring returns scores in input order."""
+        class FakeCrossEncoder:
+            def __init__(self):
+                self.seen = []
+            
+            def predict(self, pairs, **kwargs):
+                self.seen = [passage for _, passage in pairs]
+                return np.array([len(passage) for passage in self.seen], dtype=np.float32)
         
-        vec1 = np.array([1.0, 0.0, 0.0])
-        vec2 = np.array([1.0, 0.0, 0.0])
-        vec3 = np.array([0.0, 1.0, 0.0])
+        model = FakeCrossEncoder()
+        pairs = [("q", "medium"), ("q", "a much longer passage"), ("q", "tiny")]
         
-        # Same vectors
-        sim1 = ranker._cosine_similarity(vec1, vec2)
-        assert 0.99 <= sim1 <= 1.01
+        scores = predict_by_length(model, pairs)
         
-        # Orthogonal vectors
-        sim2 = ranker._cosine_similarity(vec1, vec3)
-        assert -0.01 <= sim2 <= 0.01
+        assert model.seen == ["tiny", "medium", "a much longer passage"]
+        assert scores.tolist() == [6.0, 21.0, 4.0]
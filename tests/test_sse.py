@@ -0,0 +1,26 @@
+"""Tests for server-sent events parsing."""
+import asyncio
+
+from app.core.llm.sse import aiter_sse_data, iter_sse_data
+
+
+class TestSSEParsing:
+    """Test data payload extraction from streamed bytes."""
+    
+    def test_lines_split_across_chunks(self):
+        """Test payloads are reassembled across chunk boundaries and CRLF endings."""
+        chunks = [b'data: {"a"', b': 1}\r\n\r\nevent: ping\r\n', b'data:[DONE]']
+        
+        assert list(iter_sse_data(chunks)) == [b'{"a": 1}', b'[DONE]']
+    
+    def test_async_matches_sync(self):
+        """Test the async parser yields the same payloads."""
+        chunks = [b"data: one\n\nda", b"ta: two\n\n"]
+        
+        async def collect():
+            async def source():
+                for chunk in chunks:
+                    yield chunk
+            return [data async for data in aiter_sse_data(source())]
+        
+        assert asyncio.run(collect()) == list(iter_sse_data(chunks)) == [b"one", b"two"]